@@ -0,0 +1,71 @@
+"""
+Async login view.
+
+Under ASGI the password hash is awaited on the event loop while it runs in
+the hash pool (see ``authentication.hashing``), so a burst of logins holds
+no request thread while hashing. Responses have exactly the same shape as
+those of ``UserLoginView``.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from rest_framework import status
+
+from quiz_management.utils import json_success_response, json_error_response
+from responses.async_views import AsyncAPIView
+from .hashing import HashPoolSaturated, aauthenticate_user
+from .serializers import LoginCredentialsSerializer, UserSerializer
+from .tokens import RefreshToken
+
+
+class AsyncUserLoginView(AsyncAPIView):
+    """
+    Login user and return JWT tokens.
+    """
+
+    async def post(self, request):
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError as exc:
+            return json_error_response(
+                message='Bad Request',
+                details={'detail': f'JSON parse error - {exc}'},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = LoginCredentialsSerializer(data=data)
+        if not serializer.is_valid():
+            return json_error_response(
+                message="Login failed",
+                details=serializer.errors,
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            user = await aauthenticate_user(
+                serializer.validated_data['username'], serializer.validated_data['password']
+            )
+        except HashPoolSaturated as exc:
+            response = json_error_response(
+                message="Too many logins in progress, please retry shortly",
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+            response['Retry-After'] = str(exc.retry_after)
+            return response
+        if user is None:
+            return json_error_response(
+                message="Login failed",
+                details={'non_field_errors': ['Invalid credentials.']},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Records the outstanding refresh token
+        refresh = await sync_to_async(RefreshToken.for_user)(user)
+        return json_success_response(
+            data={
+                'user': UserSerializer(user).data,
+                'access_token': str(refresh.access_token),
+                'refresh_token': str(refresh),
+            },
+            message="Login successful"
+        )
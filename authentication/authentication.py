@@ -0,0 +1,101 @@
+"""
+JWT authentication that avoids a user query on every request.
+
+``CachedJWTAuthentication`` resolves the user from the process-local cache
+backed by the shared Django cache, both keyed by the version of the
+``user:<id>`` tag (see ``quiz_management.cache``), which
+``authentication.signals`` invalidates whenever the user is saved (password
+change, profile update, deactivation) or deleted.
+
+``StatelessJWTAuthentication`` is for views that only need the user id,
+e.g. to filter by ``created_by``: it builds an unsaved ``User`` stub from
+the token claims and runs no query at all. Tokens of deactivated users are
+rejected through a revocation marker in the shared cache.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from quiz_management.cache import get_or_set, invalidate_tags, user_tag
+from .models import User
+
+def _revoked_key(user_id):
+    return f'auth:user:{user_id}:revoked_at'
+
+
+def invalidate_user(user_id):
+    """Drop every cached copy of a user."""
+    invalidate_tags(user_tag(user_id))
+
+
+def revoke_user_tokens(user_id):
+    """Reject tokens issued to a user before now in the stateless mode."""
+    # Older tokens have expired anyway once the access token lifetime passed
+    lifetime = api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+    cache.set(_revoked_key(user_id), time.time(), int(lifetime) + 1)
+
+
+def clear_revocation(user_id):
+    cache.delete(_revoked_key(user_id))
+
+
+def get_cached_user(user_id):
+    """
+    Return a copy of the user with the given id, or ``None`` if there is no
+    such user. Callers may modify and save the returned instance.
+    """
+    def load():
+        return User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+    # Both cache layers are keyed by the version of the user's tag, so a
+    # process never serves a user after it was saved
+    return get_or_set(
+        'auth_user', f'auth:user:{user_id}', [user_tag(user_id)], load,
+        getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300),
+    )
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    ``JWTAuthentication`` that looks the user up in the cache first.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    Trusts the token claims and returns a ``User`` stub with only the id set.
+    Use it only on views that never read other attributes of the user.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        revoked_at = cache.get(_revoked_key(user_id))
+        if revoked_at is not None and validated_token.get('iat', 0) <= revoked_at:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        user = User(**{api_settings.USER_ID_FIELD: user_id})
+        # Behaves like a loaded instance in queries, e.g. created_by=user
+        user._state.adding = False
+        user._state.db = 'default'
+        return user
@@ -0,0 +1,168 @@
+"""
+In-memory membership filter for blacklisted refresh tokens.
+
+Every refresh and logout checks whether the presented token is
+blacklisted. Instead of querying the blacklist table each time, each
+process keeps a Bloom filter of blacklisted JTIs that is refreshed
+incrementally from the database. A negative answer is definite; only
+positive answers (blacklisted tokens and the rare false positive) are
+confirmed with a query, so the cost of a refresh no longer depends on the
+size of the blacklist.
+
+Tokens blacklisted by this process are added immediately; tokens
+blacklisted by other processes are seen after at most
+``AUTH_BLACKLIST_REFRESH_INTERVAL`` seconds.
+"""
+import hashlib
+import math
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+from quiz_management import metrics
+
+BLACKLIST_CHECKS = metrics.Counter(
+    'auth_blacklist_checks_total',
+    'Refresh token blacklist checks by outcome (negative, false_positive, blacklisted).',
+    ('outcome',)
+)
+BLACKLIST_FILTER_SIZE = metrics.Gauge(
+    'auth_blacklist_filter_entries', 'Blacklisted JTIs held in the in-memory filter.'
+)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings, sized for ``capacity`` entries at
+    the given false positive rate.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.capacity = max(capacity, 1)
+        self.num_bits = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, value):
+        """Add ``value``; values that were (or seem) present already are not counted again."""
+        added = False
+        for position in self._positions(value):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class BlacklistIndex:
+    """
+    Per-process Bloom filter of blacklisted JTIs plus the bookkeeping to
+    keep it in sync with the ``BlacklistedToken`` table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter = None
+        self._cursor = 0
+        # (time, highest id seen): rows are re-read for a short lookback so
+        # ids committed out of order by concurrent transactions are not missed
+        self._seen = deque()
+        # Ids above the start of the lookback that are in the filter already
+        self._indexed = set()
+        self._refreshed_at = 0.0
+        self._rebuilt_at = 0.0
+
+    def _settings(self, name, default):
+        return getattr(settings, f'AUTH_BLACKLIST_{name}', default)
+
+    def rebuild(self):
+        """Reload the filter from the unexpired blacklisted tokens."""
+        now = time.monotonic()
+        rows = list(
+            BlacklistedToken.objects.filter(token__expires_at__gt=aware_utcnow())
+            .values_list('id', 'token__jti')
+        )
+        # Leave headroom so the filter does not fill up before the next rebuild
+        capacity = max(self._settings('CAPACITY', 100000), len(rows) * 2)
+        bloom = BloomFilter(capacity, self._settings('ERROR_RATE', 0.001))
+        cursor = 0
+        for row_id, jti in rows:
+            bloom.add(jti)
+            cursor = max(cursor, row_id)
+        self._filter = bloom
+        self._cursor = cursor
+        self._seen = deque([(now, cursor)])
+        self._indexed = set()
+        self._refreshed_at = self._rebuilt_at = now
+        BLACKLIST_FILTER_SIZE.set(bloom.count)
+
+    def refresh(self):
+        """Add the JTIs blacklisted since the last refresh."""
+        now = time.monotonic()
+        lookback = self._settings('LOOKBACK', 60)
+        while len(self._seen) > 1 and self._seen[1][0] <= now - lookback:
+            self._seen.popleft()
+        start = self._seen[0][1]
+        self._indexed = {row_id for row_id in self._indexed if row_id > start}
+        rows = BlacklistedToken.objects.filter(id__gt=start).values_list('id', 'token__jti')
+        for row_id, jti in rows:
+            if row_id in self._indexed:
+                continue
+            self._filter.add(jti)
+            self._indexed.add(row_id)
+            self._cursor = max(self._cursor, row_id)
+        self._seen.append((now, self._cursor))
+        self._refreshed_at = now
+        if self._filter.count > self._filter.capacity:
+            self.rebuild()
+        BLACKLIST_FILTER_SIZE.set(self._filter.count)
+
+    def _sync(self):
+        now = time.monotonic()
+        if self._filter is None or now - self._rebuilt_at >= self._settings('REBUILD_INTERVAL', 3600):
+            self.rebuild()
+        elif now - self._refreshed_at >= self._settings('REFRESH_INTERVAL', 1.0):
+            self.refresh()
+
+    def might_contain(self, jti):
+        with self._lock:
+            self._sync()
+            return jti in self._filter
+
+    def add(self, jti):
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+
+    def reset(self):
+        with self._lock:
+            self._filter = None
+
+
+blacklist_index = BlacklistIndex()
+
+
+def is_blacklisted(jti):
+    """Return whether the token with this JTI is blacklisted."""
+    if not blacklist_index.might_contain(jti):
+        BLACKLIST_CHECKS.inc(outcome='negative')
+        return False
+    blacklisted = BlacklistedToken.objects.filter(token__jti=jti).exists()
+    BLACKLIST_CHECKS.inc(outcome='blacklisted' if blacklisted else 'false_positive')
+    return blacklisted
@@ -0,0 +1,263 @@
+"""
+Password hashing in a bounded process pool.
+
+Checking a PBKDF2 password takes hundreds of milliseconds of CPU. Running
+it in a small pool of separate processes keeps login bursts from starving
+the request workers: at most ``AUTH_HASH_WORKERS`` hashes run at a time per
+server process and at most ``AUTH_HASH_MAX_PENDING`` may be queued or
+running. Further logins fail fast with ``HashPoolSaturated`` instead of
+piling up, and so do logins whose hash waited longer than
+``AUTH_HASH_TIMEOUT``.
+
+Hashes that use outdated parameters are upgraded in the background after a
+successful login.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import connections
+
+from quiz_management import metrics
+
+logger = logging.getLogger('quiz_management')
+
+# Pool processes import this module before Django is set up, so models are
+# imported inside the functions that need them.
+
+HASH_IN_FLIGHT = metrics.Gauge(
+    'auth_hash_pool_in_flight', 'Password hashes queued or running in the hash pool.'
+)
+HASH_CAPACITY = metrics.Gauge(
+    'auth_hash_pool_capacity', 'Password hashes that may be queued or running at once.'
+)
+HASH_REJECTED = metrics.Counter(
+    'auth_hash_pool_rejected_total', 'Logins rejected because the hash pool was saturated.'
+)
+HASH_WAIT = metrics.Histogram(
+    'auth_hash_pool_wait_seconds', 'Time a password hash waited for a free pool process.',
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+HASH_DURATION = metrics.Histogram(
+    'auth_hash_duration_seconds', 'Time spent computing a password hash.',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+
+class HashPoolSaturated(Exception):
+    """
+    Raised when too many password hashes are already queued, or when a hash
+    did not finish within ``AUTH_HASH_TIMEOUT``.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__('Password hash pool is saturated')
+        self.retry_after = retry_after
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _check_password(password, encoded):
+    """Runs in a pool process; returns ``(valid, must_update)``."""
+    from django.contrib.auth.hashers import check_password
+
+    updated = []
+    valid = check_password(password, encoded, setter=lambda raw_password: updated.append(True))
+    return valid, bool(updated)
+
+
+def _make_password(password):
+    """Runs in a pool process."""
+    from django.contrib.auth.hashers import make_password
+
+    return make_password(password)
+
+
+def _timed(func, submitted_at, *args):
+    started_at = time.time()
+    result = func(*args)
+    return result, started_at - submitted_at, time.time() - started_at
+
+
+class HashPool:
+    """
+    Process pool with an admission limit. The executor is created lazily so
+    that each forked server worker starts its own pool.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._rehash_executor = None
+        self._pending = 0
+
+    @property
+    def workers(self):
+        return getattr(settings, 'AUTH_HASH_WORKERS', 2)
+
+    @property
+    def max_pending(self):
+        return getattr(settings, 'AUTH_HASH_MAX_PENDING', 32)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # Forking a threaded server process is unsafe, so the pool
+                # processes are spawned and set Django up themselves
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                )
+                HASH_CAPACITY.set(self.max_pending)
+            return self._executor
+
+    def submit(self, func, *args):
+        """Submit a hash; raises ``HashPoolSaturated`` when the pool is full."""
+        executor = self._get_executor()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                HASH_REJECTED.inc()
+                raise HashPoolSaturated(retry_after=getattr(settings, 'AUTH_HASH_RETRY_AFTER', 1))
+            self._pending += 1
+        HASH_IN_FLIGHT.inc()
+        future = executor.submit(_timed, func, time.time(), *args)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._pending -= 1
+            if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                # A pool process died; start a fresh pool on the next login
+                self._executor = None
+        HASH_IN_FLIGHT.dec()
+        if not future.cancelled() and future.exception() is None:
+            _, waited, duration = future.result()
+            HASH_WAIT.observe(waited)
+            HASH_DURATION.observe(duration)
+
+    def _timed_out(self, future):
+        # Frees the slot if the hash has not started yet
+        future.cancel()
+        HASH_REJECTED.inc()
+        return HashPoolSaturated(retry_after=getattr(settings, 'AUTH_HASH_RETRY_AFTER', 1))
+
+    def run(self, func, *args):
+        future = self.submit(func, *args)
+        try:
+            return future.result(timeout=getattr(settings, 'AUTH_HASH_TIMEOUT', 10))[0]
+        except FutureTimeoutError:
+            raise self._timed_out(future) from None
+
+    async def arun(self, func, *args):
+        future = self.submit(func, *args)
+        try:
+            result = await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout=getattr(settings, 'AUTH_HASH_TIMEOUT', 10)
+            )
+        except asyncio.TimeoutError:
+            raise self._timed_out(future) from None
+        return result[0]
+
+    def rehash_later(self, user_id, password, old_encoded):
+        """Upgrade a user's password hash without delaying the login."""
+        try:
+            future = self.submit(_make_password, password)
+        except HashPoolSaturated:
+            # Upgraded on a later login instead
+            return
+        with self._lock:
+            if self._rehash_executor is None:
+                self._rehash_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rehash')
+            rehash_executor = self._rehash_executor
+        future.add_done_callback(
+            lambda done: rehash_executor.submit(_save_rehash, user_id, old_encoded, done)
+        )
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def reset(self):
+        self._executor = None
+        self._rehash_executor = None
+        self._pending = 0
+
+
+def _save_rehash(user_id, old_encoded, future):
+    from .authentication import invalidate_user
+    from .models import User
+
+    try:
+        encoded = future.result()[0]
+        # Skipped if the password was changed in the meantime
+        if User.objects.filter(pk=user_id, password=old_encoded).update(password=encoded):
+            invalidate_user(user_id)
+    except Exception:
+        logger.exception("Could not upgrade the password hash of user %s", user_id)
+    finally:
+        connections.close_all()
+
+
+hash_pool = HashPool()
+os.register_at_fork(after_in_child=hash_pool.reset)
+
+
+def _find_user(username):
+    from .models import User
+
+    try:
+        return User._default_manager.get_by_natural_key(username)
+    except User.DoesNotExist:
+        return None
+
+
+async def _afind_user(username):
+    from .models import User
+
+    return await User._default_manager.filter(**{User.USERNAME_FIELD: username}).afirst()
+
+
+def _verified(user, password, valid, must_update):
+    if valid and must_update:
+        hash_pool.rehash_later(user.pk, password, user.password)
+    # Same rule as ModelBackend: inactive users cannot log in
+    if valid and user.is_active:
+        return user
+    return None
+
+
+def authenticate_user(username, password):
+    """
+    Like ``authenticate`` with the model backend, with the hash computed in
+    the pool. Returns the user or ``None``.
+    """
+    user = _find_user(username)
+    if user is None:
+        # Hash anyway so unknown usernames take as long as wrong passwords
+        hash_pool.run(_make_password, password)
+        return None
+    valid, must_update = hash_pool.run(_check_password, password, user.password)
+    return _verified(user, password, valid, must_update)
+
+
+async def aauthenticate_user(username, password):
+    """Async variant of ``authenticate_user``."""
+    user = await _afind_user(username)
+    if user is None:
+        await hash_pool.arun(_make_password, password)
+        return None
+    valid, must_update = await hash_pool.arun(_check_password, password, user.password)
+    return _verified(user, password, valid, must_update)
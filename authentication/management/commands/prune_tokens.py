@@ -0,0 +1,39 @@
+"""
+Delete expired outstanding tokens, and their blacklist entries, in chunks.
+
+Unlike simplejwt's ``flushexpiredtokens`` this never loads the whole
+expired set at once or holds one long transaction, so it can run
+regularly against a large table while the API keeps serving refreshes::
+
+    python manage.py prune_tokens --chunk-size 5000 --sleep 0.1
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding and blacklisted tokens in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between chunks')
+
+    def handle(self, *args, **options):
+        cutoff = aware_utcnow()
+        expired = OutstandingToken.objects.filter(expires_at__lte=cutoff).order_by('id')
+        deleted = 0
+        last_id = 0
+        while True:
+            ids = list(expired.filter(id__gt=last_id).values_list('id', flat=True)[:options['chunk_size']])
+            if not ids:
+                break
+            # Their blacklist entries are deleted with them by the cascade
+            OutstandingToken.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+            last_id = ids[-1]
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired tokens'))
@@ -1,7 +1,9 @@
 from rest_framework import serializers
-from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
+from .hashing import authenticate_user
 from .models import User
+from .tokens import RefreshToken
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -33,23 +35,27 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return user
 
 
-class UserLoginSerializer(serializers.Serializer):
+class LoginCredentialsSerializer(serializers.Serializer):
     """
-    Serializer for user login.
+    Serializer for the login fields, without checking the credentials.
     """
     username = serializers.CharField()
     password = serializers.CharField(write_only=True)
 
+
+class UserLoginSerializer(LoginCredentialsSerializer):
+    """
+    Serializer for user login.
+    """
+
     def validate(self, attrs):
         username = attrs.get('username')
         password = attrs.get('password')
 
         if username and password:
-            user = authenticate(username=username, password=password)
+            user = authenticate_user(username, password)
             if not user:
                 raise serializers.ValidationError('Invalid credentials.')
-            if not user.is_active:
-                raise serializers.ValidationError('User account is disabled.')
             attrs['user'] = user
             return attrs
         else:
@@ -86,4 +92,11 @@ class PasswordChangeSerializer(serializers.Serializer):
         user = self.context['request'].user
         if not user.check_password(value):
             raise serializers.ValidationError('Old password is incorrect.')
-        return value
\ No newline at end of file
+        return value
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    """
+    Serializer for refreshing tokens, checking the blacklist through the
+    in-memory filter.
+    """
+    token_class = RefreshToken
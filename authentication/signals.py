@@ -0,0 +1,24 @@
+"""
+Signal handlers that keep cached users in sync with the database.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import clear_revocation, invalidate_user, revoke_user_tokens
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    # Covers password changes, profile updates and deactivation
+    invalidate_user(instance.pk)
+    if instance.is_active:
+        clear_revocation(instance.pk)
+    else:
+        revoke_user_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+    revoke_user_tokens(instance.pk)
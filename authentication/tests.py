@@ -1,3 +1,230 @@
-from django.test import TestCase
+import json
+import threading
+from concurrent.futures import Future
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken as BaseRefreshToken
+
+from .async_views import AsyncUserLoginView
+from .authentication import CachedJWTAuthentication, StatelessJWTAuthentication, get_cached_user
+from .blacklist import BlacklistIndex, BloomFilter, blacklist_index, is_blacklisted
+from .hashing import HashPoolSaturated, authenticate_user, hash_pool
+from .models import User
+from .tokens import RefreshToken
+
+
+class AuthenticationTestCase(TestCase):
+    def setUp(self):
+        # Primary keys are reused after each test's rollback
+        cache.clear()
+        caches['local'].clear()
+        self.user = User.objects.create_user(
+            'admin', 'admin@example.com', 'pass12345!', first_name='Ada', last_name='Admin'
+        )
+
+    def authenticate(self, authentication_class=CachedJWTAuthentication, user=None):
+        token = AccessToken.for_user(user or self.user)
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return authentication_class().authenticate(request)[0]
+
+
+class CachedUserTestCase(AuthenticationTestCase):
+    def test_cached_user_needs_no_query(self):
+        self.assertEqual(self.authenticate(), self.user)
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+        self.assertEqual(user.email, 'admin@example.com')
+
+    def test_returns_copies(self):
+        get_cached_user(self.user.pk).first_name = 'Changed'
+        self.assertEqual(get_cached_user(self.user.pk).first_name, 'Ada')
+
+    def test_deactivation_applies_immediately(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_password_change_applies_immediately(self):
+        get_cached_user(self.user.pk)
+        self.user.set_password('other12345!')
+        self.user.save()
+        self.assertTrue(get_cached_user(self.user.pk).check_password('other12345!'))
+
+    def test_deleted_user(self):
+        self.authenticate()
+        user_id = self.user.pk
+        self.user.delete()
+        self.assertIsNone(get_cached_user(user_id))
+
+    def test_stateless_authentication_runs_no_query(self):
+        with self.assertNumQueries(0):
+            user = self.authenticate(StatelessJWTAuthentication)
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_stateless_authentication_rejects_deactivated_users(self):
+        token = AccessToken.for_user(self.user)
+        self.user.is_active = False
+        self.user.save()
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        with self.assertRaises(AuthenticationFailed):
+            StatelessJWTAuthentication().authenticate(request)
+
+
+class BloomFilterTestCase(SimpleTestCase):
+    def test_membership(self):
+        bloom = BloomFilter(1000, 0.001)
+        values = [f'jti-{index}' for index in range(1000)]
+        for value in values:
+            bloom.add(value)
+        self.assertTrue(all(value in bloom for value in values))
+        false_positives = sum(f'other-{index}' in bloom for index in range(10000))
+        self.assertLess(false_positives, 50)
+
+    def test_count_ignores_repeated_values(self):
+        bloom = BloomFilter(100)
+        bloom.add('a')
+        bloom.add('a')
+        bloom.add('b')
+        self.assertEqual(bloom.count, 2)
+
+
+@override_settings(AUTH_BLACKLIST_REFRESH_INTERVAL=0)
+class BlacklistTestCase(AuthenticationTestCase):
+    def setUp(self):
+        super().setUp()
+        blacklist_index.reset()
+        self.addCleanup(blacklist_index.reset)
+
+    def test_blacklisted_by_this_process(self):
+        token = RefreshToken.for_user(self.user)
+        self.assertFalse(is_blacklisted(token['jti']))
+        token.blacklist()
+        self.assertTrue(is_blacklisted(token['jti']))
+        self.assertFalse(is_blacklisted(RefreshToken.for_user(self.user)['jti']))
+
+    def test_blacklisted_by_another_process(self):
+        self.assertFalse(is_blacklisted('unknown'))
+        token = BaseRefreshToken.for_user(self.user)
+        token.blacklist()
+        self.assertTrue(is_blacklisted(token['jti']))
+
+    def test_refresh_counts_each_token_once(self):
+        index = BlacklistIndex()
+        index.rebuild()
+        for _ in range(3):
+            BaseRefreshToken.for_user(self.user).blacklist()
+        with mock.patch.object(index, 'rebuild') as rebuild:
+            for _ in range(5):
+                index.refresh()
+        rebuild.assert_not_called()
+        self.assertEqual(index._filter.count, 3)
+
+    @override_settings(AUTH_BLACKLIST_CAPACITY=2)
+    def test_full_filter_is_rebuilt(self):
+        index = BlacklistIndex()
+        index.rebuild()
+        tokens = [BaseRefreshToken.for_user(self.user) for _ in range(5)]
+        for token in tokens:
+            token.blacklist()
+        index.refresh()
+        self.assertGreaterEqual(index._filter.capacity, 10)
+        self.assertTrue(all(index.might_contain(token['jti']) for token in tokens))
+
+    def test_logout_blacklists_refresh_token(self):
+        token = RefreshToken.for_user(self.user)
+        self.client.post(
+            '/api/v1/auth/logout/', {'refresh_token': str(token)},
+            HTTP_AUTHORIZATION=f'Bearer {token.access_token}', content_type='application/json',
+        )
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.post(
+                '/api/v1/auth/token/refresh/', {'refresh': str(token)}, content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 401)
+
+
+class LoginTestCase(AuthenticationTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        hash_pool.shutdown()
+        super().tearDownClass()
+
+    def login(self, password='pass12345!'):
+        return self.client.post(
+            '/api/v1/auth/login/', {'username': 'admin', 'password': password}, content_type='application/json'
+        )
+
+    def test_login(self):
+        response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['user']['username'], 'admin')
+        self.assertIn('refresh_token', response.json()['data'])
+        self.assertEqual(self.login('wrong').status_code, 400)
+
+    def test_unknown_and_inactive_users_are_rejected(self):
+        self.assertIsNone(authenticate_user('nobody', 'pass12345!'))
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertIsNone(authenticate_user('admin', 'pass12345!'))
+
+    async def test_async_login(self):
+        request = AsyncRequestFactory().post(
+            '/api/v1/auth/login/', json.dumps({'username': 'admin', 'password': 'pass12345!'}),
+            content_type='application/json'
+        )
+        response = await AsyncUserLoginView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['data']['user']['username'], 'admin')
+
+    @override_settings(AUTH_HASH_MAX_PENDING=0, AUTH_HASH_RETRY_AFTER=3)
+    def test_saturated_pool_rejects_logins(self):
+        with self.assertRaises(HashPoolSaturated):
+            authenticate_user('admin', 'pass12345!')
+        with self.assertLogs('django.request', 'ERROR'):
+            response = self.login()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+
+    def stalled_pool(self):
+        """Patch the pool so that hashes never finish."""
+        patcher = mock.patch.object(hash_pool, '_get_executor')
+        patcher.start().return_value.submit.side_effect = lambda *args: Future()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(AUTH_HASH_TIMEOUT=0.01, AUTH_HASH_RETRY_AFTER=2)
+    def test_timed_out_hashes_shed_load(self):
+        self.stalled_pool()
+        with self.assertRaises(HashPoolSaturated):
+            authenticate_user('admin', 'pass12345!')
+        with self.assertLogs('django.request', 'ERROR'):
+            response = self.login()
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '2'))
+        # The slots of the cancelled hashes are free again
+        self.assertEqual(hash_pool._pending, 0)
+
+    @override_settings(AUTH_HASH_TIMEOUT=0.01, AUTH_HASH_RETRY_AFTER=2)
+    async def test_async_timed_out_hashes_shed_load(self):
+        self.stalled_pool()
+        request = AsyncRequestFactory().post(
+            '/api/v1/auth/login/', json.dumps({'username': 'admin', 'password': 'pass12345!'}),
+            content_type='application/json'
+        )
+        response = await AsyncUserLoginView.as_view()(request)
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '2'))
+        self.assertEqual(hash_pool._pending, 0)
+
+    def test_outdated_hash_is_upgraded(self):
+        # Fewer iterations than the current default
+        encoded = PBKDF2PasswordHasher().encode('pass12345!', 'salt', iterations=1000)
+        User.objects.filter(pk=self.user.pk).update(password=encoded)
+        saved = threading.Event()
+        with mock.patch('authentication.hashing._save_rehash', side_effect=lambda *args: saved.set()) as save_rehash:
+            self.assertEqual(authenticate_user('admin', 'pass12345!'), self.user)
+            self.assertTrue(saved.wait(10))
+        self.assertEqual(save_rehash.call_args[0][:2], (self.user.pk, encoded))
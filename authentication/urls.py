@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
@@ -7,10 +8,14 @@ from .views import (
     UserProfileView,
     PasswordChangeView
 )
+from .async_views import AsyncUserLoginView
+
+# Under ASGI logins await the password hash instead of holding a thread
+login_view = AsyncUserLoginView if settings.ASYNC_PUBLIC_VIEWS else UserLoginView
 
 urlpatterns = [
     path('register/', UserRegistrationView.as_view(), name='user-register'),
-    path('login/', UserLoginView.as_view(), name='user-login'),
+    path('login/', login_view.as_view(), name='user-login'),
     path('logout/', UserLogoutView.as_view(), name='user-logout'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
     path('profile/', UserProfileView.as_view(), name='user-profile'),
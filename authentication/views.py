@@ -1,7 +1,6 @@
 from rest_framework import status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework.views import APIView
 from django.contrib.auth import update_session_auth_hash
@@ -14,7 +13,9 @@ from .serializers import (
     UserSerializer,
     PasswordChangeSerializer
 )
+from .hashing import HashPoolSaturated
 from .models import User
+from .tokens import RefreshToken
 from quiz_management.utils import success_response, error_response
 
 
@@ -70,12 +71,22 @@ class UserLoginView(APIView):
                     }
                 )
             ),
-            400: 'Bad Request'
+            400: 'Bad Request',
+            503: 'Too many logins in progress'
         }
     )
     def post(self, request):
         serializer = UserLoginSerializer(data=request.data)
-        if serializer.is_valid():
+        try:
+            is_valid = serializer.is_valid()
+        except HashPoolSaturated as exc:
+            response = error_response(
+                message="Too many logins in progress, please retry shortly",
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+            response['Retry-After'] = str(exc.retry_after)
+            return response
+        if is_valid:
             user = serializer.validated_data['user']
             refresh = RefreshToken.for_user(user)
             
@@ -30,5 +30,19 @@ else:
 "
 
 # Start server
-echo "Starting Django development server..."
-python manage.py runserver 0.0.0.0:8000
\ No newline at end of file
+case "${DEBUG:-True}" in
+  True|true|1|yes|on)
+    echo "Starting Django development server..."
+    python manage.py runserver 0.0.0.0:8000
+    ;;
+  *)
+    # Production: pre-forked workers, preloaded app and warm caches.
+    # Set SERVER_MODE=asgi to serve the async public views.
+    echo "Starting production server..."
+    if [ "$SERVER_MODE" = "asgi" ]; then
+        exec python manage.py serve --asgi
+    else
+        exec python manage.py serve
+    fi
+    ;;
+esac
\ No newline at end of file
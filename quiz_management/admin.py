@@ -0,0 +1,72 @@
+"""
+Admin building blocks for tables too large to list naively.
+
+``AutocompleteFilter`` filters a foreign key with the admin's autocomplete
+widget instead of one link per related row, so the sidebar loads no related
+objects. ``LargeTableAdmin`` pages with an estimated count and skips the
+second count of the unfiltered table.
+"""
+from django import forms
+from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.utils.translation import gettext as _
+
+from .pagination import EstimatedCountPaginator
+
+
+class AutocompleteFilter(admin.RelatedFieldListFilter):
+    """
+    ``list_filter = [('quiz', AutocompleteFilter)]``. The admin of the
+    related model needs ``search_fields``, and the model admin has to include
+    the widget's media (``LargeTableAdmin`` does).
+    """
+    template = 'admin/quiz_management/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.model_admin = model_admin
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def field_choices(self, field, request, model_admin):
+        # Looked up by the widget as the admin types
+        return []
+
+    def has_output(self):
+        return True
+
+    @property
+    def widget_id(self):
+        return f'autocomplete-filter-{self.field_path}'
+
+    def render_widget(self):
+        form_field = forms.ModelChoiceField(
+            queryset=self.field.remote_field.model._default_manager.all(),
+            to_field_name=self.field.target_field.name,
+            required=False,
+            widget=AutocompleteSelect(self.field, self.model_admin.admin_site, attrs={'id': self.widget_id}),
+        )
+        return form_field.widget.render(self.lookup_kwarg, self.lookup_val)
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': changelist.get_query_string(remove=[self.lookup_kwarg, self.lookup_kwarg_isnull]),
+            'display': _('All'),
+        }
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Model admin for tables with millions of rows: estimated counts, no full
+    result count and the media of ``AutocompleteFilter``.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @property
+    def media(self):
+        media = super().media
+        for list_filter in self.list_filter:
+            if isinstance(list_filter, tuple) and issubclass(list_filter[1], AutocompleteFilter):
+                field = self.model._meta.get_field(list_filter[0])
+                return media + AutocompleteSelect(field, self.admin_site).media
+        return media
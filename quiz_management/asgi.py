@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quiz_management.settings')
+# Turns off persistent database connections, which leak under ASGI
+os.environ['SERVING_ASGI'] = 'True'
+# The public endpoints have async-native views; use them under ASGI.
+os.environ.setdefault('ASYNC_PUBLIC_VIEWS', 'True')
 
 application = get_asgi_application()
@@ -0,0 +1,195 @@
+"""
+Tag-versioned caching.
+
+Cached values are grouped by tags: ``quiz:<id>`` for a quiz with its
+questions and options, ``quiz:<id>:responses`` for the responses to a quiz,
+``response:<session id>`` for one response and ``user:<id>`` for a user. Every tag has a version in the shared cache and
+keys embed the versions of their tags, so ``invalidate_tags`` makes every
+value cached under a tag unreachable in every process at once; the values
+themselves just expire. The signal handlers of the quizzes, responses and
+authentication apps invalidate the tags of every row saved or deleted, and
+code writing in bulk, which sends no signals, invalidates them itself.
+Inside ``batched_invalidation`` each tag is invalidated once, when the block
+ends, however many rows were written.
+
+``get_or_set`` is the cache-aside read: the process-local cache first, then
+the shared cache, then ``compute``. The tag versions are read from the
+shared cache on every call, so neither layer serves a value after its tags
+were invalidated. Values are computed from the primary database, and tags
+invalidated inside a transaction are invalidated again when it commits, so a
+read racing a write cannot cache old data under the new versions.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import cache, caches
+from django.db import transaction
+
+from . import metrics
+from .metrics import record_cache_lookup
+
+INVALIDATIONS = metrics.Counter(
+    'cache_invalidations_total', 'Cache tags invalidated, by kind of tag.', ('kind',)
+)
+
+SHARED_TIMEOUT = 60 * 15
+
+# Tags invalidated inside the current batch; None outside a batch
+_pending_tags = ContextVar('quiz_management_pending_tags', default=None)
+
+
+def quiz_tag(quiz_id):
+    return f'quiz:{quiz_id}'
+
+
+def responses_tag(quiz_id):
+    return f'quiz:{quiz_id}:responses'
+
+
+def response_tag(session_id):
+    return f'response:{session_id}'
+
+
+def user_tag(user_id):
+    return f'user:{user_id}'
+
+
+def _tag_kind(tag):
+    parts = tag.split(':')
+    return parts[2] if len(parts) > 2 else parts[0]
+
+
+def _version_key(tag):
+    return f'tag:{tag}'
+
+
+def _new_version():
+    # Time based, so a version key that was evicted never comes back with a
+    # value that still matches an old entry.
+    return time.time_ns()
+
+
+def _versioned_key(key, versions):
+    return '{}:{}'.format(key, '.'.join(str(version) for version in versions))
+
+
+def _primary_reads():
+    # Imported late: the routers import the middleware and with it DRF, whose
+    # settings import the authentication classes, which use this module
+    from .db.routers import primary_reads
+    return primary_reads()
+
+
+def get_tag_versions(tags):
+    """The current versions of ``tags``, in order."""
+    keys = [_version_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            versions[key] = _new_version()
+            cache.add(key, versions[key], None)
+        # Whoever added a version first wins
+        versions.update(cache.get_many(missing))
+    return [versions[key] for key in keys]
+
+
+async def aget_tag_versions(tags):
+    """Async variant of ``get_tag_versions``."""
+    keys = [_version_key(tag) for tag in tags]
+    versions = await cache.aget_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            versions[key] = _new_version()
+            await cache.aadd(key, versions[key], None)
+        versions.update(await cache.aget_many(missing))
+    return [versions[key] for key in keys]
+
+
+def _replace_versions(tags):
+    version = _new_version()
+    cache.set_many({_version_key(tag): version for tag in tags}, None)
+
+
+def invalidate_tags(*tags):
+    """Drop every value cached under any of ``tags``."""
+    if not tags:
+        return
+    pending = _pending_tags.get()
+    if pending is not None:
+        pending.update(tags)
+        return
+    _replace_versions(tags)
+    for tag in tags:
+        INVALIDATIONS.inc(kind=_tag_kind(tag))
+    if transaction.get_connection().in_atomic_block:
+        # Readers may have cached what they read before the commit
+        transaction.on_commit(lambda: _replace_versions(tags))
+
+
+@contextmanager
+def batched_invalidation():
+    """Invalidate the tags invalidated in the block once, when it ends."""
+    if _pending_tags.get() is not None:
+        yield
+        return
+    pending = set()
+    token = _pending_tags.set(pending)
+    try:
+        yield
+    finally:
+        _pending_tags.reset(token)
+        invalidate_tags(*pending)
+
+
+def get_or_set(name, key, tags, compute, timeout=SHARED_TIMEOUT, local=True):
+    """
+    Return the value cached as ``key`` under ``tags``, calling ``compute()``
+    to produce it on a miss. ``None`` is returned but not cached. Lookups are
+    counted as ``name`` (shared cache) and ``<name>_local``; ``local=False``
+    skips the process-local cache, e.g. for callers that keep their own.
+    """
+    key = _versioned_key(key, get_tag_versions(tags))
+    local_cache = caches['local']
+    if local:
+        value = local_cache.get(key)
+        record_cache_lookup(f'{name}_local', value is not None)
+        if value is not None:
+            return value
+    value = cache.get(key)
+    record_cache_lookup(name, value is not None)
+    if value is None:
+        with _primary_reads():
+            value = compute()
+        if value is None:
+            return None
+        cache.set(key, value, timeout)
+    if local:
+        local_cache.set(key, value)
+    return value
+
+
+async def aget_or_set(name, key, tags, compute, timeout=SHARED_TIMEOUT, local=True):
+    """Async variant of ``get_or_set``; ``compute`` is a coroutine function."""
+    key = _versioned_key(key, await aget_tag_versions(tags))
+    # The local cache is in memory; its async methods would only add a
+    # thread hop
+    local_cache = caches['local']
+    if local:
+        value = local_cache.get(key)
+        record_cache_lookup(f'{name}_local', value is not None)
+        if value is not None:
+            return value
+    value = await cache.aget(key)
+    record_cache_lookup(name, value is not None)
+    if value is None:
+        with _primary_reads():
+            value = await compute()
+        if value is None:
+            return None
+        await cache.aset(key, value, timeout)
+    if local:
+        local_cache.set(key, value)
+    return value
@@ -0,0 +1,125 @@
+"""
+Conditional requests for detail views.
+
+Views using ``ConditionalRequestMixin`` describe the current version of a
+resource with ``get_validators()``, a cheap query that returns an ETag and a
+last modification time without loading the resource itself:
+
+- ``GET`` with a matching ``If-None-Match`` (or an ``If-Modified-Since`` not
+  older than the resource) returns ``304 Not Modified``.
+- ``PUT``/``PATCH`` with an ``If-Match`` that no longer matches fails with
+  ``412 Precondition Failed``, so concurrent editors do not overwrite each
+  other's changes. The check and the update run in one transaction with the
+  resource row locked. With ``REQUIRE_IF_MATCH`` enabled, updates without
+  ``If-Match`` fail with ``428 Precondition Required``.
+
+ETags name versions of the resource rather than exact bytes, and stay the
+same when a response is compressed or shaped by ``?fields=``.
+``If-None-Match`` compares them weakly; ``If-Match`` compares them strongly,
+so a weak ETag never authorizes an update. ``If-Unmodified-Since`` is not a
+precondition for updates: dates have a resolution of one second, and two
+edits within the same second would look alike.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponseNotModified
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from drf_yasg import openapi
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The resource was modified since it was fetched. Fetch it again and retry.'
+    default_code = 'precondition_failed'
+
+
+class PreconditionRequired(APIException):
+    status_code = status.HTTP_428_PRECONDITION_REQUIRED
+    default_detail = 'Updates must send the ETag of the resource in an If-Match header.'
+    default_code = 'precondition_required'
+
+
+IF_NONE_MATCH_PARAMETER = openapi.Parameter(
+    'If-None-Match', openapi.IN_HEADER, type=openapi.TYPE_STRING,
+    description="ETag of a cached copy; answered with 304 if it is still current"
+)
+IF_MATCH_PARAMETER = openapi.Parameter(
+    'If-Match', openapi.IN_HEADER, type=openapi.TYPE_STRING,
+    description="ETag the update is based on; answered with 412 if the resource changed since"
+)
+
+
+def make_etag(*parts):
+    return '"%s"' % '-'.join(str(part) for part in parts)
+
+
+def _opaque(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def _etag_matches(header, etag):
+    etags = parse_etags(header)
+    return '*' in etags or _opaque(etag) in {_opaque(tag) for tag in etags}
+
+
+def _etag_matches_strongly(header, etag):
+    etags = parse_etags(header)
+    return '*' in etags or (not etag.startswith('W/') and etag in etags)
+
+
+class ConditionalRequestMixin:
+    """
+    Adds ETag/Last-Modified handling to ``RetrieveModelMixin`` and
+    ``UpdateModelMixin`` views. Subclasses implement ``get_validators``.
+    """
+
+    def get_validators(self, for_update=False):
+        """
+        Return ``(etag, last_modified)`` for the requested resource, or
+        ``None`` if it does not exist. With ``for_update`` the row should be
+        locked with ``select_for_update``.
+        """
+        raise NotImplementedError
+
+    def set_validator_headers(self, response, validators):
+        if validators is not None and (status.is_success(response.status_code) or response.status_code == 304):
+            etag, last_modified = validators
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
+
+    def is_not_modified(self, request, etag, last_modified):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return _etag_matches(if_none_match, etag)
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since'))
+        return if_modified_since is not None and int(last_modified.timestamp()) <= if_modified_since
+
+    def check_update_preconditions(self, request, validators):
+        if validators is None:
+            # Let the view answer 404
+            return
+        etag = validators[0]
+        if_match = request.headers.get('If-Match')
+        if if_match is not None:
+            if not _etag_matches_strongly(if_match, etag):
+                raise PreconditionFailed()
+            return
+        if getattr(settings, 'REQUIRE_IF_MATCH', False):
+            raise PreconditionRequired()
+
+    def retrieve(self, request, *args, **kwargs):
+        validators = self.get_validators()
+        if validators is not None and self.is_not_modified(request, *validators):
+            response = HttpResponseNotModified()
+            return self.set_validator_headers(response, validators)
+        response = super().retrieve(request, *args, **kwargs)
+        return self.set_validator_headers(response, validators)
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            self.check_update_preconditions(request, self.get_validators(for_update=True))
+            response = super().update(request, *args, **kwargs)
+        return self.set_validator_headers(response, self.get_validators())
@@ -0,0 +1,51 @@
+"""
+Database backends that check connections out of ``quiz_management.db.pool``.
+
+Configure the pool with a ``POOL`` entry in the database settings, e.g.
+``{'max_size': 10, 'timeout': 5.0}``; see ``ConnectionPool`` for all keys.
+"""
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Replaces opening and closing the raw connection with a pool checkout
+    and checkin. Everything else is left to the vendor backend.
+    """
+
+    @property
+    def pool(self):
+        return self._get_pool()
+
+    def _get_pool(self):
+        from quiz_management.db.pool import get_pool
+        return get_pool(self.alias, self.settings_dict.get('POOL', {}))
+
+    def get_new_connection(self, conn_params):
+        return self.pool.checkout(
+            lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params),
+            self.ping_connection,
+        )
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # A connection closed inside an atomic block is left in an unknown
+        # state, and one that raised errors may be broken; don't reuse them.
+        reusable = not self.in_atomic_block and not self.errors_occurred
+        if reusable:
+            try:
+                self.reset_connection(self.connection)
+            except Exception:
+                reusable = False
+        self.pool.checkin(self.connection, reusable=reusable)
+
+    def ping_connection(self, connection):
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        finally:
+            cursor.close()
+
+    def reset_connection(self, connection):
+        """Roll back anything left open before the connection is reused."""
+        raise NotImplementedError
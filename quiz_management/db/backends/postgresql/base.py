@@ -0,0 +1,18 @@
+from django.db.backends.postgresql import base
+
+from quiz_management.db.backends import PooledDatabaseWrapperMixin
+
+# Same value in psycopg2 (TRANSACTION_STATUS_IDLE) and psycopg 3 (TransactionStatus.IDLE)
+TRANSACTION_STATUS_IDLE = 0
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """
+    PostgreSQL backend with pooled connections.
+    """
+
+    def reset_connection(self, connection):
+        if connection.closed:
+            raise base.Database.InterfaceError('connection already closed')
+        if connection.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            connection.rollback()
@@ -0,0 +1,24 @@
+from django.db.backends.sqlite3 import base
+
+from quiz_management.db.backends import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """
+    SQLite backend with pooled connections, used as a local stand-in for
+    PostgreSQL when testing the pool. In-memory databases are not pooled.
+    """
+
+    def get_new_connection(self, conn_params):
+        if self.is_in_memory_db():
+            return base.DatabaseWrapper.get_new_connection(self, conn_params)
+        return super().get_new_connection(conn_params)
+
+    def _close(self):
+        if self.is_in_memory_db():
+            return base.DatabaseWrapper._close(self)
+        return super()._close()
+
+    def reset_connection(self, connection):
+        if connection.in_transaction:
+            connection.rollback()
@@ -0,0 +1,215 @@
+"""
+In-process database connection pool.
+
+Django opens one connection per thread and, with ``CONN_MAX_AGE = 0``,
+closes it at the end of every request. The pooled backends in
+``quiz_management.db.backends`` hand those connections back to a pool
+instead, so requests reuse already established connections. The pool is
+thread-safe and shared by all threads of a worker process, which includes
+the threads that run ORM calls for async views.
+"""
+import collections
+import os
+import threading
+import time
+
+from django.db import OperationalError
+
+from quiz_management import metrics
+
+POOL_IN_USE = metrics.Gauge(
+    'db_pool_connections_in_use', 'Pooled connections checked out by a thread.', ('alias',)
+)
+POOL_IDLE = metrics.Gauge(
+    'db_pool_connections_idle', 'Open pooled connections waiting to be checked out.', ('alias',)
+)
+POOL_WAITERS = metrics.Gauge(
+    'db_pool_waiters', 'Threads waiting for a pooled connection.', ('alias',)
+)
+POOL_WAIT = metrics.Histogram(
+    'db_pool_wait_seconds', 'Time spent waiting to check out a pooled connection.', ('alias',),
+    buckets=(0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+POOL_TIMEOUTS = metrics.Counter(
+    'db_pool_timeouts_total', 'Checkouts that gave up after the pool timeout.', ('alias',)
+)
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Connections inherited from the parent process must never be closed by a
+# forked child, or the parent's sessions would be terminated with them.
+_inherited = []
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class PooledConnection:
+    __slots__ = ('connection', 'created_at', 'last_used')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    Bounded pool of raw DB-API connections for one database alias.
+
+    ``max_size`` bounds the number of open connections (idle plus in use).
+    A checkout waits up to ``timeout`` seconds for a free connection and
+    then raises ``PoolTimeout``. Idle connections are pinged before reuse
+    once they have been idle for ``health_check_after`` seconds, and
+    connections older than ``max_lifetime`` seconds are replaced.
+    """
+
+    def __init__(self, alias, max_size=10, timeout=5.0, health_check_after=10.0, max_lifetime=1800.0):
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self.max_lifetime = max_lifetime
+        self._idle = collections.deque()
+        self._in_use = {}
+        self._waiters = 0
+        self._condition = threading.Condition()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'alias': self.alias,
+                'max_size': self.max_size,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'waiters': self._waiters,
+            }
+
+    def checkout(self, connect, ping):
+        """
+        Return a healthy raw connection, reusing an idle one when possible.
+        ``connect()`` opens a new connection and ``ping(connection)`` raises
+        if a connection is no longer usable.
+        """
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while True:
+            entry = None
+            with self._condition:
+                while not self._idle and len(self._in_use) >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        POOL_TIMEOUTS.inc(alias=self.alias)
+                        raise PoolTimeout(
+                            f"Timed out after {self.timeout}s waiting for a connection "
+                            f"to '{self.alias}' (pool size {self.max_size})"
+                        )
+                    self._waiters += 1
+                    POOL_WAITERS.inc(alias=self.alias)
+                    try:
+                        self._condition.wait(remaining)
+                    finally:
+                        self._waiters -= 1
+                        POOL_WAITERS.dec(alias=self.alias)
+                if self._idle:
+                    entry = self._idle.pop()
+                    POOL_IDLE.dec(alias=self.alias)
+                # Reserve the slot before connecting outside the lock
+                placeholder = entry or object()
+                self._in_use[id(placeholder)] = placeholder
+                POOL_IN_USE.inc(alias=self.alias)
+
+            try:
+                if entry is not None and not self._is_healthy(entry, ping):
+                    self._discard(entry.connection)
+                    entry = None
+                if entry is None:
+                    entry = PooledConnection(connect())
+            except Exception:
+                self._release(placeholder)
+                raise
+            with self._condition:
+                del self._in_use[id(placeholder)]
+                self._in_use[id(entry.connection)] = entry
+            POOL_WAIT.observe(time.monotonic() - started, alias=self.alias)
+            return entry.connection
+
+    def checkin(self, connection, reusable=True):
+        """Return a connection to the pool, or close it if it is not reusable."""
+        with self._condition:
+            entry = self._in_use.pop(id(connection), None)
+            if entry is None:
+                reusable = False
+            else:
+                POOL_IN_USE.dec(alias=self.alias)
+                if reusable and time.monotonic() - entry.created_at < self.max_lifetime:
+                    entry.last_used = time.monotonic()
+                    self._idle.append(entry)
+                    POOL_IDLE.inc(alias=self.alias)
+                else:
+                    reusable = False
+            self._condition.notify()
+        if not reusable:
+            self._discard(connection)
+
+    def close_all(self):
+        """Close every idle connection; checked-out ones are closed on checkin."""
+        with self._condition:
+            idle, self._idle = list(self._idle), collections.deque()
+            POOL_IDLE.dec(len(idle), alias=self.alias)
+        for entry in idle:
+            self._discard(entry.connection)
+
+    def _release(self, placeholder):
+        with self._condition:
+            del self._in_use[id(placeholder)]
+            POOL_IN_USE.dec(alias=self.alias)
+            self._condition.notify()
+
+    def _is_healthy(self, entry, ping):
+        now = time.monotonic()
+        if now - entry.created_at >= self.max_lifetime:
+            return False
+        if now - entry.last_used < self.health_check_after:
+            return True
+        try:
+            ping(entry.connection)
+        except Exception:
+            return False
+        return True
+
+    @staticmethod
+    def _discard(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def get_pool(alias, options):
+    """Return the process-wide pool for ``alias``, creating it on first use."""
+    pool = _pools.get(alias)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None:
+                pool = _pools[alias] = ConnectionPool(alias, **options)
+    return pool
+
+
+def pool_stats():
+    return [pool.stats() for pool in _pools.values()]
+
+
+def close_pools():
+    """Close the idle connections of every pool, e.g. before forking workers."""
+    for pool in list(_pools.values()):
+        pool.close_all()
+
+
+def _forget_pools_after_fork():
+    _inherited.extend(_pools.values())
+    _pools.clear()
+
+
+os.register_at_fork(after_in_child=_forget_pools_after_fork)
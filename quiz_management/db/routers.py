@@ -0,0 +1,200 @@
+"""
+Read-replica routing.
+
+Reads are sent to a replica only inside ``replica_reads()``, which the
+``ReplicaRoutingMiddleware`` enters for safe requests to the URL names in
+``DATABASE_REPLICA_VIEWS`` and which commands can use for analytics
+queries. A replica is picked by weight among the ones that are reachable,
+once per request or block, so all reads of a request see the same replica
+at the same lag; an unreachable replica is skipped for
+``DATABASE_REPLICA_RETRY_SECONDS`` and reads fall back to the primary when
+none is left.
+
+Clients that just wrote are pinned to the primary for
+``DATABASE_REPLICA_PIN_SECONDS``, so e.g. a result read right after
+submitting a quiz never hits a lagging replica. The pin is sent as a cookie
+and as the ``X-DB-Primary-Pin`` header, which API clients that do not keep
+cookies (cross-origin ones) send back as is.
+"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from quiz_management.middleware import resolve_url_name
+
+logger = logging.getLogger('quiz_management')
+
+PIN_COOKIE = 'db_primary_pin'
+PIN_HEADER = 'X-DB-Primary-Pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_replica_reads = ContextVar('quiz_management_replica_reads', default=False)
+# {'alias': ...} once the replica of the current request or block is chosen;
+# a dict so the choice made in a sync_to_async thread is seen by the request
+_chosen_replica = ContextVar('quiz_management_chosen_replica', default=None)
+# Set once the current request or task wrote, so its own reads see the write
+_wrote = ContextVar('quiz_management_wrote', default=False)
+
+_unavailable_until = {}
+_unavailable_lock = threading.Lock()
+
+
+def replica_weights():
+    """Return ``{alias: weight}`` of the configured replicas."""
+    return getattr(settings, 'DATABASE_REPLICAS', {})
+
+
+def mark_unavailable(alias):
+    retry = getattr(settings, 'DATABASE_REPLICA_RETRY_SECONDS', 30)
+    with _unavailable_lock:
+        _unavailable_until[alias] = time.monotonic() + retry
+    logger.warning("Replica '%s' is unavailable; reading from the primary for %ss", alias, retry)
+
+
+def _is_available(alias):
+    until = _unavailable_until.get(alias)
+    if until is not None and until > time.monotonic():
+        return False
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError:
+        mark_unavailable(alias)
+        return False
+    return True
+
+
+def choose_replica():
+    """Pick a reachable replica by weight, or ``None`` to use the primary."""
+    candidates = dict(replica_weights())
+    while candidates:
+        aliases = list(candidates)
+        alias = random.choices(aliases, weights=[candidates[name] for name in aliases])[0]
+        if _is_available(alias):
+            return alias
+        del candidates[alias]
+    return None
+
+
+@contextmanager
+def replica_reads():
+    """Route reads in this block to a replica when one is available."""
+    token = _replica_reads.set(True)
+    chosen_token = _chosen_replica.set({})
+    try:
+        yield
+    finally:
+        _chosen_replica.reset(chosen_token)
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """Route reads in this block to the primary, e.g. to fill a cache."""
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Sends reads to a replica inside ``replica_reads()`` and everything else
+    to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or _wrote.get() or not replica_weights():
+            return None
+        # Reads inside a transaction must see its writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        chosen = _chosen_replica.get()
+        if chosen is None:
+            return choose_replica()
+        if 'alias' not in chosen:
+            chosen['alias'] = choose_replica()
+        return chosen['alias']
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Enables replica reads for safe requests to ``DATABASE_REPLICA_VIEWS``
+    and pins clients to the primary for a short window after they write.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.replica_views = set(getattr(settings, 'DATABASE_REPLICA_VIEWS', ()))
+        self.pin_seconds = getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 5)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        tokens = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self._reset(tokens)
+        return self._finish(request, response)
+
+    async def __acall__(self, request):
+        tokens = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._reset(tokens)
+        return self._finish(request, response)
+
+    def _start(self, request):
+        use_replica = (
+            bool(replica_weights())
+            and request.method in SAFE_METHODS
+            and not self._is_pinned(request)
+            and resolve_url_name(request) in self.replica_views
+        )
+        return _replica_reads.set(use_replica), _chosen_replica.set({}), _wrote.set(False)
+
+    def _reset(self, tokens):
+        replica_token, chosen_token, wrote_token = tokens
+        _replica_reads.reset(replica_token)
+        _chosen_replica.reset(chosen_token)
+        _wrote.reset(wrote_token)
+
+    def _is_pinned(self, request):
+        pins = (request.headers.get(PIN_HEADER), request.COOKIES.get(PIN_COOKIE))
+        try:
+            return any(float(pin) > time.time() for pin in pins if pin)
+        except ValueError:
+            return False
+
+    def _finish(self, request, response):
+        if replica_weights() and request.method not in SAFE_METHODS and response.status_code < 400:
+            pinned_until = str(time.time() + self.pin_seconds)
+            response.set_cookie(
+                PIN_COOKIE, pinned_until, max_age=self.pin_seconds, httponly=True, samesite='Lax',
+            )
+            response[PIN_HEADER] = pinned_until
+        return response
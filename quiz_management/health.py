@@ -0,0 +1,35 @@
+"""
+Process readiness state shared by the serve command and the health endpoints.
+"""
+import time
+
+_state = {
+    'ready': True,
+    'started_at': time.time(),
+    'startup_seconds': None,
+}
+
+
+def mark_starting():
+    """Report not-ready until ``mark_ready`` is called (e.g. while warming caches)."""
+    _state['ready'] = False
+    _state['started_at'] = time.time()
+
+
+def mark_ready():
+    _state['ready'] = True
+    _state['startup_seconds'] = round(time.time() - _state['started_at'], 3)
+    return _state['startup_seconds']
+
+
+def mark_stopping():
+    """Report not-ready while the process drains in-flight requests."""
+    _state['ready'] = False
+
+
+def is_ready():
+    return _state['ready']
+
+
+def startup_seconds():
+    return _state['startup_seconds']
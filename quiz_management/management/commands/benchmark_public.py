@@ -0,0 +1,135 @@
+"""
+Load generator for the public quiz endpoints.
+
+Run it against the same database served once by the sync WSGI stack and
+once by the async ASGI stack to compare them at high concurrency::
+
+    python manage.py benchmark_public --base-url http://127.0.0.1:8000 \\
+        --quiz-id 1 --session-id <session id> --concurrency 200 --requests 5000
+"""
+import http.client
+import json
+import statistics
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+ENDPOINTS = ('list', 'detail', 'result', 'submit')
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the public quiz endpoints of a running server at high concurrency.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--quiz-id', type=int, required=True)
+        parser.add_argument('--session-id', help='Session id of a completed response, for the result endpoint')
+        parser.add_argument('--concurrency', type=int, default=100)
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint')
+        parser.add_argument(
+            '--endpoints', default='list,detail,result',
+            help=f"Comma separated subset of {', '.join(ENDPOINTS)}"
+        )
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['base_url'])
+        self.host, self.port = url.hostname, url.port or 80
+        quiz_id = options['quiz_id']
+        endpoints = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+        unknown = set(endpoints) - set(ENDPOINTS)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        status_code, quiz = self._request('GET', f'/api/v1/public/quizzes/{quiz_id}/')
+        if status_code != 200:
+            raise CommandError(f'Quiz {quiz_id} is not available (HTTP {status_code})')
+        answers = [
+            {'question_id': question['id'], 'selected_option_id': question['options'][0]['id']}
+            if question['options'] else {'question_id': question['id'], 'text_answer': 'benchmark'}
+            for question in quiz['questions']
+        ]
+
+        session_id = options['session_id']
+
+        requests = {
+            'list': lambda: ('GET', '/api/v1/public/quizzes/', None),
+            'detail': lambda: ('GET', f'/api/v1/public/quizzes/{quiz_id}/', None),
+            'result': lambda: ('GET', f'/api/v1/public/results/{session_id}/', None),
+            'submit': lambda: ('POST', f'/api/v1/public/quizzes/{quiz_id}/submit/', self._submission(answers)),
+        }
+
+        self.stdout.write(
+            f"{'endpoint':<10}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        )
+        for name in endpoints:
+            if name == 'result' and not session_id:
+                self.stderr.write('Skipping result: pass --session-id of a completed response')
+                continue
+            latencies, errors, elapsed = self._run(requests[name], options['requests'], options['concurrency'])
+            quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+            self.stdout.write(
+                f'{name:<10}{len(latencies):>10}{errors:>8}{len(latencies) / elapsed:>10.0f}'
+                f'{quantiles[49] * 1000:>10.1f}{quantiles[94] * 1000:>10.1f}{quantiles[98] * 1000:>10.1f}'
+            )
+
+    def _submission(self, answers):
+        return {
+            'participant_name': 'Benchmark',
+            'participant_email': f'bench-{uuid.uuid4().hex}@example.com',
+            'answers': answers,
+        }
+
+    def _request(self, method, path, payload=None, connection=None):
+        connection = connection or http.client.HTTPConnection(self.host, self.port, timeout=30)
+        body = json.dumps(payload) if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body else {}
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        data = response.read()
+        try:
+            return response.status, json.loads(data)
+        except ValueError:
+            return response.status, data
+
+    def _run(self, build_request, total, concurrency):
+        latencies = []
+        errors = 0
+        lock = threading.Lock()
+        remaining = [total]
+
+        def worker():
+            nonlocal errors
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        break
+                    remaining[0] -= 1
+                method, path, payload = build_request()
+                start = time.perf_counter()
+                try:
+                    status_code, _ = self._request(method, path, payload, connection)
+                    failed = status_code >= 400
+                except (OSError, http.client.HTTPException):
+                    failed = True
+                    connection.close()
+                    connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    if failed:
+                        errors += 1
+                    else:
+                        latencies.append(elapsed)
+            connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, errors, time.perf_counter() - started
@@ -0,0 +1,77 @@
+"""
+Compare JSON encoders and response compression on real payloads.
+
+Serializes the payloads of representative endpoints once, then times the
+stdlib based ``JSONRenderer`` against ``FastJSONRenderer`` and reports the
+bytes on the wire uncompressed, gzipped and (if installed) brotli encoded::
+
+    python manage.py benchmark_renderers --quiz-id 1 --iterations 200
+"""
+import gzip
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from rest_framework.renderers import JSONRenderer
+
+from quiz_management import renderers
+from quiz_management.middleware import brotli
+from quiz_management.utils import success_response
+from quizzes.models import Quiz
+from quizzes.serializers import QuizPublicSerializer, QuizSerializer
+from responses.models import QuizResponse
+from responses.serializers import QuizResponseListSerializer, QuizResponseSerializer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark JSON encoding time and compressed sizes of representative API payloads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz-id', type=int, help='Defaults to the quiz with the most questions')
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--page-size', type=int, default=20, help='Responses per list page')
+
+    def handle(self, *args, **options):
+        if options['quiz_id']:
+            quiz = Quiz.objects.filter(pk=options['quiz_id']).first()
+        else:
+            quiz = Quiz.objects.annotate(question_count=Count('questions')).order_by('-question_count').first()
+        if quiz is None:
+            raise CommandError('No quiz to benchmark with')
+
+        responses = QuizResponse.objects.filter(quiz=quiz, is_completed=True).order_by('-submitted_at')
+        payloads = {
+            'public quiz detail': QuizPublicSerializer(quiz).data,
+            'admin quiz detail': QuizSerializer(quiz).data,
+            'admin response list': QuizResponseListSerializer(responses[:options['page_size']], many=True).data,
+        }
+        latest = responses.first()
+        if latest is not None:
+            payloads['admin response detail'] = QuizResponseSerializer(latest).data
+
+        if renderers.orjson is None:
+            self.stderr.write('orjson is not installed; the fast renderer falls back to the stdlib encoder')
+        stdlib, fast = JSONRenderer(), renderers.FastJSONRenderer()
+        self.stdout.write(
+            f"{'payload':<24}{'stdlib ms':>11}{'fast ms':>9}{'speedup':>9}"
+            f"{'bytes':>10}{'gzip':>9}{'brotli':>9}"
+        )
+        for name, data in payloads.items():
+            # Rendered inside the response envelope, as the views do
+            data = success_response(data=data).data
+            stdlib_seconds = self._time(stdlib, data, options['iterations'])
+            fast_seconds = self._time(fast, data, options['iterations'])
+            content = fast.render(data)
+            brotli_size = len(brotli.compress(content, quality=5)) if brotli is not None else None
+            self.stdout.write(
+                f'{name:<24}{stdlib_seconds * 1000:>11.3f}{fast_seconds * 1000:>9.3f}'
+                f'{stdlib_seconds / fast_seconds:>8.1f}x{len(content):>10}'
+                f'{len(gzip.compress(content, compresslevel=6)):>9}'
+                f"{brotli_size if brotli_size is not None else '-':>9}"
+            )
+
+    def _time(self, renderer, data, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            renderer.render(data)
+        return (time.perf_counter() - started) / iterations
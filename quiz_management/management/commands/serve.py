@@ -0,0 +1,178 @@
+"""
+Production server: gunicorn with pre-forked workers and warm caches.
+
+The application is loaded and its caches are warmed once in the master
+process before the workers are forked, so the loaded code and the local
+memory cache are shared copy-on-write. ``--asgi`` serves the async views
+through uvicorn workers instead of the sync WSGI stack.
+"""
+import logging
+import os
+import shutil
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+
+from quiz_management import health, metrics
+from quiz_management.db.pool import close_pools
+
+logger = logging.getLogger('quiz_management')
+
+
+def default_worker_count(asgi=False):
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    # Async workers multiplex requests on an event loop; sync workers block
+    return cpus + 1 if asgi else cpus * 2 + 1
+
+
+def use_asgi_connections():
+    """
+    Apply ``SERVING_ASGI`` to the already loaded settings: persistent
+    database connections leak under ASGI, so they are turned off.
+    """
+    settings.SERVING_ASGI = True
+    for database in settings.DATABASES.values():
+        database['CONN_MAX_AGE'] = 0
+
+
+def use_async_views():
+    """
+    Route the public endpoints to their async views, unless
+    ``ASYNC_PUBLIC_VIEWS`` is set explicitly. The URLconfs choose their views
+    when they are imported, so this has to run before anything loads them,
+    the system checks included.
+    """
+    if 'ASYNC_PUBLIC_VIEWS' not in os.environ:
+        settings.ASYNC_PUBLIC_VIEWS = True
+    if 'responses.urls' in sys.modules or 'authentication.urls' in sys.modules:
+        logger.warning("URLconfs were loaded before ASYNC_PUBLIC_VIEWS was applied; sync views are served")
+
+
+def warm_caches():
+    """Warm the public quiz payloads, answer keys and the API schema."""
+    from quizzes.cache import warm_quiz_caches
+
+    quiz_count = warm_quiz_caches()
+
+    hosts = [host for host in settings.ALLOWED_HOSTS if host and '*' not in host and not host.startswith('.')]
+    client = Client(HTTP_HOST=hosts[0] if hosts else 'localhost')
+    client.get('/swagger.json')
+    return quiz_count
+
+
+class Command(BaseCommand):
+    help = 'Run the production server with pre-forked workers and warmed caches.'
+    # Run by handle once the views to serve are chosen
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bind', default=f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+        parser.add_argument('--asgi', action='store_true', help='Serve the ASGI application with uvicorn workers')
+        parser.add_argument('--workers', type=int, help='Defaults to a value derived from the CPU count')
+        parser.add_argument('--threads', type=int, default=4, help='Threads per sync worker')
+        parser.add_argument('--timeout', type=int, default=30)
+        parser.add_argument('--graceful-timeout', type=int, default=30)
+        parser.add_argument('--max-requests', type=int, default=0, help='Recycle workers after this many requests')
+        parser.add_argument('--no-warmup', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            from gunicorn.app.base import BaseApplication
+        except ImportError:
+            raise CommandError('gunicorn is required: pip install gunicorn')
+        if options['asgi']:
+            try:
+                import uvicorn.workers  # noqa: F401
+            except ImportError:
+                raise CommandError('uvicorn is required for --asgi: pip install uvicorn')
+
+        asgi = options['asgi']
+        if asgi:
+            use_async_views()
+        self.check()
+
+        health.mark_starting()
+        started = time.perf_counter()
+        warmup = not options['no_warmup']
+
+        # Snapshots of a previous run would otherwise be merged into /metrics/
+        shutil.rmtree(settings.METRICS_DIR, ignore_errors=True)
+
+        config = {
+            'bind': options['bind'],
+            'workers': options['workers'] or default_worker_count(asgi),
+            'timeout': options['timeout'],
+            'graceful_timeout': options['graceful_timeout'],
+            'max_requests': options['max_requests'],
+            'max_requests_jitter': options['max_requests'] // 10,
+            'preload_app': True,
+            'accesslog': '-',
+            'when_ready': self.when_ready,
+            'worker_int': lambda worker: health.mark_stopping(),
+            'worker_exit': self.worker_exit,
+        }
+        if asgi:
+            config['worker_class'] = 'uvicorn.workers.UvicornWorker'
+        else:
+            config['worker_class'] = 'gthread'
+            config['threads'] = options['threads']
+
+        command = self
+
+        class ProductionApplication(BaseApplication):
+            def load_config(self):
+                for key, value in config.items():
+                    self.cfg.set(key, value)
+
+            def load(self):
+                # Runs once in the master because preload_app is set
+                return command.load_application(asgi, warmup, started)
+
+        self.stdout.write(
+            f"Starting {'ASGI' if asgi else 'WSGI'} server on {config['bind']} "
+            f"with {config['workers']} workers"
+        )
+        ProductionApplication().run()
+
+    def load_application(self, asgi, warmup, started):
+        if asgi:
+            use_asgi_connections()
+            from django.core.asgi import get_asgi_application
+            application = get_asgi_application()
+        else:
+            from django.core.wsgi import get_wsgi_application
+            application = get_wsgi_application()
+
+        if warmup:
+            warmup_started = time.perf_counter()
+            quiz_count = warm_caches()
+            logger.info(
+                "Warmed caches for %d quizzes in %.2fs", quiz_count, time.perf_counter() - warmup_started
+            )
+        # Workers must not inherit the master's database connections
+        connections.close_all()
+        close_pools()
+        metrics.flush(force=True)
+        self.load_seconds = time.perf_counter() - started
+        health.mark_ready()
+        return application
+
+    def when_ready(self, server):
+        logger.info("Server ready to accept traffic %.2fs after startup", self.load_seconds)
+
+    def worker_exit(self, server, worker):
+        from authentication.hashing import hash_pool
+        from responses.autosave import autosave_buffer
+
+        health.mark_stopping()
+        hash_pool.shutdown()
+        autosave_buffer.flush()
+        metrics.flush(force=True)
+        connections.close_all()
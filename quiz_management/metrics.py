@@ -0,0 +1,382 @@
+"""
+Process-aggregated metrics exposed in the Prometheus text format.
+
+Every worker process keeps its samples in memory and periodically writes a
+snapshot to ``METRICS_DIR/<pid>.json``. The metrics endpoint merges the
+snapshots of all workers, so counts stay accurate under a pre-forked server
+regardless of which worker answers the scrape.
+"""
+import atexit
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger('quiz_management')
+
+DEFAULT_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+DEFAULT_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_lock = threading.RLock()
+# Serializes snapshot writes, so one flush at a time checks the throttle
+_flush_lock = threading.Lock()
+_registry = {}
+_samples = {}
+_last_flush = 0.0
+_flush_timer = None
+
+
+class Metric:
+    """
+    Base class for a named metric with a fixed set of label names.
+    """
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry[name] = self
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return (self.name, tuple(str(labels[label]) for label in self.labelnames))
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing value.
+    """
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            _samples[key] = _samples.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Value that can go up and down. Values of live workers are summed.
+    """
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            _samples[key] = _samples.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            _samples[key] = value
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values over cumulative buckets.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            sample = _samples.get(key)
+            if sample is None:
+                sample = _samples[key] = {
+                    'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0
+                }
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample['buckets'][index] += 1
+                    break
+            sample['sum'] += value
+            sample['count'] += 1
+
+
+REQUESTS_TOTAL = Counter(
+    'http_requests_total', 'Total HTTP requests by URL name.',
+    ('view', 'method', 'status'),
+)
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by URL name.',
+    ('view', 'method'),
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    'http_requests_in_progress', 'HTTP requests currently being handled.',
+    ('view',),
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    'db_queries_per_request', 'Number of database queries per request.',
+    ('view',), buckets=DEFAULT_COUNT_BUCKETS,
+)
+DB_QUERY_DURATION = Histogram(
+    'db_query_duration_seconds', 'Duration of individual database queries.',
+    ('view', 'alias'), buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Cache lookups by cache name and result.',
+    ('cache', 'result'),
+)
+SUBMISSION_QUEUE_DEPTH = Gauge(
+    'submission_queue_depth', 'Quiz submissions accepted but not yet answered.',
+    (),
+)
+
+
+def record_cache_lookup(cache_name, hit):
+    """Count a cache lookup so hit ratios can be reported."""
+    CACHE_REQUESTS.inc(cache=cache_name, result='hit' if hit else 'miss')
+
+
+def _metrics_dir():
+    return getattr(settings, 'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'quiz_management', 'metrics'))
+
+
+def _snapshot_path(pid):
+    return os.path.join(_metrics_dir(), f'{pid}.json')
+
+
+def _serialize_samples():
+    with _lock:
+        return [
+            [name, list(labels), dict(value, buckets=list(value['buckets'])) if isinstance(value, dict) else value]
+            for (name, labels), value in _samples.items()
+        ]
+
+
+def flush(force=False):
+    """
+    Write this process' samples to its snapshot file, at most once per
+    ``METRICS_FLUSH_INTERVAL`` seconds unless ``force`` is set.
+    """
+    global _last_flush, _flush_timer
+    interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0)
+    with _flush_lock:
+        now = time.monotonic()
+        if not force and now - _last_flush < interval:
+            # Make sure the latest samples reach disk even if the worker goes idle.
+            with _lock:
+                if _flush_timer is None:
+                    _flush_timer = threading.Timer(interval, _deferred_flush)
+                    _flush_timer.daemon = True
+                    _flush_timer.start()
+            return
+        _last_flush = now
+        _write_snapshot()
+
+
+def _write_snapshot():
+    directory = _metrics_dir()
+    os.makedirs(directory, exist_ok=True)
+    pid = os.getpid()
+    # A temporary file of its own, renamed into place once complete
+    fd, tmp_path = tempfile.mkstemp(prefix=f'{pid}.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as handle:
+            json.dump({'pid': pid, 'samples': _serialize_samples()}, handle)
+        os.replace(tmp_path, _snapshot_path(pid))
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _deferred_flush():
+    global _flush_timer
+    with _lock:
+        _flush_timer = None
+    try:
+        flush(force=True)
+    except OSError:
+        logger.exception("Could not write the metrics snapshot")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(merged, name, labels, value):
+    metric = _registry.get(name)
+    if metric is None:
+        return
+    key = (name, tuple(labels))
+    if metric.kind == 'histogram':
+        current = merged.get(key)
+        if current is None:
+            merged[key] = {
+                'buckets': list(value['buckets']), 'sum': value['sum'], 'count': value['count']
+            }
+        else:
+            current['buckets'] = [a + b for a, b in zip(current['buckets'], value['buckets'])]
+            current['sum'] += value['sum']
+            current['count'] += value['count']
+    else:
+        merged[key] = merged.get(key, 0) + value
+
+
+def _prune(path):
+    """
+    Remove the file ``path`` of an exited process once it was last written
+    more than ``METRICS_DEAD_WORKER_TTL`` seconds ago; return whether it was.
+    """
+    ttl = getattr(settings, 'METRICS_DEAD_WORKER_TTL', 300)
+    try:
+        if time.time() - os.path.getmtime(path) < ttl:
+            return False
+        os.unlink(path)
+    except OSError:
+        pass
+    return True
+
+
+def collect():
+    """
+    Merge the live samples of this process with the snapshots of all others.
+    Gauges of processes that have exited are dropped, and their counters
+    once ``METRICS_DEAD_WORKER_TTL`` has passed.
+    """
+    merged = {}
+    own_pid = os.getpid()
+    directory = _metrics_dir()
+    if os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            # <pid>.json snapshots and <pid>.<random>.tmp files being written
+            if not filename.endswith(('.json', '.tmp')):
+                continue
+            try:
+                pid = int(filename.split('.', 1)[0])
+            except ValueError:
+                continue
+            if pid == own_pid:
+                continue
+            alive = _pid_alive(pid)
+            if not alive and _prune(os.path.join(directory, filename)):
+                continue
+            if filename.endswith('.tmp'):
+                continue
+            try:
+                with open(os.path.join(directory, filename)) as handle:
+                    snapshot = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in snapshot.get('samples', []):
+                metric = _registry.get(name)
+                if metric is not None and metric.kind == 'gauge' and not alive:
+                    continue
+                _merge(merged, name, labels, value)
+
+    for name, labels, value in _serialize_samples():
+        _merge(merged, name, labels, value)
+    return merged
+
+
+def _format_labels(labelnames, labels, extra=None):
+    pairs = list(zip(labelnames, labels))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+def render_prometheus():
+    """Render all merged metrics in the Prometheus text exposition format."""
+    merged = collect()
+    lines = []
+    for name, metric in sorted(_registry.items()):
+        series = sorted(
+            (labels, value) for (sample_name, labels), value in merged.items()
+            if sample_name == name
+        )
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for labels, value in series:
+            if metric.kind == 'histogram':
+                cumulative = 0
+                for bound, count in zip(metric.buckets, value['buckets']):
+                    cumulative += count
+                    lines.append('{}_bucket{} {}'.format(
+                        name, _format_labels(metric.labelnames, labels, ('le', _format_value(bound))), cumulative
+                    ))
+                lines.append('{}_bucket{} {}'.format(
+                    name, _format_labels(metric.labelnames, labels, ('le', '+Inf')), value['count']
+                ))
+                lines.append(f"{name}_sum{_format_labels(metric.labelnames, labels)} {_format_value(value['sum'])}")
+                lines.append(f"{name}_count{_format_labels(metric.labelnames, labels)} {value['count']}")
+            else:
+                lines.append(f'{name}{_format_labels(metric.labelnames, labels)} {_format_value(value)}')
+
+    # Hit ratios are derived from the merged cache counters at scrape time.
+    lines.append('# HELP cache_hit_ratio Fraction of cache lookups that were hits.')
+    lines.append('# TYPE cache_hit_ratio gauge')
+    for cache_name, stats in cache_stats(merged).items():
+        lines.append(f'cache_hit_ratio{_format_labels(("cache",), (cache_name,))} {_format_value(stats["hit_ratio"])}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def cache_stats(merged=None):
+    """
+    ``{cache_name: {'hits', 'misses', 'hit_ratio'}}`` of the cache lookups
+    of all processes, by cache name.
+    """
+    if merged is None:
+        merged = collect()
+    stats = {}
+    for (sample_name, labels), value in merged.items():
+        if sample_name == CACHE_REQUESTS.name:
+            cache_name, result = labels
+            entry = stats.setdefault(cache_name, {'hits': 0, 'misses': 0})
+            entry['hits' if result == 'hit' else 'misses'] += int(value)
+    for entry in stats.values():
+        total = entry['hits'] + entry['misses']
+        entry['hit_ratio'] = entry['hits'] / total if total else 0.0
+    return dict(sorted(stats.items()))
+
+
+def _reset_after_fork():
+    """Forked workers start empty so samples recorded before forking are not counted twice."""
+    global _lock, _flush_lock, _last_flush, _flush_timer
+    _lock = threading.RLock()
+    _flush_lock = threading.Lock()
+    _samples.clear()
+    _last_flush = 0.0
+    _flush_timer = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+atexit.register(lambda: _samples and flush(force=True))
@@ -0,0 +1,258 @@
+"""
+Custom middleware for the quiz management system.
+"""
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_string
+from rest_framework import status
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+from . import metrics
+from .throttling import THROTTLED_REQUESTS, ConcurrencyLimiter
+from .utils import json_error_response
+
+
+logger = logging.getLogger('quiz_management')
+
+UNRESOLVED_VIEW = 'unresolved'
+
+_current_request_stats = ContextVar('quiz_management_request_stats', default=None)
+
+
+def resolve_url_name(request):
+    """
+    Return the URL name of the request, resolving it at most once.
+
+    Middleware uses this instead of ``process_view`` because Django runs a
+    sync ``process_view`` in a worker thread when serving async views.
+    """
+    if not hasattr(request, '_url_name'):
+        try:
+            request._url_name = resolve(request.path_info).url_name
+        except Resolver404:
+            request._url_name = None
+    return request._url_name
+
+
+class RequestStats:
+    """
+    Per-request accumulator filled in by the database execute wrapper.
+    """
+    __slots__ = ('view', 'query_count')
+
+    def __init__(self):
+        self.view = UNRESOLVED_VIEW
+        self.query_count = 0
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper that times every query and attributes it to the
+    view currently being handled.
+    """
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats = _current_request_stats.get()
+        view = stats.view if stats is not None else UNRESOLVED_VIEW
+        if stats is not None:
+            stats.query_count += 1
+        metrics.DB_QUERY_DURATION.observe(
+            time.perf_counter() - start,
+            view=view,
+            alias=context['connection'].alias,
+        )
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    """Attach the query recorder to every new database connection."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class MetricsMiddleware:
+    """
+    Records request counts, latency, in-flight requests and database query
+    counts per URL name.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.submission_views = set(getattr(settings, 'METRICS_SUBMISSION_VIEWS', ()))
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, start = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_request_stats.reset(token)
+        self._finish(request, response, stats, start)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, start = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_request_stats.reset(token)
+        self._finish(request, response, stats, start)
+        return response
+
+    def _start(self, request):
+        # Connections opened before this module was imported never saw the
+        # connection_created signal.
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(sender=None, connection=connection)
+        stats = RequestStats()
+        stats.view = resolve_url_name(request) or UNRESOLVED_VIEW
+        metrics.REQUESTS_IN_PROGRESS.inc(view=stats.view)
+        if stats.view in self.submission_views:
+            metrics.SUBMISSION_QUEUE_DEPTH.inc()
+        token = _current_request_stats.set(stats)
+        return stats, token, time.perf_counter()
+
+    def _finish(self, request, response, stats, start):
+        elapsed = time.perf_counter() - start
+        metrics.REQUESTS_IN_PROGRESS.dec(view=stats.view)
+        if stats.view in self.submission_views:
+            metrics.SUBMISSION_QUEUE_DEPTH.dec()
+        metrics.REQUESTS_TOTAL.inc(view=stats.view, method=request.method, status=response.status_code)
+        metrics.REQUEST_LATENCY.observe(elapsed, view=stats.view, method=request.method)
+        metrics.DB_QUERIES_PER_REQUEST.observe(stats.query_count, view=stats.view)
+        try:
+            metrics.flush()
+        except Exception:
+            # Metrics must never fail the request they describe
+            logger.exception("Could not write the metrics snapshot")
+
+
+class AdmissionControlMiddleware:
+    """
+    Sheds load on expensive endpoints: at most ``ADMISSION_MAX_CONCURRENCY``
+    requests to the URL names in ``ADMISSION_CONTROL_VIEWS`` are handled at
+    once by each worker process. Further requests get a 503 with
+    ``Retry-After`` before any database work is done.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.views = set(getattr(settings, 'ADMISSION_CONTROL_VIEWS', ()))
+        self.limiter = ConcurrencyLimiter(getattr(settings, 'ADMISSION_MAX_CONCURRENCY', 16))
+        self.retry_after = getattr(settings, 'ADMISSION_RETRY_AFTER', 1)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if resolve_url_name(request) not in self.views:
+            return self.get_response(request)
+        if not self.limiter.acquire():
+            return self._rejected()
+        try:
+            return self.get_response(request)
+        finally:
+            self.limiter.release()
+
+    async def __acall__(self, request):
+        if resolve_url_name(request) not in self.views:
+            return await self.get_response(request)
+        if not self.limiter.acquire():
+            return self._rejected()
+        try:
+            return await self.get_response(request)
+        finally:
+            self.limiter.release()
+
+    def _rejected(self):
+        THROTTLED_REQUESTS.inc(scope='concurrency')
+        response = json_error_response(
+            message="Service Unavailable",
+            details={'detail': 'Too many requests in progress, please retry shortly.'},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        response['Retry-After'] = str(self.retry_after)
+        return response
+
+
+def accepted_encodings(header):
+    """Return the content codings accepted by an ``Accept-Encoding`` header."""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        name, _, value = params.strip().partition('=')
+        if name.strip() == 'q':
+            try:
+                quality = float(value)
+            except ValueError:
+                continue
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compresses responses of at least ``COMPRESSION_MIN_SIZE`` bytes with
+    brotli, when the client accepts it and the ``brotli`` package is
+    installed, or gzip otherwise. Streamed responses such as file downloads
+    are left alone.
+    """
+    # Random padding against compression side channels, as GZipMiddleware
+    max_random_bytes = 100
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.brotli_quality = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+
+    def process_response(self, request, response):
+        if response.streaming or len(response.content) < self.min_size:
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and 'br' in accepted:
+            encoding = 'br'
+            compressed = brotli.compress(response.content, quality=self.brotli_quality)
+        elif 'gzip' in accepted:
+            encoding = 'gzip'
+            compressed = compress_string(response.content, max_random_bytes=self.max_random_bytes)
+        else:
+            return response
+
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        # ETags are left strong: they name resource versions, which If-Match
+        # compares strongly, and Vary keeps caches from mixing the encodings
+        response.headers['Content-Encoding'] = encoding
+        return response
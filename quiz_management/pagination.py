@@ -0,0 +1,162 @@
+"""
+Counting rows for pagination without ``COUNT(*)`` over large tables.
+
+On PostgreSQL the planner already knows roughly how many rows a query
+returns: ``pg_class.reltuples`` for a whole table, the row estimate of the
+plan for a filtered query. ``count_rows`` uses that estimate when it is above
+a threshold and counts exactly below it, where counting is cheap and an
+estimate would show. Other databases always count. Exact counts of filtered
+queries are cached for ``COUNT_CACHE_TIMEOUT`` seconds, so paging through a
+filtered list counts once rather than per page.
+
+``EstimatedCountPaginator`` brings this to the Django admin and
+``EstimatedCountPagination`` to DRF list views, whose responses say whether
+``count`` is an estimate in ``count_is_estimated``. An estimate can be off
+either way, so with one only the first page number is bounded and a page
+has a next page when the rows go on past it.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+
+def estimate_count(queryset):
+    """
+    The planner's estimate of the number of rows in ``queryset``, or ``None``
+    if the database cannot give one (not PostgreSQL, table never analyzed).
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        if not queryset.query.where and not queryset.query.distinct:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [connection.ops.quote_name(queryset.model._meta.db_table)],
+            )
+            row = cursor.fetchone()
+            # -1 (or 0 before PostgreSQL 14) until the table is analyzed
+            return int(row[0]) if row and row[0] > 0 else None
+        sql, params = queryset.order_by().values('pk').query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _count_key(queryset):
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.md5(f'{queryset.db}:{sql}:{params!r}'.encode(), usedforsecurity=False).hexdigest()
+    return f'count:{digest}'
+
+
+def count_rows(queryset, threshold=None):
+    """
+    ``(count, estimated)`` of ``queryset``: the planner's estimate if it is
+    at least ``threshold`` (``ESTIMATED_COUNT_THRESHOLD`` by default) rows,
+    the exact count otherwise.
+    """
+    if threshold is None:
+        threshold = getattr(settings, 'ESTIMATED_COUNT_THRESHOLD', 100000)
+    timeout = getattr(settings, 'COUNT_CACHE_TIMEOUT', 10)
+    filtered = bool(queryset.query.where) and timeout > 0
+    if filtered:
+        try:
+            key = _count_key(queryset)
+        except EmptyResultSet:
+            # e.g. pk__in=[]: matches nothing, without a query
+            return 0, False
+        count = cache.get(key)
+        if count is not None:
+            return count, False
+    estimate = estimate_count(queryset)
+    if estimate is not None and estimate >= threshold:
+        return estimate, True
+    count = queryset.count()
+    if filtered:
+        cache.set(key, count, timeout)
+    return count, False
+
+
+class EstimatedCountPage(Page):
+    """Page that knows whether rows follow it when the count is estimated."""
+
+    def __init__(self, object_list, number, paginator, has_next=None):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        if self._has_next is None:
+            return super().has_next()
+        return self._has_next
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose ``count`` comes from ``count_rows``; ``estimated`` tells
+    whether it is approximate. Pages past the real end are empty rather than
+    invalid when the estimate is too high, and pages past the estimate are
+    still served when it is too low.
+    """
+    estimated = False
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return super().count
+        count, self.estimated = count_rows(self.object_list)
+        return count
+
+    def validate_number(self, number):
+        if not (self.count and self.estimated):
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.estimated:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        # One row past the page tells whether there is a next one
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        return EstimatedCountPage(rows[:self.per_page], number, self, has_next=len(rows) > self.per_page)
+
+
+class EstimatedCountPagination(PageNumberPagination):
+    """
+    ``PageNumberPagination`` counting with ``count_rows``; adds
+    ``count_is_estimated`` to the paginated response.
+    """
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'count_is_estimated': self.page.paginator.estimated,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_is_estimated'] = {'type': 'boolean', 'example': False}
+        return response_schema
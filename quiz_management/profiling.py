@@ -0,0 +1,251 @@
+"""
+On-demand request profiling.
+
+A request is profiled when an authenticated staff user sends the
+``X-Profile`` header, or when it is picked by ``PROFILING_SAMPLE_RATE``.
+Each profile is written to ``PROFILING_DIR`` as a pstats file plus a
+collapsed-stack file that flamegraph tools can read directly. Memory
+snapshots via ``tracemalloc`` are taken for ``X-Profile: memory`` and for
+the URL names listed in ``PROFILING_TRACEMALLOC_URL_NAMES``.
+"""
+import cProfile
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from authentication.authentication import CachedJWTAuthentication
+
+from .middleware import resolve_url_name
+
+logger = logging.getLogger('quiz_management')
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_FILE_RE = re.compile(r'^[\w.-]+\.(pstats|collapsed|tracemalloc\.txt)$')
+
+# tracemalloc is process-wide: it is started for the first traced request and
+# stopped after the last one, unless something else had started it already
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_started = False
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_started
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(getattr(settings, 'PROFILING_TRACEMALLOC_FRAMES', 10))
+            _tracemalloc_started = True
+        _tracemalloc_users += 1
+
+
+def _stop_tracemalloc():
+    """Take a memory snapshot, then stop tracing if no other request is."""
+    global _tracemalloc_users, _tracemalloc_started
+    with _tracemalloc_lock:
+        try:
+            return tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, __file__),
+                tracemalloc.Filter(False, tracemalloc.__file__),
+            ))
+        finally:
+            _tracemalloc_users -= 1
+            if _tracemalloc_users == 0 and _tracemalloc_started:
+                tracemalloc.stop()
+                _tracemalloc_started = False
+
+
+def profiles_dir():
+    return getattr(settings, 'PROFILING_DIR', os.path.join(settings.BASE_DIR, 'logs', 'profiles'))
+
+
+class StackSampler(threading.Thread):
+    """
+    Statistical profiler that periodically samples the stack of one thread
+    and counts identical stacks in collapsed (``frame;frame;frame``) form.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class RequestProfile:
+    """
+    Runs cProfile, the stack sampler and optionally tracemalloc around a
+    single request and writes the results to disk.
+    """
+
+    def __init__(self, url_name, trace_memory=False):
+        self.url_name = url_name or 'unresolved'
+        self.trace_memory = trace_memory
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        self.sampler = StackSampler(
+            threading.get_ident(),
+            getattr(settings, 'PROFILING_SAMPLE_INTERVAL', 0.005),
+        )
+        if self.trace_memory:
+            _start_tracemalloc()
+        self.started_at = time.perf_counter()
+        self.sampler.start()
+        self.profiler.enable()
+
+    def stop(self, status_code):
+        self.profiler.disable()
+        self.sampler.stop()
+        elapsed_ms = (time.perf_counter() - self.started_at) * 1000
+        snapshot = _stop_tracemalloc() if self.trace_memory else None
+
+        directory = profiles_dir()
+        os.makedirs(directory, exist_ok=True)
+        stem = '{}-{}-{}-{:.0f}ms'.format(
+            time.strftime('%Y%m%dT%H%M%S'), os.getpid(), re.sub(r'[^\w-]', '_', self.url_name), elapsed_ms
+        )
+        base = os.path.join(directory, stem)
+        self.profiler.dump_stats(f'{base}.pstats')
+        with open(f'{base}.collapsed', 'w') as handle:
+            handle.write(self.sampler.collapsed())
+        if snapshot is not None:
+            with open(f'{base}.tracemalloc.txt', 'w') as handle:
+                for stat in snapshot.statistics('lineno')[:getattr(settings, 'PROFILING_TRACEMALLOC_TOP', 50)]:
+                    handle.write(f'{stat}\n')
+
+        logger.info("Profiled %s (%s) in %.1fms -> %s", self.url_name, status_code, elapsed_ms, stem)
+        prune_profiles()
+
+
+def prune_profiles():
+    """Keep only the newest ``PROFILING_MAX_FILES`` profile files."""
+    directory = profiles_dir()
+    limit = getattr(settings, 'PROFILING_MAX_FILES', 300)
+    files = list_profiles()
+    for entry in files[limit:]:
+        try:
+            os.remove(os.path.join(directory, entry['name']))
+        except OSError:
+            pass
+
+
+def list_profiles():
+    """Return the profile files in ``PROFILING_DIR``, newest first."""
+    directory = profiles_dir()
+    if not os.path.isdir(directory):
+        return []
+    entries = []
+    for name in os.listdir(directory):
+        if not PROFILE_FILE_RE.match(name):
+            continue
+        stat = os.stat(os.path.join(directory, name))
+        entries.append({'name': name, 'size': stat.st_size, 'modified': stat.st_mtime})
+    entries.sort(key=lambda entry: entry['modified'], reverse=True)
+    return entries
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests on demand; see the module docstring for the triggers.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        self.url_names = set(getattr(settings, 'PROFILING_URL_NAMES', ()))
+        self.tracemalloc_url_names = set(getattr(settings, 'PROFILING_TRACEMALLOC_URL_NAMES', ()))
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = self._profile_for(request)
+        if profile is None:
+            return self.get_response(request)
+        profile.start()
+        status_code = 500
+        try:
+            response = self.get_response(request)
+            status_code = response.status_code
+            return response
+        finally:
+            profile.stop(status_code)
+
+    async def __acall__(self, request):
+        if request.META.get(PROFILE_HEADER):
+            # The staff check may hit the database.
+            profile = await sync_to_async(self._profile_for)(request)
+        else:
+            profile = self._profile_for(request)
+        if profile is None:
+            return await self.get_response(request)
+        profile.start()
+        status_code = 500
+        try:
+            response = await self.get_response(request)
+            status_code = response.status_code
+            return response
+        finally:
+            profile.stop(status_code)
+
+    def _profile_for(self, request):
+        header = request.META.get(PROFILE_HEADER)
+        sampled = False
+        if header:
+            if not self._is_staff(request):
+                return None
+        elif self.sample_rate and random.random() < self.sample_rate:
+            sampled = True
+        else:
+            return None
+
+        url_name = resolve_url_name(request)
+        if sampled and self.url_names and url_name not in self.url_names:
+            return None
+
+        trace_memory = header == 'memory' or url_name in self.tracemalloc_url_names
+        return RequestProfile(url_name, trace_memory=trace_memory)
+
+    def _is_staff(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return True
+        try:
+            result = CachedJWTAuthentication().authenticate(request)
+        except (AuthenticationFailed, InvalidToken):
+            return False
+        return result is not None and result[0].is_staff
@@ -0,0 +1,55 @@
+"""
+Fast JSON rendering.
+
+``FastJSONRenderer`` encodes with orjson when it is installed and falls back
+to DRF's ``JSONRenderer`` otherwise, or for anything orjson cannot encode
+(e.g. integers beyond 64 bits) or when indented output is requested. Both
+produce the same JSON; types orjson does not know natively are converted by
+DRF's own encoder.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+_drf_encoder = JSONEncoder()
+_fallback_renderer = JSONRenderer()
+
+
+def _default(obj):
+    # Datetimes are passed through so they are formatted exactly like DRF does
+    return _drf_encoder.default(obj)
+
+
+def dumps(data):
+    """Encode ``data`` to compact JSON bytes, like DRF's ``JSONRenderer``."""
+    if orjson is not None:
+        try:
+            content = orjson.dumps(
+                data, default=_default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except orjson.JSONEncodeError:
+            pass
+        else:
+            # Same JavaScript-safe escaping as DRF
+            if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+                content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+            return content
+    return _fallback_renderer.render(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` that uses orjson for compact output when available.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
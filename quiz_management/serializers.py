@@ -0,0 +1,80 @@
+"""
+Shared serializer helpers.
+"""
+from drf_yasg import openapi
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAMETERS = [
+    openapi.Parameter(
+        'fields', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+        description="Comma separated fields to return, e.g. id,title"
+    ),
+    openapi.Parameter(
+        'expand', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+        description="Comma separated relations to embed, e.g. questions"
+    ),
+]
+
+
+def _split_param(request, name):
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    return {part.strip() for part in value.split(',') if part.strip()}
+
+
+class DynamicFieldsMixin:
+    """
+    Lets clients shape GET responses with query parameters:
+
+    - ``?fields=id,title`` returns only the listed fields.
+    - ``?expand=questions`` embeds only the listed relations of
+      ``expandable_fields``. Relations that the serializer embeds by default
+      are left out when ``expand`` is given without them, and relations it
+      does not embed by default are added when listed.
+
+    Unknown names are ignored. Only the top-level serializer of a view is
+    shaped, and only for safe methods.
+    """
+    # Relation name -> zero-argument factory returning the nested serializer
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS or not hasattr(request, 'query_params'):
+            return
+        self._requested_fields = _split_param(request, 'fields')
+        self._requested_expand = _split_param(request, 'expand')
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = getattr(self, '_requested_fields', None)
+        expand = getattr(self, '_requested_expand', None)
+        if expand is not None:
+            for name, factory in self.expandable_fields.items():
+                if name in expand:
+                    fields.setdefault(name, factory())
+                else:
+                    fields.pop(name, None)
+        if requested is not None:
+            keep = requested | (expand or set())
+            for name in list(fields):
+                if name not in keep:
+                    del fields[name]
+        return fields
+
+
+def output_fields(view):
+    """
+    Names of the fields the view's serializer will render for the current
+    request, so the queryset can skip unused joins and aggregates.
+    """
+    return set(view.get_serializer().fields)
+
+
+def eager_queryset(view, queryset):
+    """Apply the serializer's eager loading for what a GET request renders."""
+    if view.request.method != 'GET':
+        return queryset
+    return view.get_serializer_class().setup_eager_loading(queryset, output_fields(view))
@@ -2,6 +2,7 @@
 Django settings for quiz_management project.
 """
 
+import tempfile
 from pathlib import Path
 from decouple import config
 from datetime import timedelta
@@ -27,12 +28,14 @@ DJANGO_APPS = [
 THIRD_PARTY_APPS = [
     'rest_framework',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
     'drf_yasg',
     'django_extensions',
 ]
 
 LOCAL_APPS = [
+    'quiz_management',
     'authentication',
     'quizzes',
     'responses',
@@ -42,15 +45,22 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'quiz_management.middleware.AdmissionControlMiddleware',
+    'quiz_management.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'quiz_management.db.routers.ReplicaRoutingMiddleware',
+    'quiz_management.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+if config('METRICS_ENABLED', default=True, cast=bool):
+    MIDDLEWARE.insert(0, 'quiz_management.middleware.MetricsMiddleware')
+
 ROOT_URLCONF = 'quiz_management.urls'
 
 TEMPLATES = [
@@ -71,6 +81,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'quiz_management.wsgi.application'
 
+# Serve the public quiz endpoints with async-native views. asgi.py turns this
+# on by default; under WSGI the sync DRF views are used.
+ASYNC_PUBLIC_VIEWS = config('ASYNC_PUBLIC_VIEWS', default=False, cast=bool)
+
 # Database
 import dj_database_url
 
@@ -78,10 +92,68 @@ import dj_database_url
 DATABASES = {
     'default': dj_database_url.config(
         env='DATABASE_URL',
-        default=f"postgresql://{config('DB_USER', default='quiz_user')}:{config('DB_PASSWORD', default='quiz_password')}@{config('DB_HOST', default='localhost')}:{config('DB_PORT', default='5432')}/{config('DB_NAME', default='quiz_management_db')}"
+        default=f"postgresql://{config('DB_USER', default='quiz_user')}:{config('DB_PASSWORD', default='quiz_password')}@{config('DB_HOST', default='localhost')}:{config('DB_PORT', default='5432')}/{config('DB_NAME', default='quiz_management_db')}",
+        # Persistent connections, checked before reuse at the start of a request
+        conn_max_age=config('DB_CONN_MAX_AGE', default=60, cast=int),
+        conn_health_checks=config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
     )
 }
 
+# In-process connection pool. Django then returns connections to the pool at
+# the end of each request instead of keeping one open per thread.
+DB_POOL_ENABLED = config('DB_POOL_ENABLED', default=False, cast=bool)
+POOLED_DATABASE_ENGINES = {
+    'django.db.backends.postgresql': 'quiz_management.db.backends.postgresql',
+    'django.db.backends.sqlite3': 'quiz_management.db.backends.sqlite3',
+}
+
+# Read replicas, e.g. DATABASE_REPLICA_URLS=postgres://replica1/db,postgres://replica2/db
+# with optional DATABASE_REPLICA_WEIGHTS=3,1. Safe requests to the views in
+# DATABASE_REPLICA_VIEWS read from a replica; everything else uses the primary.
+DATABASE_REPLICA_URLS = config('DATABASE_REPLICA_URLS', default='', cast=lambda v: [s.strip() for s in v.split(',') if s.strip()])
+DATABASE_REPLICA_WEIGHTS = config('DATABASE_REPLICA_WEIGHTS', default='', cast=lambda v: [int(s) for s in v.split(',') if s.strip()])
+DATABASE_REPLICAS = {}
+for index, url in enumerate(DATABASE_REPLICA_URLS, start=1):
+    alias = f'replica{index}'
+    DATABASES[alias] = dj_database_url.parse(
+        url,
+        conn_max_age=DATABASES['default']['CONN_MAX_AGE'],
+        conn_health_checks=DATABASES['default']['CONN_HEALTH_CHECKS'],
+    )
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS[alias] = DATABASE_REPLICA_WEIGHTS[index - 1] if index <= len(DATABASE_REPLICA_WEIGHTS) else 1
+DATABASE_ROUTERS = ['quiz_management.db.routers.ReplicaRouter']
+DATABASE_REPLICA_VIEWS = [
+    'public-quiz-list', 'public-quiz-detail', 'quiz-result',
+    'admin-response-list', 'admin-response-detail', 'quiz-list-create', 'question-list-create',
+]
+# Clients stay on the primary this long after a write, to read their own writes
+DATABASE_REPLICA_PIN_SECONDS = config('DATABASE_REPLICA_PIN_SECONDS', default=5, cast=int)
+# An unreachable replica is skipped this long before it is tried again
+DATABASE_REPLICA_RETRY_SECONDS = config('DATABASE_REPLICA_RETRY_SECONDS', default=30, cast=int)
+
+# Set by asgi.py and serve --asgi. Under ASGI, ORM calls run in
+# sync_to_async threads that keep their own connections, which Django only
+# closes at the end of requests handled in that thread; persistent
+# connections would leak there, so they are off. Use DB_POOL_ENABLED to
+# reuse connections under ASGI.
+SERVING_ASGI = config('SERVING_ASGI', default=False, cast=bool)
+
+for database in DATABASES.values():
+    if SERVING_ASGI:
+        database['CONN_MAX_AGE'] = 0
+    if DB_POOL_ENABLED and database['ENGINE'] in POOLED_DATABASE_ENGINES:
+        database.update({
+            'ENGINE': POOLED_DATABASE_ENGINES[database['ENGINE']],
+            'CONN_MAX_AGE': 0,
+            'POOL': {
+                'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+                'timeout': config('DB_POOL_TIMEOUT', default=5.0, cast=float),
+                'health_check_after': config('DB_POOL_HEALTH_CHECK_AFTER', default=10.0, cast=float),
+                'max_lifetime': config('DB_POOL_MAX_LIFETIME', default=1800.0, cast=float),
+            },
+        })
+
 # Custom user model
 AUTH_USER_MODEL = 'authentication.User'
 
@@ -122,7 +194,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -130,7 +202,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'quiz_management.renderers.FastJSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
@@ -138,8 +210,62 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.FormParser',
     ],
     'EXCEPTION_HANDLER': 'quiz_management.utils.custom_exception_handler',
+    # Proxies in front of the app, so throttles key on the real client address
+    'NUM_PROXIES': config('NUM_PROXIES', default='', cast=lambda v: int(v) if v else None),
+    # Token buckets for the submission endpoint: bursts of N, refilled at N per period
+    'DEFAULT_THROTTLE_RATES': {
+        'submission_ip': config('THROTTLE_SUBMISSION_IP', default='30/min'),
+        'submission_email': config('THROTTLE_SUBMISSION_EMAIL', default='5/min'),
+        'submission_quiz': config('THROTTLE_SUBMISSION_QUIZ', default='600/min'),
+        'autosave': config('THROTTLE_AUTOSAVE', default='120/min'),
+    },
 }
 
+# Responses of at least this many bytes are compressed with brotli or gzip
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Per worker process cap on submissions handled at once; excess requests get 503
+ADMISSION_CONTROL_VIEWS = ['quiz-submit']
+ADMISSION_MAX_CONCURRENCY = config('ADMISSION_MAX_CONCURRENCY', default=16, cast=int)
+ADMISSION_RETRY_AFTER = 1
+
+# Largest batch accepted by the batch submission endpoint, and rows per INSERT
+BATCH_SUBMISSION_MAX_ITEMS = config('BATCH_SUBMISSION_MAX_ITEMS', default=500, cast=int)
+BATCH_SUBMISSION_INSERT_SIZE = 500
+
+# Autosaved answers are buffered per server process and written at least
+# every AUTOSAVE_FLUSH_INTERVAL seconds, or once AUTOSAVE_MAX_BUFFER are waiting.
+# Finishing an attempt waits up to AUTOSAVE_FINISH_WAIT seconds for the
+# answers buffered by other processes.
+AUTOSAVE_FLUSH_INTERVAL = config('AUTOSAVE_FLUSH_INTERVAL', default=1.0, cast=float)
+AUTOSAVE_MAX_BUFFER = config('AUTOSAVE_MAX_BUFFER', default=5000, cast=int)
+AUTOSAVE_FINISH_WAIT = 2.0
+
+# Attempts on timed quizzes are accepted this long after their deadline;
+# later they are closed with the answers saved so far
+ATTEMPT_GRACE_SECONDS = config('ATTEMPT_GRACE_SECONDS', default=30, cast=int)
+
+# archive_responses moves completed responses older than this out of the
+# response and answer tables
+RESPONSE_ARCHIVE_AFTER_DAYS = config('RESPONSE_ARCHIVE_AFTER_DAYS', default=365, cast=int)
+
+# Seconds purge_expired_responses waits between chunks of deletes
+RETENTION_PURGE_PAUSE = config('RETENTION_PURGE_PAUSE', default=0.1, cast=float)
+
+# Processes used by regrades queued from the regrade endpoints to grade text
+# answers; the regrade command run by hand defaults to one per CPU
+GRADING_WORKERS = config('GRADING_WORKERS', default=1, cast=int)
+
+# Regrade jobs queued from the regrade endpoints that may be queued or running
+# at once; beyond it the endpoints answer 503 with Retry-After seconds
+REGRADE_MAX_JOBS = config('REGRADE_MAX_JOBS', default=2, cast=int)
+REGRADE_RETRY_AFTER = config('REGRADE_RETRY_AFTER', default=30, cast=int)
+
+# Seconds after which a regrade job that reported nothing is considered dead
+# and failed, so its quiz can be regraded again
+REGRADE_JOB_STALE_AFTER = config('REGRADE_JOB_STALE_AFTER', default=3600, cast=int)
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=config('JWT_ACCESS_TOKEN_LIFETIME', default=60, cast=int)),
@@ -165,8 +291,57 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_EXP_CLAIM': 'refresh_exp',
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=5),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
+    'TOKEN_REFRESH_SERIALIZER': 'authentication.serializers.TokenRefreshSerializer',
+}
+
+# Password hashes run in a per-server-process pool of AUTH_HASH_WORKERS
+# processes; logins beyond AUTH_HASH_MAX_PENDING queued hashes, or whose hash
+# takes longer than AUTH_HASH_TIMEOUT seconds, get a 503
+AUTH_HASH_WORKERS = config('AUTH_HASH_WORKERS', default=2, cast=int)
+AUTH_HASH_MAX_PENDING = config('AUTH_HASH_MAX_PENDING', default=32, cast=int)
+AUTH_HASH_TIMEOUT = 10
+AUTH_HASH_RETRY_AFTER = 1
+
+# Blacklisted refresh tokens are looked up in a per-process Bloom filter that
+# picks up new entries every AUTH_BLACKLIST_REFRESH_INTERVAL seconds
+AUTH_BLACKLIST_REFRESH_INTERVAL = config('AUTH_BLACKLIST_REFRESH_INTERVAL', default=1.0, cast=float)
+AUTH_BLACKLIST_REBUILD_INTERVAL = 3600
+AUTH_BLACKLIST_CAPACITY = 100000
+AUTH_BLACKLIST_ERROR_RATE = 0.001
+
+# Caches: 'default' is shared by all server processes and holds the tag
+# versions (see quiz_management.cache), so it must be a redis:// CACHE_URL
+# when several processes serve requests; 'local' is a small per-process
+# cache in front of it
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    SHARED_CACHE = {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL}
+else:
+    SHARED_CACHE = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'}
+LOCAL_CACHE_TIMEOUT = config('LOCAL_CACHE_TIMEOUT', default=60, cast=int)
+CACHES = {
+    'default': dict(SHARED_CACHE, KEY_PREFIX='quiz_management'),
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'local',
+        'TIMEOUT': LOCAL_CACHE_TIMEOUT,
+        'OPTIONS': {'MAX_ENTRIES': config('LOCAL_CACHE_MAX_ENTRIES', default=1000, cast=int)},
+    },
 }
 
+# Users resolved by CachedJWTAuthentication are kept this long in the shared
+# cache (seconds)
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=300, cast=int)
+
+# Paginated lists show the planner's row estimate instead of counting once
+# it is above this many rows (PostgreSQL only)
+ESTIMATED_COUNT_THRESHOLD = config('ESTIMATED_COUNT_THRESHOLD', default=100000, cast=int)
+# Exact counts of filtered lists are reused this many seconds (0 disables)
+COUNT_CACHE_TIMEOUT = config('COUNT_CACHE_TIMEOUT', default=10, cast=int)
+
+# Reject quiz and question updates that do not send If-Match (428)
+REQUIRE_IF_MATCH = config('REQUIRE_IF_MATCH', default=False, cast=bool)
+
 # CORS Settings
 CORS_ALLOWED_ORIGINS = config(
     'CORS_ALLOWED_ORIGINS', 
@@ -178,18 +353,23 @@ CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOW_ALL_ORIGINS = DEBUG  # Only allow all origins in development
 
 # Additional CORS headers for better frontend integration
-CORS_ALLOWED_HEADERS = [
+CORS_ALLOW_HEADERS = [
     'accept',
     'accept-encoding',
     'authorization',
     'content-type',
     'dnt',
+    'if-match',
+    'if-none-match',
     'origin',
     'user-agent',
     'x-csrftoken',
+    'x-db-primary-pin',
     'x-requested-with',
 ]
 
+CORS_EXPOSE_HEADERS = ['etag', 'last-modified', 'x-db-primary-pin']
+
 CORS_ALLOW_METHODS = [
     'DELETE',
     'GET',
@@ -221,6 +401,9 @@ SWAGGER_SETTINGS = {
     'SHOW_COMMON_EXTENSIONS': True,
 }
 
+# Generated API schema is cached (and warmed by the serve command) outside DEBUG
+SWAGGER_CACHE_TIMEOUT = config('SWAGGER_CACHE_TIMEOUT', default=0 if DEBUG else 3600, cast=int)
+
 REDOC_SETTINGS = {
     'LAZY_RENDERING': False,
 }
@@ -270,6 +453,28 @@ LOGGING = {
     },
 }
 
+# Metrics
+# Each worker writes its samples to METRICS_DIR so /metrics/ can aggregate
+# them across the processes of a pre-forked server. Snapshots are runtime
+# state, so they default to the temporary directory, not the source tree.
+METRICS_DIR = config('METRICS_DIR', default=str(Path(tempfile.gettempdir()) / 'quiz_management' / 'metrics'))
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=1.0, cast=float)
+# Snapshots of exited workers are deleted this many seconds after their last write
+METRICS_DEAD_WORKER_TTL = config('METRICS_DEAD_WORKER_TTL', default=300, cast=int)
+METRICS_AUTH_TOKEN = config('METRICS_AUTH_TOKEN', default='')
+METRICS_SUBMISSION_VIEWS = ['quiz-submit', 'admin-response-batch', 'attempt-finish']
+
+# On-demand profiling
+# Staff users can profile a single request with the "X-Profile: 1" header
+# ("X-Profile: memory" adds a tracemalloc snapshot). A non-zero sample rate
+# profiles a random fraction of the requests to PROFILING_URL_NAMES.
+PROFILING_DIR = config('PROFILING_DIR', default=str(BASE_DIR / 'logs' / 'profiles'))
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_URL_NAMES = config('PROFILING_URL_NAMES', default='', cast=lambda v: [s.strip() for s in v.split(',') if s.strip()])
+PROFILING_SAMPLE_INTERVAL = 0.005
+PROFILING_TRACEMALLOC_URL_NAMES = ['admin-response-list', 'admin-response-detail']
+PROFILING_MAX_FILES = 300
+
 # Create logs directory if it doesn't exist
 import os
 logs_dir = BASE_DIR / 'logs'
@@ -0,0 +1,695 @@
+import datetime
+import decimal
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from quizzes.cache import get_answer_key, get_public_quiz
+from quizzes.models import Quiz, Question, MCQOption
+from . import cache as tag_cache, health, metrics, pagination, profiling, renderers
+from .db import routers
+from .db.pool import ConnectionPool, PoolTimeout
+from .middleware import CompressionMiddleware, accepted_encodings
+from .management.commands.serve import default_worker_count, use_asgi_connections, warm_caches
+from .throttling import ConcurrencyLimiter, TokenBucketThrottle
+
+User = get_user_model()
+
+is_replica_available = routers._is_available
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir, ignore_errors=True)
+        settings_override = override_settings(METRICS_DIR=self.metrics_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def write_snapshot(self, pid, samples, age=0):
+        path = os.path.join(self.metrics_dir, f'{pid}.json')
+        with open(path, 'w') as handle:
+            json.dump({'pid': pid, 'samples': samples}, handle)
+        if age:
+            written = time.time() - age
+            os.utime(path, (written, written))
+        return path
+
+    def dead_pid(self):
+        pid = 2 ** 22 + 1
+        while metrics._pid_alive(pid):
+            pid += 1
+        return pid
+
+    def test_concurrent_flushes_write_complete_snapshot(self):
+        metrics.REQUESTS_TOTAL.inc(view='test-flush', method='GET', status=200)
+        errors = []
+
+        def flush():
+            try:
+                for _ in range(20):
+                    metrics.flush(force=True)
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=flush) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(os.listdir(self.metrics_dir), [f'{os.getpid()}.json'])
+        with open(os.path.join(self.metrics_dir, f'{os.getpid()}.json')) as handle:
+            samples = json.load(handle)['samples']
+        self.assertIn(['http_requests_total', ['test-flush', 'GET', '200'], 1], samples)
+
+    def test_flush_is_throttled(self):
+        metrics.flush(force=True)
+        with mock.patch.object(metrics, '_write_snapshot') as write:
+            metrics.flush()
+        write.assert_not_called()
+
+    def test_collect_merges_other_workers(self):
+        self.write_snapshot(os.getppid(), [['cache_requests_total', ['merge-test', 'hit'], 3]])
+        metrics.record_cache_lookup('merge-test', True)
+        self.assertEqual(metrics.collect()[('cache_requests_total', ('merge-test', 'hit'))], 4)
+
+    def test_collect_drops_gauges_of_exited_workers(self):
+        self.write_snapshot(self.dead_pid(), [
+            ['http_requests_in_progress', ['dead-test'], 5],
+            ['cache_requests_total', ['dead-test', 'hit'], 2],
+        ])
+        merged = metrics.collect()
+        self.assertNotIn(('http_requests_in_progress', ('dead-test',)), merged)
+        self.assertEqual(merged[('cache_requests_total', ('dead-test', 'hit'))], 2)
+
+    @override_settings(METRICS_DEAD_WORKER_TTL=60)
+    def test_collect_prunes_old_snapshots_of_exited_workers(self):
+        path = self.write_snapshot(self.dead_pid(), [['cache_requests_total', ['prune-test', 'hit'], 2]], age=120)
+        self.assertNotIn(('cache_requests_total', ('prune-test', 'hit')), metrics.collect())
+        self.assertFalse(os.path.exists(path))
+
+    def test_render_prometheus(self):
+        metrics.REQUEST_LATENCY.observe(0.02, view='render-test', method='GET')
+        text = metrics.render_prometheus()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="render-test",method="GET",le="0.025"} 1', text)
+        self.assertIn('http_request_duration_seconds_count{view="render-test",method="GET"} 1', text)
+
+    def test_flush_failure_does_not_fail_request(self):
+        with mock.patch.object(metrics, 'flush', side_effect=OSError('disk full')), \
+                self.assertLogs('quiz_management', 'ERROR'):
+            response = self.client.get('/healthz/live/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_metrics_endpoint(self):
+        self.client.get('/healthz/live/')
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('http_requests_total{view="health-live",method="GET",status="200"}', response.content.decode())
+
+
+class ProfilingTestCase(TestCase):
+    def setUp(self):
+        self.profiles_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profiles_dir, ignore_errors=True)
+        settings_override = override_settings(PROFILING_DIR=self.profiles_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        logger_patch = mock.patch.object(profiling, 'logger')
+        logger_patch.start()
+        self.addCleanup(logger_patch.stop)
+
+    def test_overlapping_memory_profiles(self):
+        first = profiling.RequestProfile('first', trace_memory=True)
+        second = profiling.RequestProfile('second', trace_memory=True)
+        first.start()
+        second.start()
+        first.stop(200)
+        self.assertTrue(tracemalloc.is_tracing())
+        second.stop(200)
+        self.assertFalse(tracemalloc.is_tracing())
+        names = [entry['name'] for entry in profiling.list_profiles()]
+        self.assertEqual(len([name for name in names if name.endswith('.tracemalloc.txt')]), 2)
+
+    def test_concurrent_memory_profiles(self):
+        errors = []
+
+        def profile(index):
+            try:
+                for _ in range(5):
+                    request_profile = profiling.RequestProfile(f'thread{index}', trace_memory=True)
+                    request_profile.start()
+                    time.sleep(0.001)
+                    request_profile.stop(200)
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=profile, args=(index,)) for index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_staff_header_profiles_request(self):
+        staff = User.objects.create_user('staff', 'staff@example.com', 'pass12345!', is_staff=True)
+        client = APIClient()
+        client.force_login(staff)
+        response = client.get('/healthz/live/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        suffixes = sorted(entry['name'].rsplit('.', 1)[1] for entry in profiling.list_profiles())
+        self.assertEqual(suffixes, ['collapsed', 'pstats'])
+
+        client.force_authenticate(staff)
+        response = client.get('/api/v1/admin/profiles/')
+        self.assertEqual(len(response.data['data']), 2)
+        name = response.data['data'][0]['name']
+        self.assertEqual(client.get(f'/api/v1/admin/profiles/{name}/').status_code, 200)
+
+    def test_header_ignored_for_anonymous_requests(self):
+        self.client.get('/healthz/live/', HTTP_X_PROFILE='1')
+        self.assertEqual(profiling.list_profiles(), [])
+
+
+class ServeTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['local'].clear()
+        self.addCleanup(health.mark_ready)
+
+    def test_warm_caches(self):
+        user = User.objects.create_user('owner', 'owner@example.com', 'pass12345!')
+        quiz = Quiz.objects.create(title='Warm', created_by=user)
+        question = Question.objects.create(quiz=quiz, question_text='Q', question_type='MCQ')
+        MCQOption.objects.create(question=question, option_text='A', is_correct=True)
+        Quiz.objects.create(title='Inactive', created_by=user, is_active=False)
+
+        self.assertEqual(warm_caches(), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_public_quiz(quiz.id)['title'], 'Warm')
+            self.assertIn(question.id, get_answer_key(quiz.id))
+
+    def test_asgi_serves_async_views(self):
+        # URLconfs are imported once per process
+        script = (
+            'import django; django.setup()\n'
+            'from unittest import mock\n'
+            'from gunicorn.app.base import BaseApplication\n'
+            'from django.core.management import execute_from_command_line\n'
+            'from django.urls import resolve\n'
+            'with mock.patch.object(BaseApplication, "run", lambda app: app.load()):\n'
+            '    execute_from_command_line(["manage.py", "serve", "--asgi", "--no-warmup"])\n'
+            'for path in ["/api/v1/public/quizzes/", "/api/v1/public/quizzes/1/submit/", "/api/v1/auth/login/"]:\n'
+            '    print(resolve(path).func.view_class.__name__)\n'
+        )
+        metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, metrics_dir, ignore_errors=True)
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='quiz_management.settings', METRICS_DIR=metrics_dir)
+        env.pop('ASYNC_PUBLIC_VIEWS', None)
+        output = subprocess.run(
+            [sys.executable, '-c', script], env=env, cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout
+        self.assertEqual(
+            output.split()[-3:], ['AsyncPublicQuizListView', 'AsyncQuizSubmissionView', 'AsyncUserLoginView']
+        )
+
+    def test_default_worker_count(self):
+        self.assertGreater(default_worker_count(asgi=False), default_worker_count(asgi=True))
+
+    def test_readiness(self):
+        health.mark_starting()
+        with self.assertLogs('django.request', 'ERROR'):
+            self.assertEqual(self.client.get('/healthz/ready/').status_code, 503)
+        self.assertEqual(self.client.get('/healthz/live/').status_code, 200)
+        health.mark_ready()
+        response = self.client.get('/healthz/ready/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.json()['data']['startup_seconds'])
+        health.mark_stopping()
+        with self.assertLogs('django.request', 'ERROR'):
+            self.assertEqual(self.client.get('/healthz/ready/').status_code, 503)
+
+
+class FakeConnection:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionsTestCase(TestCase):
+    def conn_max_age(self, **env):
+        # Settings are evaluated once per process
+        output = subprocess.run(
+            [sys.executable, '-c', (
+                'import django; django.setup(); from django.conf import settings; '
+                "print(settings.DATABASES['default']['CONN_MAX_AGE'])"
+            )],
+            env=dict(os.environ, DJANGO_SETTINGS_MODULE='quiz_management.settings', DB_CONN_MAX_AGE='60', **env),
+            capture_output=True, text=True, check=True,
+        ).stdout
+        return int(output.split()[-1])
+
+    def test_persistent_connections_off_under_asgi(self):
+        self.assertEqual(self.conn_max_age(), 60)
+        self.assertEqual(self.conn_max_age(SERVING_ASGI='True'), 0)
+
+    def test_serve_asgi_turns_persistent_connections_off(self):
+        databases = {'default': {'CONN_MAX_AGE': 60}, 'replica1': {'CONN_MAX_AGE': 60}}
+        with mock.patch.object(settings, 'DATABASES', databases), override_settings(SERVING_ASGI=False):
+            use_asgi_connections()
+            self.assertTrue(settings.SERVING_ASGI)
+        self.assertEqual([database['CONN_MAX_AGE'] for database in databases.values()], [0, 0])
+
+    def test_pool_reuses_connections(self):
+        pool = ConnectionPool('test', max_size=2)
+        first = pool.checkout(FakeConnection, lambda connection: None)
+        pool.checkin(first)
+        self.assertIs(pool.checkout(FakeConnection, lambda connection: None), first)
+        self.assertEqual(pool.stats()['in_use'], 1)
+
+    def test_pool_discards_unusable_connections(self):
+        pool = ConnectionPool('test', max_size=1, health_check_after=0)
+        first = pool.checkout(FakeConnection, lambda connection: None)
+        pool.checkin(first)
+
+        def ping(connection):
+            raise OSError('gone')
+        second = pool.checkout(FakeConnection, ping)
+        self.assertIsNot(second, first)
+        self.assertTrue(first.closed)
+        pool.checkin(second, reusable=False)
+        self.assertTrue(second.closed)
+        self.assertEqual(pool.stats()['idle'], 0)
+
+    def test_pool_times_out_when_full(self):
+        pool = ConnectionPool('test', max_size=1, timeout=0.05)
+        connection = pool.checkout(FakeConnection, lambda connection: None)
+        with self.assertRaises(PoolTimeout):
+            pool.checkout(FakeConnection, lambda connection: None)
+
+        threading.Timer(0.01, pool.checkin, (connection,)).start()
+        pool.timeout = 5
+        self.assertIs(pool.checkout(FakeConnection, lambda connection: None), connection)
+
+
+@override_settings(DATABASE_REPLICAS={'replica1': 3, 'replica2': 1})
+class ReplicaRouterTestCase(SimpleTestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        # Writes of earlier tests outside a request pin reads to the primary
+        self.addCleanup(routers._wrote.reset, routers._wrote.set(False))
+        available = mock.patch.object(routers, '_is_available', lambda alias: alias not in self.down)
+        available.start()
+        self.addCleanup(available.stop)
+        self.down = set()
+
+    def test_reads_use_primary_outside_replica_reads(self):
+        self.assertIsNone(self.router.db_for_read(Quiz))
+
+    def test_replica_reads(self):
+        with routers.replica_reads():
+            self.assertIn(self.router.db_for_read(Quiz), {'replica1', 'replica2'})
+            with routers.primary_reads():
+                self.assertIsNone(self.router.db_for_read(Quiz))
+
+    def test_unavailable_replicas_are_skipped(self):
+        self.down = {'replica1'}
+        chosen = set()
+        for _ in range(20):
+            with routers.replica_reads():
+                chosen.add(self.router.db_for_read(Quiz))
+        self.assertEqual(chosen, {'replica2'})
+        self.down = {'replica1', 'replica2'}
+        with routers.replica_reads():
+            self.assertIsNone(self.router.db_for_read(Quiz))
+
+    def test_reads_after_a_write_use_primary(self):
+        with routers.replica_reads():
+            token = routers._wrote.set(False)
+            try:
+                self.assertEqual(self.router.db_for_write(Quiz), 'default')
+                self.assertIsNone(self.router.db_for_read(Quiz))
+            finally:
+                routers._wrote.reset(token)
+
+    @override_settings(DATABASE_REPLICA_RETRY_SECONDS=30)
+    def test_mark_unavailable(self):
+        self.addCleanup(routers._unavailable_until.pop, 'replica1', None)
+        with self.assertLogs('quiz_management', 'WARNING'):
+            routers.mark_unavailable('replica1')
+        # Skipped without trying to connect
+        self.assertFalse(is_replica_available('replica1'))
+
+    def test_middleware_pins_writers_to_primary(self):
+        seen = []
+
+        def get_response(request):
+            seen.append(routers._replica_reads.get())
+            return HttpResponse(status=201 if request.method == 'POST' else 200)
+
+        middleware = routers.ReplicaRoutingMiddleware(get_response)
+        factory = RequestFactory()
+        response = middleware(factory.post('/api/v1/public/quizzes/'))
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+
+        middleware(factory.get('/api/v1/public/quizzes/'))
+        pinned = factory.get('/api/v1/public/quizzes/')
+        pinned.COOKIES[routers.PIN_COOKIE] = response.cookies[routers.PIN_COOKIE].value
+        middleware(pinned)
+        middleware(factory.get('/api/v1/auth/profile/'))
+        self.assertEqual(seen, [False, True, False, False])
+
+    def test_pin_header(self):
+        seen = []
+
+        def get_response(request):
+            seen.append(routers._replica_reads.get())
+            return HttpResponse(status=201 if request.method == 'POST' else 200)
+
+        middleware = routers.ReplicaRoutingMiddleware(get_response)
+        factory = RequestFactory()
+        response = middleware(factory.post('/api/v1/public/quizzes/'))
+        pin = response[routers.PIN_HEADER]
+        self.assertEqual(pin, response.cookies[routers.PIN_COOKIE].value)
+        # Cross-origin clients send the header back instead of the cookie
+        middleware(factory.get('/api/v1/public/quizzes/', HTTP_X_DB_PRIMARY_PIN=pin))
+        middleware(factory.get('/api/v1/public/quizzes/', HTTP_X_DB_PRIMARY_PIN='0'))
+        middleware(factory.get('/api/v1/public/quizzes/', HTTP_X_DB_PRIMARY_PIN='invalid'))
+        self.assertEqual(seen[1:], [False, True, True])
+
+    def test_one_replica_per_request(self):
+        seen = []
+
+        def get_response(request):
+            seen.append({self.router.db_for_read(Quiz) for _ in range(20)})
+            return HttpResponse()
+
+        middleware = routers.ReplicaRoutingMiddleware(get_response)
+        for _ in range(10):
+            middleware(RequestFactory().get('/api/v1/public/quizzes/'))
+        self.assertTrue(all(len(aliases) == 1 for aliases in seen))
+        self.assertTrue(set().union(*seen) <= {'replica1', 'replica2'})
+        with routers.replica_reads():
+            self.assertEqual(len({self.router.db_for_read(Quiz) for _ in range(20)}), 1)
+
+
+class BucketThrottle(TokenBucketThrottle):
+    scope = 'test'
+    rate = '2/min'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': 'client'}
+
+
+class ThrottlingTestCase(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def throttle(self, now):
+        throttle = BucketThrottle()
+        throttle.timer = lambda: now
+        return throttle
+
+    def test_token_bucket_allows_bursts_and_refills(self):
+        self.assertTrue(self.throttle(0).allow_request(None, None))
+        self.assertTrue(self.throttle(1).allow_request(None, None))
+        throttle = self.throttle(2)
+        self.assertFalse(throttle.allow_request(None, None))
+        self.assertAlmostEqual(throttle.wait(), 28)
+        self.assertTrue(self.throttle(31).allow_request(None, None))
+        self.assertFalse(self.throttle(32).allow_request(None, None))
+
+    async def test_async_token_bucket_shares_buckets(self):
+        self.assertTrue(await self.throttle(0).aallow_request(None, None))
+        self.assertTrue(self.throttle(0).allow_request(None, None))
+        throttle = self.throttle(0)
+        self.assertFalse(await throttle.aallow_request(None, None))
+        self.assertAlmostEqual(throttle.wait(), 30)
+
+    async def test_async_token_bucket_uses_async_cache_api(self):
+        throttle = self.throttle(0)
+        throttle.cache = mock.Mock(aget=mock.AsyncMock(return_value=None), aset=mock.AsyncMock())
+        self.assertTrue(await throttle.aallow_request(None, None))
+        throttle.cache.aset.assert_awaited_once_with('throttle:test:client', (1, 0), 60)
+        throttle.cache.get.assert_not_called()
+        throttle.cache.set.assert_not_called()
+
+    def test_concurrency_limiter(self):
+        limiter = ConcurrencyLimiter(1)
+        self.assertTrue(limiter.acquire())
+        self.assertFalse(limiter.acquire())
+        limiter.release()
+        self.assertTrue(limiter.acquire())
+
+
+class RenderersTestCase(SimpleTestCase):
+    data = {
+        'submitted_at': datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+        'date': datetime.date(2024, 5, 1),
+        'score': decimal.Decimal('7.50'),
+        'session_id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'big': 2 ** 70,
+        'text': 'line\u2028separator \u00e9',
+        'nested': [{'a': None, 'b': True}],
+    }
+
+    def test_output_matches_drf(self):
+        expected = JSONRenderer().render(self.data)
+        self.assertEqual(renderers.dumps(self.data), expected)
+        self.assertEqual(renderers.FastJSONRenderer().render(self.data), expected)
+
+    def test_falls_back_without_orjson(self):
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(renderers.dumps(self.data), JSONRenderer().render(self.data))
+
+    def test_indented_output(self):
+        context = {'indent': 2}
+        self.assertEqual(
+            renderers.FastJSONRenderer().render({'a': 1}, renderer_context=context),
+            JSONRenderer().render({'a': 1}, renderer_context=context),
+        )
+
+    def test_none_renders_empty(self):
+        self.assertEqual(renderers.FastJSONRenderer().render(None), b'')
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionTestCase(SimpleTestCase):
+    content = b'{"results": [' + b'{"score": "1.00"},' * 100 + b']}'
+
+    def compress(self, response, accept_encoding='gzip, deflate, br'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_accepted_encodings(self):
+        self.assertEqual(accepted_encodings('gzip, br;q=0.5, deflate;q=0, x;q=bad'), {'gzip', 'br'})
+        self.assertEqual(accepted_encodings(''), set())
+
+    @mock.patch('quiz_management.middleware.brotli', None)
+    def test_gzip(self):
+        response = HttpResponse(self.content, content_type='application/json')
+        response['ETag'] = '"v1"'
+        response = self.compress(response)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.content)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        # Version ETags stay strong for If-Match
+        self.assertEqual(response['ETag'], '"v1"')
+
+    def test_brotli_preferred(self):
+        brotli = mock.Mock(compress=mock.Mock(return_value=b'compressed'))
+        with mock.patch('quiz_management.middleware.brotli', brotli):
+            response = self.compress(HttpResponse(self.content))
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(response.content, b'compressed')
+        brotli.compress.assert_called_once_with(self.content, quality=5)
+
+    def test_left_alone(self):
+        small = self.compress(HttpResponse(b'{}'))
+        self.assertFalse(small.has_header('Content-Encoding'))
+        self.assertEqual(small.content, b'{}')
+        refused = self.compress(HttpResponse(self.content), 'identity, gzip;q=0')
+        self.assertFalse(refused.has_header('Content-Encoding'))
+        streamed = self.compress(StreamingHttpResponse([self.content]))
+        self.assertFalse(streamed.has_header('Content-Encoding'))
+
+
+class TagCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['local'].clear()
+        self.compute = mock.Mock(side_effect=lambda: self.compute.call_count)
+
+    def get(self, key='key', tags=('a', 'b'), **kwargs):
+        return tag_cache.get_or_set('test', key, list(tags), self.compute, **kwargs)
+
+    def test_values_are_computed_once(self):
+        self.assertEqual(self.get(), 1)
+        self.assertEqual(self.get(), 1)
+        # Other processes read the shared cache
+        caches['local'].clear()
+        self.assertEqual(self.get(), 1)
+        self.assertEqual(self.compute.call_count, 1)
+
+    def test_none_is_not_cached(self):
+        compute = mock.Mock(return_value=None)
+        self.assertIsNone(tag_cache.get_or_set('test', 'key', ['a'], compute))
+        self.assertIsNone(tag_cache.get_or_set('test', 'key', ['a'], compute))
+        self.assertEqual(compute.call_count, 2)
+
+    def test_invalidated_tags(self):
+        self.get()
+        self.get(key='other', tags=['b'])
+        self.get(key='unrelated', tags=['c'])
+        tag_cache.invalidate_tags('a')
+        self.assertEqual(self.get(), 4)
+        self.assertEqual(self.get(key='other', tags=['b']), 2)
+        tag_cache.invalidate_tags('b')
+        self.assertEqual(self.get(key='other', tags=['b']), 5)
+        self.assertEqual(self.get(key='unrelated', tags=['c']), 3)
+
+    def test_evicted_versions_do_not_revive_values(self):
+        self.get()
+        cache.delete(tag_cache._version_key('a'))
+        self.assertEqual(self.get(), 2)
+
+    def test_local_cache_can_be_skipped(self):
+        self.assertEqual(self.get(local=False), 1)
+        key = tag_cache._versioned_key('key', tag_cache.get_tag_versions(['a', 'b']))
+        self.assertIsNone(caches['local'].get(key))
+        self.assertEqual(self.get(), 1)
+        self.assertEqual(caches['local'].get(key), 1)
+
+    def test_batched_invalidation(self):
+        self.get()
+        with mock.patch.object(tag_cache, '_replace_versions', wraps=tag_cache._replace_versions) as replace_versions:
+            with tag_cache.batched_invalidation():
+                tag_cache.invalidate_tags('a')
+                with tag_cache.batched_invalidation():
+                    tag_cache.invalidate_tags('a', 'c')
+                self.assertEqual(self.get(), 1)
+        self.assertEqual(replace_versions.call_count, 1)
+        self.assertEqual(set(replace_versions.call_args[0][0]), {'a', 'c'})
+        self.assertEqual(self.get(), 2)
+
+    def test_invalidated_again_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tag_cache.invalidate_tags('a')
+            # A read racing the write caches what it read before the commit
+            self.assertEqual(self.get(), 1)
+        self.assertEqual(self.get(), 2)
+
+    async def test_async_shares_values(self):
+        self.assertEqual(self.get(), 1)
+
+        async def compute():
+            return 'async'
+        caches['local'].clear()
+        self.assertEqual(await tag_cache.aget_or_set('test', 'key', ['a', 'b'], compute), 1)
+        tag_cache.invalidate_tags('b')
+        self.assertEqual(await tag_cache.aget_or_set('test', 'key', ['a', 'b'], compute), 'async')
+
+    def test_signals_invalidate_quiz_payloads(self):
+        user = User.objects.create_user('owner', 'owner@example.com', 'pass12345!')
+        quiz = Quiz.objects.create(title='Cached', created_by=user)
+        question = Question.objects.create(quiz=quiz, question_text='Q', question_type='MCQ')
+        option = MCQOption.objects.create(question=question, option_text='A', is_correct=True)
+        self.assertEqual(get_public_quiz(quiz.id)['questions'][0]['question_text'], 'Q')
+        question.question_text = 'Edited'
+        question.save()
+        self.assertEqual(get_public_quiz(quiz.id)['questions'][0]['question_text'], 'Edited')
+        self.assertTrue(get_answer_key(quiz.id)[question.id][1][option.id].is_correct)
+        option.is_correct = False
+        option.save()
+        self.assertFalse(get_answer_key(quiz.id)[question.id][1][option.id].is_correct)
+        quiz.is_active = False
+        quiz.save()
+        with self.assertRaises(Quiz.DoesNotExist):
+            get_public_quiz(quiz.id)
+
+
+class PaginationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['local'].clear()
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'pass12345!')
+        for index in range(3):
+            Quiz.objects.create(title=f'Quiz {index}', created_by=self.user, is_active=index > 0)
+
+    def test_exact_count_without_estimates(self):
+        self.assertIsNone(pagination.estimate_count(Quiz.objects.all()))
+        self.assertEqual(pagination.count_rows(Quiz.objects.all()), (3, False))
+
+    def test_estimate_above_threshold(self):
+        with mock.patch('quiz_management.pagination.estimate_count', return_value=500):
+            self.assertEqual(pagination.count_rows(Quiz.objects.all(), threshold=100), (500, True))
+            # Small tables are counted exactly
+            self.assertEqual(pagination.count_rows(Quiz.objects.all(), threshold=1000), (3, False))
+
+    def test_filtered_counts_are_cached(self):
+        active = Quiz.objects.filter(is_active=True)
+        self.assertEqual(pagination.count_rows(active), (2, False))
+        Quiz.objects.filter(title='Quiz 0').update(is_active=True)
+        with self.assertNumQueries(0):
+            self.assertEqual(pagination.count_rows(active), (2, False))
+        with override_settings(COUNT_CACHE_TIMEOUT=0):
+            self.assertEqual(pagination.count_rows(active), (3, False))
+
+    def test_empty_filters_run_no_query(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(pagination.count_rows(Quiz.objects.filter(pk__in=[])), (0, False))
+
+    def test_api_marks_estimated_counts(self):
+        response = self.client.get('/api/v1/public/quizzes/')
+        self.assertEqual((response.json()['count'], response.json()['count_is_estimated']), (2, False))
+        # Once the exact count is no longer cached
+        cache.clear()
+        with mock.patch('quiz_management.pagination.estimate_count', return_value=10 ** 6):
+            response = self.client.get('/api/v1/public/quizzes/')
+        self.assertEqual((response.json()['count'], response.json()['count_is_estimated']), (10 ** 6, True))
+        self.assertEqual(len(response.json()['results']), 2)
+        # Too high an estimate does not link past the last row
+        self.assertIsNone(response.json()['next'])
+
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=1)
+    def test_low_estimates_do_not_hide_pages(self):
+        Quiz.objects.bulk_create(Quiz(title=f'More {index}', created_by=self.user) for index in range(40))
+        with mock.patch('quiz_management.pagination.estimate_count', return_value=5):
+            paginator = pagination.EstimatedCountPaginator(Quiz.objects.order_by('pk'), 20)
+            self.assertEqual((paginator.num_pages, paginator.estimated), (1, True))
+            self.assertTrue(paginator.page(2).has_next())
+            self.assertFalse(paginator.page(3).has_next())
+            self.assertEqual(len(paginator.page(3)), 3)
+            with self.assertRaises(pagination.PageNotAnInteger):
+                paginator.page('two')
+
+            pages = []
+            url = '/api/v1/public/quizzes/'
+            while url:
+                data = self.client.get(url).json()
+                pages.append(len(data['results']))
+                url = data['next']
+        self.assertEqual(pages, [20, 20, 2])
@@ -9,6 +9,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from .views import metrics_view, liveness_view, readiness_view, CacheStatsView, ProfileListView, ProfileDownloadView
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Quiz Management System API",
@@ -27,9 +29,17 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     
     # API documentation
-    path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('swagger<format>/', schema_view.without_ui(cache_timeout=settings.SWAGGER_CACHE_TIMEOUT), name='schema-json'),
+    path('swagger/', schema_view.with_ui('swagger', cache_timeout=settings.SWAGGER_CACHE_TIMEOUT), name='schema-swagger-ui'),
+    path('redoc/', schema_view.with_ui('redoc', cache_timeout=settings.SWAGGER_CACHE_TIMEOUT), name='schema-redoc'),
+    
+    # Operations
+    path('metrics/', metrics_view, name='metrics'),
+    path('healthz/live/', liveness_view, name='health-live'),
+    path('healthz/ready/', readiness_view, name='health-ready'),
+    path('api/v1/admin/cache/', CacheStatsView.as_view(), name='admin-cache-stats'),
+    path('api/v1/admin/profiles/', ProfileListView.as_view(), name='admin-profile-list'),
+    path('api/v1/admin/profiles/<str:name>/', ProfileDownloadView.as_view(), name='admin-profile-download'),
     
     # API endpoints
     path('api/v1/auth/', include('authentication.urls')),
@@ -1,10 +1,13 @@
 """
 Custom utility functions for the quiz management system.
 """
+from django.http import HttpResponse
 from rest_framework.views import exception_handler
 from rest_framework.response import Response
 from rest_framework import status
 
+from .renderers import dumps
+
 
 def custom_exception_handler(exc, context):
     """
@@ -31,6 +34,12 @@ def custom_exception_handler(exc, context):
             custom_response_data['message'] = 'Not Found'
         elif response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED:
             custom_response_data['message'] = 'Method Not Allowed'
+        elif response.status_code == status.HTTP_412_PRECONDITION_FAILED:
+            custom_response_data['message'] = 'Precondition Failed'
+        elif response.status_code == status.HTTP_428_PRECONDITION_REQUIRED:
+            custom_response_data['message'] = 'Precondition Required'
+        elif response.status_code == status.HTTP_429_TOO_MANY_REQUESTS:
+            custom_response_data['message'] = 'Too Many Requests'
         elif response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR:
             custom_response_data['message'] = 'Internal Server Error'
         
@@ -60,4 +69,35 @@ def error_response(message="An error occurred", details=None, status_code=status
         'message': message,
         'details': details,
         'status_code': status_code
-    }, status=status_code)
\ No newline at end of file
+    }, status=status_code)
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    """
+    JSON response for plain Django views (e.g. async views), encoded like DRF.
+    """
+    return HttpResponse(dumps(data), status=status_code, content_type='application/json')
+
+
+def json_success_response(data=None, message="Success", status_code=status.HTTP_200_OK):
+    """
+    Standardized success response format for plain Django views.
+    """
+    return json_response({
+        'error': False,
+        'message': message,
+        'data': data,
+        'status_code': status_code
+    }, status_code=status_code)
+
+
+def json_error_response(message="An error occurred", details=None, status_code=status.HTTP_400_BAD_REQUEST):
+    """
+    Standardized error response format for plain Django views.
+    """
+    return json_response({
+        'error': True,
+        'message': message,
+        'details': details,
+        'status_code': status_code
+    }, status_code=status_code)
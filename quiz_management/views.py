@@ -0,0 +1,107 @@
+"""
+Operational endpoints for the quiz management system.
+"""
+import os
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.http import FileResponse, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import permissions, status
+from rest_framework.views import APIView
+
+from . import health, metrics, profiling
+from .cache import INVALIDATIONS
+from .db.pool import pool_stats
+from .utils import success_response, error_response, json_success_response, json_error_response
+
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Expose process-aggregated metrics in the Prometheus text format.
+
+    When ``METRICS_AUTH_TOKEN`` is set, scrapers must send it as a bearer token.
+    """
+    token = getattr(settings, 'METRICS_AUTH_TOKEN', '')
+    if token:
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if not constant_time_compare(header, f'Bearer {token}'):
+            return HttpResponseForbidden('Forbidden')
+    return HttpResponse(metrics.render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@require_GET
+def liveness_view(request):
+    """
+    Liveness probe: the process is up and serving requests.
+    """
+    return json_success_response(message="Alive")
+
+
+@require_GET
+def readiness_view(request):
+    """
+    Readiness probe: caches are warm, the process is not shutting down and
+    the database is reachable.
+    """
+    data = {'startup_seconds': health.startup_seconds(), 'db_pools': pool_stats()}
+    if not health.is_ready():
+        return json_error_response(message="Not ready", details=data, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    try:
+        connection.ensure_connection()
+    except DatabaseError as exc:
+        data['database'] = str(exc)
+        return json_error_response(message="Not ready", details=data, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return json_success_response(data=data, message="Ready")
+
+
+class CacheStatsView(APIView):
+    """
+    Cache hit ratios and tag invalidations across all worker processes.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    @swagger_auto_schema(operation_description="Cache hits, misses and hit ratio per cache, and tag invalidations (staff only)")
+    def get(self, request):
+        merged = metrics.collect()
+        invalidations = {
+            labels[0]: int(value) for (name, labels), value in merged.items()
+            if name == INVALIDATIONS.name
+        }
+        return success_response(
+            data={'caches': metrics.cache_stats(merged), 'invalidations': invalidations},
+            message="Cache statistics retrieved successfully"
+        )
+
+
+class ProfileListView(APIView):
+    """
+    List recently captured request profiles.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    @swagger_auto_schema(operation_description="List recent request profiles (staff only)")
+    def get(self, request):
+        return success_response(data=profiling.list_profiles(), message="Profiles retrieved successfully")
+
+
+class ProfileDownloadView(APIView):
+    """
+    Download a single profile file.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    @swagger_auto_schema(operation_description="Download a request profile file (staff only)")
+    def get(self, request, name):
+        if not profiling.PROFILE_FILE_RE.match(name):
+            return error_response(message="Invalid profile name", status_code=status.HTTP_400_BAD_REQUEST)
+        path = os.path.join(profiling.profiles_dir(), name)
+        if not os.path.isfile(path):
+            return error_response(message="Profile not found", status_code=status.HTTP_404_NOT_FOUND)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
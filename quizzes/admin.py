@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Quiz, Question, MCQOption
+from quiz_management.admin import AutocompleteFilter, LargeTableAdmin
+from .models import Quiz, Question, MCQOption, AcceptedAnswer
 
 
 class MCQOptionInline(admin.TabularInline):
@@ -7,21 +8,41 @@ class MCQOptionInline(admin.TabularInline):
     extra = 2
 
 
+class AcceptedAnswerInline(admin.TabularInline):
+    model = AcceptedAnswer
+    extra = 0
+
+
 @admin.register(Quiz)
-class QuizAdmin(admin.ModelAdmin):
+class QuizAdmin(LargeTableAdmin):
     list_display = ('title', 'created_by', 'is_active', 'total_questions', 'total_points', 'created_at')
-    list_filter = ('is_active', 'created_by', 'created_at')
+    list_filter = ('is_active', ('created_by', AutocompleteFilter), 'created_at')
+    list_select_related = ('created_by',)
     search_fields = ('title', 'description')
+    autocomplete_fields = ('created_by',)
     readonly_fields = ('created_at', 'updated_at', 'total_questions', 'total_points')
     ordering = ('-created_at',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_totals(questions=True, points=True)
+
+    @admin.display(description='Total questions', ordering='question_count')
+    def total_questions(self, obj):
+        return obj.total_questions
+
+    @admin.display(description='Total points', ordering='points_total')
+    def total_points(self, obj):
+        return obj.total_points
+
 
 @admin.register(Question)
-class QuestionAdmin(admin.ModelAdmin):
+class QuestionAdmin(LargeTableAdmin):
     list_display = ('quiz', 'question_text_short', 'question_type', 'order', 'points')
-    list_filter = ('question_type', 'quiz')
+    list_filter = ('question_type', ('quiz', AutocompleteFilter))
+    list_select_related = ('quiz',)
     search_fields = ('question_text', 'quiz__title')
-    inlines = [MCQOptionInline]
+    autocomplete_fields = ('quiz',)
+    inlines = [MCQOptionInline, AcceptedAnswerInline]
     ordering = ('quiz', 'order')
     
     def question_text_short(self, obj):
@@ -30,10 +51,12 @@ class QuestionAdmin(admin.ModelAdmin):
 
 
 @admin.register(MCQOption)
-class MCQOptionAdmin(admin.ModelAdmin):
+class MCQOptionAdmin(LargeTableAdmin):
     list_display = ('question', 'option_text_short', 'is_correct', 'order')
     list_filter = ('is_correct', 'question__question_type')
+    list_select_related = ('question__quiz',)
     search_fields = ('option_text', 'question__question_text')
+    autocomplete_fields = ('question',)
     
     def option_text_short(self, obj):
         return obj.option_text[:30] + '...' if len(obj.option_text) > 30 else obj.option_text
@@ -0,0 +1,78 @@
+"""
+Cache helpers for quiz payloads served to participants.
+
+Payloads are cached under the ``quiz:<id>`` tag (see
+``quiz_management.cache``), which is invalidated whenever the quiz, one of
+its questions or one of their options changes (see ``quizzes.signals``), so
+a payload cached before an edit is never served after it.
+"""
+from quiz_management.cache import aget_or_set, get_or_set, quiz_tag
+from .models import Quiz, Question
+from .serializers import QuizPublicSerializer
+
+PUBLIC_QUIZ_TIMEOUT = 60 * 15
+ANSWER_KEY_TIMEOUT = 60 * 15
+QUESTION_POOL_TIMEOUT = 60 * 15
+
+
+def _public_quiz_queryset():
+    return Quiz.objects.filter(is_active=True).prefetch_related('questions__options')
+
+
+def get_public_quiz(quiz_id):
+    """
+    Return the serialized public payload of an active quiz.
+
+    Raises ``Quiz.DoesNotExist`` if the quiz does not exist or is inactive.
+    """
+    def compute():
+        return QuizPublicSerializer(_public_quiz_queryset().get(pk=quiz_id)).data
+    return get_or_set('public_quiz', f'quiz:{quiz_id}:public', [quiz_tag(quiz_id)], compute, PUBLIC_QUIZ_TIMEOUT)
+
+
+async def aget_public_quiz(quiz_id):
+    """Async variant of ``get_public_quiz``."""
+    async def compute():
+        quiz = await _public_quiz_queryset().aget(pk=quiz_id)
+        # Questions and options are prefetched, so serializing runs no queries
+        return QuizPublicSerializer(quiz).data
+    return await aget_or_set('public_quiz', f'quiz:{quiz_id}:public', [quiz_tag(quiz_id)], compute, PUBLIC_QUIZ_TIMEOUT)
+
+
+def get_answer_key(quiz_id):
+    """
+    Return ``{question_id: (question, {option_id: option})}`` for every
+    question of a quiz. The instances can be attached to new answers
+    directly, so grading a submission needs no question or option queries.
+    """
+    def compute():
+        return {
+            question.id: (question, {option.id: option for option in question.options.all()})
+            for question in Question.objects.filter(quiz_id=quiz_id).prefetch_related('options', 'accepted_answers')
+        }
+    return get_or_set('answer_key', f'quiz:{quiz_id}:answer_key', [quiz_tag(quiz_id)], compute, ANSWER_KEY_TIMEOUT)
+
+
+def get_question_pool(quiz_id):
+    """
+    Return ``(id, question_type, points)`` of every question of a quiz in
+    question order, for drawing questions per attempt.
+    """
+    def compute():
+        return list(
+            Question.objects.filter(quiz_id=quiz_id).order_by('order')
+            .values_list('id', 'question_type', 'points')
+        )
+    return get_or_set('question_pool', f'quiz:{quiz_id}:question_pool', [quiz_tag(quiz_id)], compute, QUESTION_POOL_TIMEOUT)
+
+
+def warm_quiz_caches():
+    """
+    Populate the public payload and answer key caches of every active quiz.
+    Returns the number of quizzes warmed.
+    """
+    quiz_ids = list(Quiz.objects.filter(is_active=True).values_list('id', flat=True))
+    for quiz_id in quiz_ids:
+        get_public_quiz(quiz_id)
+        get_answer_key(quiz_id)
+    return len(quiz_ids)
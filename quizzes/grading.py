@@ -0,0 +1,202 @@
+"""
+Automatic grading of text answers.
+
+Admins give a TEXT question accepted answers, each a rule of one of these
+kinds:
+
+- ``EXACT``: equal to the accepted answer after normalization.
+- ``NUMERIC``: a number (``42``, ``-1.5e3``, ``3/4``) within ``tolerance``
+  of the accepted value. Numbers longer than ``MAX_NUMBER_LENGTH``
+  characters or with an exponent beyond ``MAX_EXPONENT`` are not numbers,
+  so an answer like ``1e999999999`` cannot make grading compute a huge
+  power of ten.
+- ``REGEX``: the whole normalized answer matches the pattern.
+- ``KEYWORDS``: contains every comma separated keyword or phrase as whole
+  words, in any order.
+- ``FUZZY``: similar to the accepted answer by at least ``threshold``
+  (0-1, the ``difflib`` similarity ratio).
+
+An answer is correct when any rule matches. Normalization applies Unicode
+NFKC, collapses whitespace and strips trailing sentence punctuation
+(``.,;:!?``), so signs and symbols such as ``-3``, ``.5`` and ``C++`` are
+kept; numbers are read from the answer with only NFKC and whitespace
+handling. Rules are case-insensitive unless marked case-sensitive.
+
+Graders are plain, picklable objects that do not touch the database, so
+``grade_texts`` can run in worker processes when answers are regraded in
+bulk.
+"""
+import difflib
+import re
+import unicodedata
+from fractions import Fraction
+
+_TRAILING_PUNCTUATION = '.,;:!? '
+_WORD = re.compile(r'\w+')
+
+MAX_NUMBER_LENGTH = 100
+MAX_EXPONENT = 1000
+# The syntax Fraction accepts, with the exponent captured
+_NUMBER = re.compile(r'[+-]?(?:\d+/\d+|(?:\d+(?:\.\d*)?|\.\d+)(?:[eE]([+-]?\d+))?)')
+
+
+def _canonical(text):
+    return ' '.join(unicodedata.normalize('NFKC', text).split())
+
+
+def normalize(text):
+    """Normalize an answer for comparison; case is kept."""
+    return _canonical(text).rstrip(_TRAILING_PUNCTUATION)
+
+
+def parse_number(text):
+    """The number written in ``text`` as a ``Fraction``, or ``None``."""
+    text = text.replace(' ', '')
+    if len(text) > MAX_NUMBER_LENGTH:
+        return None
+    match = _NUMBER.fullmatch(text)
+    if match is None or (match.group(1) is not None and abs(int(match.group(1))) > MAX_EXPONENT):
+        return None
+    try:
+        return Fraction(text)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def _words(text):
+    return ' %s ' % ' '.join(_WORD.findall(text))
+
+
+class ExactRule:
+
+    def __init__(self, answer, case_sensitive=False):
+        self.case_sensitive = case_sensitive
+        self.answer = normalize(answer) if case_sensitive else normalize(answer).casefold()
+
+    def matches(self, text):
+        return text == self.answer
+
+
+class NumericRule:
+    case_sensitive = False
+
+    def __init__(self, answer, tolerance=0):
+        value = parse_number(_canonical(answer))
+        if value is None:
+            raise ValueError(f"{answer!r} is not a number.")
+        self.value = value
+        self.tolerance = Fraction(tolerance)
+
+    def matches(self, text):
+        value = parse_number(text)
+        return value is not None and abs(value - self.value) <= self.tolerance
+
+
+class RegexRule:
+
+    def __init__(self, pattern, case_sensitive=False):
+        self.case_sensitive = case_sensitive
+        # Raises re.error for invalid patterns
+        self.pattern = re.compile(pattern, 0 if case_sensitive else re.IGNORECASE)
+
+    def matches(self, text):
+        return self.pattern.fullmatch(text) is not None
+
+
+class KeywordsRule:
+
+    def __init__(self, keywords, case_sensitive=False):
+        self.case_sensitive = case_sensitive
+        self.keywords = [
+            _words(keyword if case_sensitive else keyword.casefold())
+            for keyword in keywords.split(',') if _WORD.search(keyword)
+        ]
+        if not self.keywords:
+            raise ValueError("At least one keyword is required.")
+
+    def matches(self, text):
+        words = _words(text)
+        return all(keyword in words for keyword in self.keywords)
+
+
+class FuzzyRule:
+
+    def __init__(self, answer, threshold=0.85, case_sensitive=False):
+        self.case_sensitive = case_sensitive
+        self.answer = normalize(answer) if case_sensitive else normalize(answer).casefold()
+        self.threshold = threshold
+
+    def matches(self, text):
+        # The length bound and the quick ratios are upper bounds of ratio(),
+        # so most non-matching answers are rejected without the full comparison
+        if 2 * min(len(text), len(self.answer)) < self.threshold * (len(text) + len(self.answer)):
+            return False
+        matcher = difflib.SequenceMatcher(None, text, self.answer, autojunk=False)
+        return (
+            matcher.real_quick_ratio() >= self.threshold
+            and matcher.quick_ratio() >= self.threshold
+            and matcher.ratio() >= self.threshold
+        )
+
+
+def build_rule(match_type, answer_text, case_sensitive=False, tolerance=0, threshold=0.85):
+    """
+    Build the rule for an accepted answer. Raises ``ValueError`` (or
+    ``re.error``) if ``answer_text`` does not fit ``match_type``.
+    """
+    if match_type == 'EXACT':
+        return ExactRule(answer_text, case_sensitive)
+    if match_type == 'NUMERIC':
+        return NumericRule(answer_text, tolerance)
+    if match_type == 'REGEX':
+        return RegexRule(answer_text, case_sensitive)
+    if match_type == 'KEYWORDS':
+        return KeywordsRule(answer_text, case_sensitive)
+    if match_type == 'FUZZY':
+        return FuzzyRule(answer_text, threshold, case_sensitive)
+    raise ValueError(f"Unknown match type {match_type!r}.")
+
+
+class TextGrader:
+    """
+    Grades text answers against the accepted answers of a question. A grader
+    without rules is falsy; such questions are graded manually.
+    """
+
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+
+    @classmethod
+    def from_accepted_answers(cls, accepted_answers):
+        return cls(
+            build_rule(accepted.match_type, accepted.answer_text, accepted.case_sensitive,
+                       accepted.tolerance, accepted.threshold)
+            for accepted in accepted_answers
+        )
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def grade(self, text):
+        """Whether ``text`` matches any accepted answer."""
+        canonical = _canonical(text or '')
+        plain = canonical.rstrip(_TRAILING_PUNCTUATION)
+        folded = plain.casefold()
+        return any(
+            # Punctuation can be part of a number, so numbers see the answer as given
+            rule.matches(canonical if isinstance(rule, NumericRule) else plain if rule.case_sensitive else folded)
+            for rule in self.rules
+        )
+
+    def grade_many(self, texts):
+        """Grade a sequence of answers; each distinct answer is graded once."""
+        results = {}
+        return [
+            results[text] if text in results else results.setdefault(text, self.grade(text))
+            for text in texts
+        ]
+
+
+def grade_texts(grader, texts):
+    """``grader.grade_many(texts)``, as a picklable function for worker processes."""
+    return grader.grade_many(texts)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='content_version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever a question or option of the quiz changes'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0002_quiz_content_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='questions_per_attempt',
+            field=models.PositiveIntegerField(default=0, help_text='Questions drawn at random for each attempt (0 = all questions)'),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='sampling_strata',
+            field=models.CharField(blank=True, choices=[('', 'None'), ('question_type', 'Question type'), ('points', 'Points')], default='', help_text='Draw questions in proportion to their share of each question type or point value', max_length=20),
+        ),
+    ]
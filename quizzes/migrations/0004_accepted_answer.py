@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:14
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0003_quiz_question_sampling'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AcceptedAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('match_type', models.CharField(choices=[('EXACT', 'Exact'), ('NUMERIC', 'Numeric'), ('REGEX', 'Regular expression'), ('KEYWORDS', 'Keywords'), ('FUZZY', 'Fuzzy')], default='EXACT', max_length=10)),
+                ('answer_text', models.CharField(help_text='Accepted answer, number, pattern or comma separated keywords, depending on the match type', max_length=500)),
+                ('case_sensitive', models.BooleanField(default=False)),
+                ('tolerance', models.FloatField(default=0, help_text='Allowed difference from the accepted number (numeric matches)', validators=[django.core.validators.MinValueValidator(0)])),
+                ('threshold', models.FloatField(default=0.85, help_text='Minimum similarity between 0 and 1 (fuzzy matches)', validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(1)])),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='accepted_answers', to='quizzes.question')),
+            ],
+            options={
+                'verbose_name': 'Accepted Answer',
+                'verbose_name_plural': 'Accepted Answers',
+                'ordering': ['question', 'id'],
+            },
+        ),
+    ]
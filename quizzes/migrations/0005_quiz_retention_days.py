@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0004_accepted_answer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='retention_days',
+            field=models.PositiveIntegerField(default=0, help_text='Delete responses this many days after submission (0 = keep them)'),
+        ),
+    ]
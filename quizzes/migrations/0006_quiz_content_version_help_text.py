@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0005_quiz_retention_days'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='quiz',
+            name='content_version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Incremented whenever the quiz or one of its questions or options changes'),
+        ),
+    ]
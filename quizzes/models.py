@@ -1,14 +1,66 @@
+import re
+
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .grading import TextGrader, build_rule
 
 User = get_user_model()
 
 
+def subquery_aggregate(queryset, group_by, expression):
+    """
+    ``expression`` over ``queryset``, which is filtered on an ``OuterRef``,
+    as a scalar subquery that is 0 when there are no rows.
+    """
+    subquery = queryset.order_by().values(group_by).annotate(value=expression).values('value')
+    return Coalesce(models.Subquery(subquery, output_field=models.IntegerField()), 0)
+
+
+class QuizQuerySet(models.QuerySet):
+
+    def with_totals(self, questions=False, points=False, responses=False):
+        """
+        Annotate the aggregates behind ``total_questions``, ``total_points``
+        and ``total_responses``, so listing quizzes needs no query per quiz.
+        Only the requested aggregates are computed.
+        """
+        annotations = {}
+        quiz_questions = Question.objects.filter(quiz=models.OuterRef('pk'))
+        if questions:
+            annotations['question_count'] = subquery_aggregate(quiz_questions, 'quiz', models.Count('pk'))
+        if points:
+            annotations['points_total'] = subquery_aggregate(quiz_questions, 'quiz', models.Sum('points'))
+        if responses:
+            response_model = Quiz.responses.rel.related_model
+            annotations['response_count'] = subquery_aggregate(
+                response_model.objects.filter(quiz=models.OuterRef('pk')), 'quiz', models.Count('pk')
+            )
+        return self.annotate(**annotations) if annotations else self
+
+    def bump_content_version(self):
+        """
+        Record that these quizzes, or their questions or options, changed,
+        without loading them. Moves ``updated_at`` too, so it stays usable as
+        ``Last-Modified``.
+        """
+        return self.update(content_version=models.F('content_version') + 1, updated_at=timezone.now())
+
+
 class Quiz(models.Model):
     """
     Model representing a quiz.
     """
+    SAMPLING_STRATA = [
+        ('', 'None'),
+        ('question_type', 'Question type'),
+        ('points', 'Points'),
+    ]
+
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_quizzes')
@@ -35,6 +87,28 @@ class Quiz(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    questions_per_attempt = models.PositiveIntegerField(
+        default=0,
+        help_text="Questions drawn at random for each attempt (0 = all questions)"
+    )
+    sampling_strata = models.CharField(
+        max_length=20,
+        choices=SAMPLING_STRATA,
+        blank=True,
+        default='',
+        help_text="Draw questions in proportion to their share of each question type or point value"
+    )
+    retention_days = models.PositiveIntegerField(
+        default=0,
+        help_text="Delete responses this many days after submission (0 = keep them)"
+    )
+    content_version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        help_text="Incremented whenever the quiz or one of its questions or options changes"
+    )
+
+    objects = QuizQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
@@ -44,16 +118,42 @@ class Quiz(models.Model):
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # content_version is only changed through bump_content_version, so a
+        # stale in-memory value must not overwrite a newer one
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            skipped = self.get_deferred_fields() | {'content_version'}
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped and field.name not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def samples_questions(self):
+        """Whether each attempt gets its own random subset of the questions."""
+        return self.questions_per_attempt > 0
+
     @property
     def total_questions(self):
+        if hasattr(self, 'question_count'):
+            return self.question_count
+        if 'questions' in getattr(self, '_prefetched_objects_cache', {}):
+            return len(self.questions.all())
         return self.questions.count()
 
     @property
     def total_points(self):
+        if hasattr(self, 'points_total'):
+            return self.points_total
+        if 'questions' in getattr(self, '_prefetched_objects_cache', {}):
+            return sum(question.points for question in self.questions.all())
         return self.questions.aggregate(total=models.Sum('points'))['total'] or 0
 
     @property
     def total_responses(self):
+        if hasattr(self, 'response_count'):
+            return self.response_count
         return self.responses.count()
 
 
@@ -99,6 +199,15 @@ class Question(models.Model):
             return self.options.filter(is_correct=True).first()
         return None
 
+    def text_grader(self):
+        """
+        Grader for text answers built from the accepted answers; falsy if
+        there are none. Reuses prefetched accepted answers.
+        """
+        if not hasattr(self, '_text_grader'):
+            self._text_grader = TextGrader.from_accepted_answers(self.accepted_answers.all())
+        return self._text_grader
+
 
 class MCQOption(models.Model):
     """
@@ -117,3 +226,49 @@ class MCQOption(models.Model):
 
     def __str__(self):
         return f"{self.question} - Option {self.order}: {self.option_text[:30]}"
+
+
+class AcceptedAnswer(models.Model):
+    """
+    Model representing an accepted answer used to grade text questions
+    automatically (see ``quizzes.grading``).
+    """
+    MATCH_TYPES = [
+        ('EXACT', 'Exact'),
+        ('NUMERIC', 'Numeric'),
+        ('REGEX', 'Regular expression'),
+        ('KEYWORDS', 'Keywords'),
+        ('FUZZY', 'Fuzzy'),
+    ]
+
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='accepted_answers')
+    match_type = models.CharField(max_length=10, choices=MATCH_TYPES, default='EXACT')
+    answer_text = models.CharField(
+        max_length=500,
+        help_text="Accepted answer, number, pattern or comma separated keywords, depending on the match type"
+    )
+    case_sensitive = models.BooleanField(default=False)
+    tolerance = models.FloatField(
+        default=0,
+        validators=[MinValueValidator(0)],
+        help_text="Allowed difference from the accepted number (numeric matches)"
+    )
+    threshold = models.FloatField(
+        default=0.85,
+        validators=[MinValueValidator(0), MaxValueValidator(1)],
+        help_text="Minimum similarity between 0 and 1 (fuzzy matches)"
+    )
+
+    class Meta:
+        ordering = ['question', 'id']
+        verbose_name = 'Accepted Answer'
+        verbose_name_plural = 'Accepted Answers'
+
+    def __str__(self):
+        return f"{self.question} - {self.get_match_type_display()}: {self.answer_text[:30]}"
+
+    def clean(self):
+        try:
+            build_rule(self.match_type, self.answer_text, self.case_sensitive, self.tolerance, self.threshold)
+        except (ValueError, re.error) as exc:
+            raise ValidationError({'answer_text': str(exc)})
@@ -0,0 +1,57 @@
+"""
+Per-attempt question sampling.
+
+Quizzes with ``questions_per_attempt`` draw that many questions for every
+attempt from their question bank. The draw works on the cached question pool
+of the quiz (see ``quizzes.cache.get_question_pool``), so it needs no
+database query and never sorts the questions table at random. It is seeded
+with the attempt's session id, which makes a draw reproducible.
+"""
+import random
+from collections import defaultdict
+
+POOL_ID, POOL_TYPE, POOL_POINTS = range(3)
+
+_STRATUM_FIELDS = {
+    'question_type': POOL_TYPE,
+    'points': POOL_POINTS,
+}
+
+
+def _allocate(sizes, count):
+    """
+    Split ``count`` draws over strata of the given sizes in proportion to
+    their size (largest remainder method).
+    """
+    total = sum(sizes.values())
+    quotas = {key: size * count / total for key, size in sizes.items()}
+    allocation = {key: int(quota) for key, quota in quotas.items()}
+    remaining = count - sum(allocation.values())
+    # Ties go to the larger stratum, then to the stratum key, so the split is deterministic
+    for key in sorted(quotas, key=lambda key: (allocation[key] - quotas[key], -sizes[key], str(key)))[:remaining]:
+        allocation[key] += 1
+    return allocation
+
+
+def sample_questions(pool, count, strata='', seed=None):
+    """
+    Draw ``count`` question ids from ``pool``, a sequence of
+    ``(id, question_type, points)`` in question order. With ``strata`` set to
+    ``'question_type'`` or ``'points'`` each group gets its proportional share
+    of the draws. Returns the drawn ids in question order; the whole pool if
+    it is not larger than ``count``.
+    """
+    if count <= 0 or count >= len(pool):
+        return [entry[POOL_ID] for entry in pool]
+    rng = random.Random(seed)
+    if strata:
+        groups = defaultdict(list)
+        for position, entry in enumerate(pool):
+            groups[entry[_STRATUM_FIELDS[strata]]].append(position)
+        allocation = _allocate({key: len(positions) for key, positions in groups.items()}, count)
+        positions = []
+        for key in sorted(groups, key=str):
+            positions.extend(rng.sample(groups[key], allocation[key]))
+    else:
+        positions = rng.sample(range(len(pool)), count)
+    return [pool[position][POOL_ID] for position in sorted(positions)]
@@ -1,6 +1,26 @@
 from rest_framework import serializers
-from .models import Quiz, Question, MCQOption
+import re
+
+from .grading import build_rule
+from .models import Quiz, Question, MCQOption, AcceptedAnswer
+from .signals import batched_content_changes
 from authentication.models import User
+from quiz_management.serializers import DynamicFieldsMixin
+
+
+def setup_quiz_eager_loading(queryset, fields):
+    """Load only the relations and aggregates rendered in ``fields``."""
+    if 'created_by_name' in fields:
+        queryset = queryset.select_related('created_by')
+    questions = 'questions' in fields
+    if questions:
+        queryset = queryset.prefetch_related('questions__options')
+    # With the questions prefetched their totals are computed in Python
+    return queryset.with_totals(
+        questions='total_questions' in fields and not questions,
+        points='total_points' in fields and not questions,
+        responses='total_responses' in fields,
+    )
 
 
 class MCQOptionSerializer(serializers.ModelSerializer):
@@ -27,17 +47,41 @@ class MCQOptionPublicSerializer(serializers.ModelSerializer):
         fields = ['id', 'option_text', 'order']
 
 
-class QuestionSerializer(serializers.ModelSerializer):
+class AcceptedAnswerSerializer(serializers.ModelSerializer):
+    """
+    Serializer for accepted answers of text questions.
+    """
+    class Meta:
+        model = AcceptedAnswer
+        fields = ['id', 'match_type', 'answer_text', 'case_sensitive', 'tolerance', 'threshold']
+
+    def validate(self, attrs):
+        try:
+            build_rule(
+                attrs.get('match_type', 'EXACT'), attrs['answer_text'], attrs.get('case_sensitive', False),
+                attrs.get('tolerance', 0), attrs.get('threshold', 0.85)
+            )
+        except (ValueError, re.error) as exc:
+            raise serializers.ValidationError({'answer_text': str(exc)})
+        return attrs
+
+
+class QuestionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for questions (admin view with correct answers).
     """
     options = MCQOptionSerializer(many=True, read_only=True)
+    accepted_answers = AcceptedAnswerSerializer(many=True, read_only=True)
+    expandable_fields = {
+        'options': lambda: MCQOptionSerializer(many=True, read_only=True),
+        'accepted_answers': lambda: AcceptedAnswerSerializer(many=True, read_only=True),
+    }
     
     class Meta:
         model = Question
         fields = [
             'id', 'question_text', 'question_type', 'order', 'points', 
-            'is_required', 'explanation', 'options', 'created_at'
+            'is_required', 'explanation', 'options', 'accepted_answers', 'created_at'
         ]
 
     def validate(self, attrs):
@@ -45,6 +89,15 @@ class QuestionSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Question order must be positive.")
         return attrs
 
+    @staticmethod
+    def setup_eager_loading(queryset, fields):
+        """Prefetch the options and accepted answers only when they are rendered."""
+        if 'options' in fields:
+            queryset = queryset.prefetch_related('options')
+        if 'accepted_answers' in fields:
+            queryset = queryset.prefetch_related('accepted_answers')
+        return queryset
+
 
 class QuestionPublicSerializer(serializers.ModelSerializer):
     """
@@ -60,23 +113,33 @@ class QuestionPublicSerializer(serializers.ModelSerializer):
         ]
 
 
-class QuestionCreateUpdateSerializer(serializers.ModelSerializer):
+class QuestionCreateUpdateSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for creating and updating questions with options.
     """
     options = MCQOptionSerializer(many=True, required=False)
+    accepted_answers = AcceptedAnswerSerializer(many=True, required=False)
+    expandable_fields = {
+        'options': lambda: MCQOptionSerializer(many=True, required=False),
+        'accepted_answers': lambda: AcceptedAnswerSerializer(many=True, required=False),
+    }
+    setup_eager_loading = staticmethod(QuestionSerializer.setup_eager_loading)
     
     class Meta:
         model = Question
         fields = [
             'question_text', 'question_type', 'order', 'points', 
-            'is_required', 'explanation', 'options'
+            'is_required', 'explanation', 'options', 'accepted_answers'
         ]
 
     def validate(self, attrs):
         question_type = attrs.get('question_type')
         options = attrs.get('options', [])
         
+        if attrs.get('accepted_answers'):
+            if attrs.get('question_type', getattr(self.instance, 'question_type', None)) != 'TEXT':
+                raise serializers.ValidationError("Accepted answers can only be added to text questions.")
+        
         if question_type == 'MCQ':
             if len(options) < 2:
                 raise serializers.ValidationError("MCQ questions must have at least 2 options.")
@@ -102,16 +165,29 @@ class QuestionCreateUpdateSerializer(serializers.ModelSerializer):
         return attrs
 
     def create(self, validated_data):
+        with batched_content_changes():
+            return self._create(validated_data)
+
+    def update(self, instance, validated_data):
+        with batched_content_changes():
+            return self._update(instance, validated_data)
+
+    def _create(self, validated_data):
         options_data = validated_data.pop('options', [])
+        accepted_answers_data = validated_data.pop('accepted_answers', [])
         question = Question.objects.create(**validated_data)
         
         for option_data in options_data:
             MCQOption.objects.create(question=question, **option_data)
+
+        for accepted_answer_data in accepted_answers_data:
+            AcceptedAnswer.objects.create(question=question, **accepted_answer_data)
         
         return question
 
-    def update(self, instance, validated_data):
+    def _update(self, instance, validated_data):
         options_data = validated_data.pop('options', None)
+        accepted_answers_data = validated_data.pop('accepted_answers', None)
         
         # Update question fields
         for attr, value in validated_data.items():
@@ -126,15 +202,22 @@ class QuestionCreateUpdateSerializer(serializers.ModelSerializer):
             # Create new options
             for option_data in options_data:
                 MCQOption.objects.create(question=instance, **option_data)
+
+        # Replace accepted answers if provided
+        if accepted_answers_data is not None:
+            instance.accepted_answers.all().delete()
+            for accepted_answer_data in accepted_answers_data:
+                AcceptedAnswer.objects.create(question=instance, **accepted_answer_data)
         
         return instance
 
 
-class QuizSerializer(serializers.ModelSerializer):
+class QuizSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for quizzes (admin view).
     """
     questions = QuestionSerializer(many=True, read_only=True)
+    expandable_fields = {'questions': lambda: QuestionSerializer(many=True, read_only=True)}
     created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
     total_questions = serializers.ReadOnlyField()
     total_points = serializers.ReadOnlyField()
@@ -145,11 +228,14 @@ class QuizSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'description', 'created_by', 'created_by_name',
             'time_limit', 'is_active', 'passing_score', 'show_results_immediately',
-            'allow_retakes', 'max_attempts', 'questions', 'total_questions',
-            'total_points', 'total_responses', 'created_at', 'updated_at'
+            'allow_retakes', 'max_attempts', 'questions_per_attempt', 'sampling_strata',
+            'retention_days', 'questions', 'total_questions', 'total_points', 'total_responses',
+            'created_at', 'updated_at'
         ]
         read_only_fields = ['created_by', 'created_at', 'updated_at']
 
+    setup_eager_loading = staticmethod(setup_quiz_eager_loading)
+
 
 class QuizPublicSerializer(serializers.ModelSerializer):
     """
@@ -164,13 +250,13 @@ class QuizPublicSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'description', 'time_limit', 'passing_score',
             'show_results_immediately', 'allow_retakes', 'max_attempts',
-            'questions', 'total_questions', 'total_points'
+            'questions_per_attempt', 'questions', 'total_questions', 'total_points'
         ]
 
 
-class QuizListSerializer(serializers.ModelSerializer):
+class QuizListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
-    Serializer for quiz list view (without questions).
+    Serializer for quiz list view (without questions unless expanded).
     """
     created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True)
     total_questions = serializers.ReadOnlyField()
@@ -185,6 +271,9 @@ class QuizListSerializer(serializers.ModelSerializer):
             'total_questions', 'total_points', 'total_responses', 'created_at'
         ]
 
+    expandable_fields = {'questions': lambda: QuestionSerializer(many=True, read_only=True)}
+    setup_eager_loading = staticmethod(setup_quiz_eager_loading)
+
 
 class QuizPublicListSerializer(serializers.ModelSerializer):
     """
@@ -207,7 +296,8 @@ class QuizCreateUpdateSerializer(serializers.ModelSerializer):
         model = Quiz
         fields = [
             'title', 'description', 'time_limit', 'is_active', 'passing_score',
-            'show_results_immediately', 'allow_retakes', 'max_attempts'
+            'show_results_immediately', 'allow_retakes', 'max_attempts',
+            'questions_per_attempt', 'sampling_strata', 'retention_days'
         ]
 
     def validate_title(self, value):
@@ -223,4 +313,14 @@ class QuizCreateUpdateSerializer(serializers.ModelSerializer):
     def validate_passing_score(self, value):
         if not 0 <= value <= 100:
             raise serializers.ValidationError("Passing score must be between 0 and 100.")
-        return value
\ No newline at end of file
+        return value
+
+    def validate(self, attrs):
+        questions_per_attempt = attrs.get(
+            'questions_per_attempt', getattr(self.instance, 'questions_per_attempt', 0)
+        )
+        if attrs.get('sampling_strata') and not questions_per_attempt:
+            raise serializers.ValidationError(
+                {'sampling_strata': "Strata only apply when questions_per_attempt is set."}
+            )
+        return attrs
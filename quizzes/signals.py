@@ -0,0 +1,92 @@
+"""
+Signal handlers that keep cached quiz payloads and quiz content versions in
+sync with the database. Saving a quiz, or any of its questions or options,
+moves its content version. Inside ``batched_content_changes`` the version
+moves once per quiz when the block ends, however many rows it saved.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from quiz_management.cache import invalidate_tags, quiz_tag, responses_tag
+from .models import Quiz, Question, MCQOption, AcceptedAnswer
+
+# Quizzes changed inside the current batch, mapped to whether any of their
+# rows was deleted; None outside a batch
+_changed_quizzes = ContextVar('quizzes_changed_quizzes', default=None)
+
+
+def _deleted_with_quiz(kwargs):
+    # Questions and options deleted by a cascade from their quiz need no
+    # update of the quiz; quiz_changed covers them
+    origin = kwargs.get('origin')
+    return (origin.model if isinstance(origin, QuerySet) else type(origin)) is Quiz
+
+
+@contextmanager
+def batched_content_changes():
+    """Bump the content version of each quiz changed in the block once."""
+    if _changed_quizzes.get() is not None:
+        yield
+        return
+    changed = {}
+    token = _changed_quizzes.set(changed)
+    try:
+        yield
+    finally:
+        # Rows saved before an error are committed all the same
+        _changed_quizzes.reset(token)
+        for quiz_id, deleted in changed.items():
+            _apply_content_change(quiz_id, deleted)
+
+
+def content_changed(quiz_id, deleted=False):
+    changed = _changed_quizzes.get()
+    if changed is None:
+        _apply_content_change(quiz_id, deleted)
+    else:
+        changed[quiz_id] = changed.get(quiz_id, False) or deleted
+
+
+def _apply_content_change(quiz_id, deleted):
+    # Deleting a question or option also deletes the answers given to it
+    if deleted:
+        invalidate_tags(quiz_tag(quiz_id), responses_tag(quiz_id))
+    else:
+        invalidate_tags(quiz_tag(quiz_id))
+    Quiz.objects.filter(pk=quiz_id).bump_content_version()
+
+
+@receiver([post_save, post_delete], sender=Quiz)
+def quiz_changed(sender, instance, **kwargs):
+    if kwargs['signal'] is post_delete:
+        invalidate_tags(quiz_tag(instance.pk), responses_tag(instance.pk))
+        return
+    invalidate_tags(quiz_tag(instance.pk))
+    if not kwargs['created'] and not kwargs['raw']:
+        # The ETag of a quiz is its content version
+        Quiz.objects.filter(pk=instance.pk).bump_content_version()
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    if not _deleted_with_quiz(kwargs):
+        content_changed(instance.quiz_id, deleted=kwargs['signal'] is post_delete)
+
+
+@receiver([post_save, post_delete], sender=MCQOption)
+@receiver([post_save, post_delete], sender=AcceptedAnswer)
+def option_changed(sender, instance, **kwargs):
+    # Options and accepted answers are part of the answer key of the quiz
+    if _deleted_with_quiz(kwargs):
+        return
+    if sender.question.is_cached(instance):
+        quiz_id = instance.question.quiz_id
+    else:
+        quiz_id = Question.objects.filter(pk=instance.question_id).values_list('quiz_id', flat=True).first()
+    # Options deleted together with their question may find it gone already
+    if quiz_id is not None:
+        content_changed(quiz_id, deleted=sender is MCQOption and kwargs['signal'] is post_delete)
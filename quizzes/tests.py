@@ -1,3 +1,349 @@
-from django.test import TestCase
+import re
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .grading import MAX_EXPONENT, TextGrader, build_rule, normalize, parse_number
+from .models import Quiz, Question, MCQOption
+from .sampling import _allocate, sample_questions
+
+User = get_user_model()
+
+
+def create_quiz(user, questions=2, **kwargs):
+    """A quiz with ``questions`` MCQ questions whose first option is correct."""
+    quiz = Quiz.objects.create(title=kwargs.pop('title', 'Quiz'), created_by=user, **kwargs)
+    for order in range(1, questions + 1):
+        question = Question.objects.create(
+            quiz=quiz, question_text=f'Question {order}', question_type='MCQ', order=order
+        )
+        MCQOption.objects.create(question=question, option_text='Right', is_correct=True, order=1)
+        MCQOption.objects.create(question=question, option_text='Wrong', order=2)
+    return quiz
+
+
+class QuizzesTestCase(TestCase):
+    def setUp(self):
+        # Primary keys are reused after each test's rollback
+        cache.clear()
+        caches['local'].clear()
+        self.user = User.objects.create_user(
+            'admin', 'admin@example.com', 'pass12345!', first_name='Ada', last_name='Admin'
+        )
+        self.quiz = create_quiz(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class DynamicFieldsTestCase(QuizzesTestCase):
+    def test_fields(self):
+        response = self.client.get(f'/api/v1/admin/quizzes/{self.quiz.id}/?fields=id,title,unknown')
+        self.assertEqual(response.json(), {'id': self.quiz.id, 'title': 'Quiz'})
+
+    def test_default_and_empty_expansion(self):
+        response = self.client.get(f'/api/v1/admin/quizzes/{self.quiz.id}/')
+        self.assertEqual(len(response.json()['questions']), 2)
+        self.assertEqual(response.json()['total_responses'], 0)
+        response = self.client.get(f'/api/v1/admin/quizzes/{self.quiz.id}/?expand=')
+        self.assertNotIn('questions', response.json())
+        self.assertEqual(response.json()['total_questions'], 2)
+
+    def test_list_expansion(self):
+        response = self.client.get('/api/v1/admin/quizzes/')
+        self.assertNotIn('questions', response.json()['results'][0])
+        response = self.client.get('/api/v1/admin/quizzes/?expand=questions&fields=id')
+        result = response.json()['results'][0]
+        self.assertEqual(set(result), {'id', 'questions'})
+        self.assertEqual([len(question['options']) for question in result['questions']], [2, 2])
+
+    def test_question_expansion(self):
+        question = self.quiz.questions.first()
+        response = self.client.get(f'/api/v1/admin/questions/{question.id}/?expand=options')
+        self.assertEqual(len(response.json()['options']), 2)
+        self.assertNotIn('accepted_answers', response.json())
+
+    def test_only_rendered_relations_are_queried(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/admin/quizzes/?fields=id,title')
+        self.assertEqual(response.status_code, 200)
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('quizzes_question', sql)
+        self.assertNotIn('responses_quizresponse', sql)
+
+    def test_counts_without_query_per_quiz(self):
+        for index in range(3):
+            create_quiz(self.user, title=f'Quiz {index}')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/v1/admin/quizzes/')
+        create_quiz(self.user, title='Another')
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get('/api/v1/admin/quizzes/')
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_updates_ignore_fields(self):
+        response = self.client.patch(
+            f'/api/v1/admin/quizzes/{self.quiz.id}/?fields=id', {'title': 'Renamed'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['title'], 'Renamed')
+
+
+class ConditionalRequestsTestCase(QuizzesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/v1/admin/quizzes/{self.quiz.id}/'
+
+    def etag(self, url=None):
+        return self.client.get(url or self.url)['ETag']
+
+    def patch(self, url=None, data=None, **headers):
+        return self.client.patch(url or self.url, data or {'title': 'Renamed'}, format='json', headers=headers)
+
+    def test_not_modified(self):
+        etag = self.etag()
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 304)
+        # If-None-Match compares weakly
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': f'W/{etag}'}).status_code, 304)
+        self.patch(**{'If-Match': etag})
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_etag_follows_content_version(self):
+        etag = self.etag()
+        self.quiz.refresh_from_db()
+        self.assertEqual(etag, f'"{self.quiz.id}-{self.quiz.content_version}"')
+        # Edits within the same second still change the ETag
+        self.quiz.title = 'Renamed'
+        self.quiz.save()
+        second_etag = self.etag()
+        self.assertNotEqual(second_etag, etag)
+        option = MCQOption.objects.filter(question__quiz=self.quiz).first()
+        option.option_text = 'Changed'
+        option.save()
+        self.assertNotEqual(self.etag(), second_etag)
+
+    def test_if_match(self):
+        etag = self.etag()
+        response = self.patch(**{'If-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response['ETag'], self.etag())
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.patch(data={'title': 'Again'}, **{'If-Match': etag})
+        self.assertEqual(response.status_code, 412)
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.title, 'Renamed')
+        self.assertEqual(self.patch(data={'title': 'Any'}, **{'If-Match': '*'}).status_code, 200)
+
+    def test_if_match_compares_strongly(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.patch(**{'If-Match': f'W/{self.etag()}'})
+        self.assertEqual(response.status_code, 412)
+
+    @override_settings(COMPRESSION_MIN_SIZE=0)
+    def test_compressed_responses_keep_strong_etag(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertEqual(self.patch(**{'If-Match': etag}).status_code, 200)
+
+    @override_settings(REQUIRE_IF_MATCH=True)
+    def test_if_match_required(self):
+        # Dates cannot tell apart edits within the same second
+        last_modified = self.client.get(self.url)['Last-Modified']
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.patch(**{'If-Unmodified-Since': last_modified})
+        self.assertEqual(response.status_code, 428)
+        self.assertEqual(self.patch(**{'If-Match': self.etag()}).status_code, 200)
+
+    def test_question_uses_quiz_validators(self):
+        question = self.quiz.questions.first()
+        url = f'/api/v1/admin/questions/{question.id}/'
+        etag = self.etag(url)
+        self.assertEqual(etag, self.etag())
+        self.assertEqual(self.patch(url, {'question_text': 'Changed'}, **{'If-Match': etag}).status_code, 200)
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.patch(url, {'question_text': 'Lost'}, **{'If-Match': etag})
+        self.assertEqual(response.status_code, 412)
+
+    def test_question_edit_moves_content_version_once(self):
+        question = self.quiz.questions.first()
+        self.quiz.refresh_from_db()
+        version = self.quiz.content_version
+        options = [{'option_text': f'Option {order}', 'is_correct': order == 1, 'order': order} for order in range(1, 5)]
+        response = self.client.put(f'/api/v1/admin/questions/{question.id}/', {
+            'question_text': 'Changed', 'question_type': 'MCQ', 'order': question.order, 'options': options,
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(question.options.count(), 4)
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.content_version, version + 1)
+
+
+class QuizAdminTestCase(QuizzesTestCase):
+    url = '/admin/quizzes/quiz/'
+
+    def setUp(self):
+        super().setUp()
+        User.objects.filter(pk=self.user.pk).update(is_staff=True, is_superuser=True)
+        self.admin = Client()
+        self.admin.force_login(self.user)
+
+    def test_totals_are_annotated(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.admin.get(self.url).status_code, 200)
+        for index in range(4):
+            create_quiz(self.user, questions=3, title=f'Quiz {index}')
+        with self.assertNumQueries(len(queries)):
+            response = self.admin.get(self.url)
+        totals = {(quiz.title, quiz.total_questions, quiz.total_points) for quiz in response.context['cl'].result_list}
+        self.assertIn(('Quiz', 2, 2), totals)
+        self.assertIn(('Quiz 0', 3, 3), totals)
+
+    def test_filters_do_not_list_users(self):
+        other = User.objects.create_user('someone-else', 'else@example.com', 'pass12345!')
+        create_quiz(other, title='Other quiz')
+        response = self.admin.get(self.url)
+        self.assertNotContains(response, '?created_by__id__exact=')
+        self.assertContains(response, 'autocomplete-filter-created_by')
+        response = self.admin.get(f'{self.url}?created_by__id__exact={other.pk}')
+        self.assertEqual([quiz.title for quiz in response.context['cl'].result_list], ['Other quiz'])
+
+    def test_estimated_count(self):
+        with mock.patch('quiz_management.pagination.estimate_count', return_value=5000000):
+            response = self.admin.get(self.url)
+        paginator = response.context['cl'].paginator
+        self.assertEqual((paginator.count, paginator.estimated), (5000000, True))
+        self.assertEqual(len(response.context['cl'].result_list), 1)
+
+
+class SamplingTestCase(SimpleTestCase):
+    pool = [(index, 'MCQ' if index < 8 else 'TEXT', 1 if index % 2 else 2) for index in range(12)]
+
+    def test_draw_is_reproducible_and_ordered(self):
+        drawn = sample_questions(self.pool, 5, seed='session')
+        self.assertEqual(len(drawn), 5)
+        self.assertEqual(drawn, sorted(drawn))
+        self.assertEqual(sample_questions(self.pool, 5, seed='session'), drawn)
+        draws = {tuple(sample_questions(self.pool, 5, seed=f'session-{index}')) for index in range(20)}
+        self.assertGreater(len(draws), 1)
+
+    def test_whole_pool_when_not_larger(self):
+        ids = [entry[0] for entry in self.pool]
+        self.assertEqual(sample_questions(self.pool, 12, seed=1), ids)
+        self.assertEqual(sample_questions(self.pool, 0, seed=1), ids)
+
+    def test_strata_get_proportional_shares(self):
+        for seed in range(10):
+            drawn = set(sample_questions(self.pool, 6, 'question_type', seed=seed))
+            self.assertEqual(len(drawn & set(range(8))), 4)
+            self.assertEqual(len(drawn - set(range(8))), 2)
+            drawn = sample_questions(self.pool, 5, 'points', seed=seed)
+            self.assertEqual(len(drawn), 5)
+
+    def test_allocation(self):
+        self.assertEqual(_allocate({'a': 8, 'b': 4}, 6), {'a': 4, 'b': 2})
+        self.assertEqual(_allocate({'a': 1, 'b': 1, 'c': 1}, 2), {'a': 1, 'b': 1, 'c': 0})
+        self.assertEqual(sum(_allocate({'a': 5, 'b': 3, 'c': 2}, 7).values()), 7)
+
+
+class GradingTestCase(SimpleTestCase):
+    def grade(self, match_type, answer_text, text, **kwargs):
+        return TextGrader([build_rule(match_type, answer_text, **kwargs)]).grade(text)
+
+    def test_normalize(self):
+        self.assertEqual(normalize('  Paris, France!  '), 'Paris, France')
+        self.assertEqual(normalize('１２'), '12')
+        self.assertEqual(normalize(' -.5 '), '-.5')
+        self.assertEqual(normalize('C++?'), 'C++')
+
+    def test_exact(self):
+        self.assertTrue(self.grade('EXACT', 'Paris', ' paris. '))
+        self.assertFalse(self.grade('EXACT', 'Paris', 'paris', case_sensitive=True))
+        # Symbols are part of the answer
+        self.assertTrue(self.grade('EXACT', 'C++', 'c++.'))
+        self.assertFalse(self.grade('EXACT', 'C++', 'C'))
+        self.assertFalse(self.grade('EXACT', 'C#', 'C'))
+        self.assertFalse(self.grade('EXACT', '$5', '5'))
+
+    def test_numeric(self):
+        self.assertTrue(self.grade('NUMERIC', '0.75', '3/4'))
+        self.assertTrue(self.grade('NUMERIC', '-1500', '-1.5e3'))
+        self.assertTrue(self.grade('NUMERIC', '3.14', '3.1', tolerance=0.05))
+        self.assertFalse(self.grade('NUMERIC', '3.14', '3', tolerance=0.05))
+        self.assertFalse(self.grade('NUMERIC', '1', 'one'))
+        self.assertFalse(self.grade('NUMERIC', '1', '1/0'))
+        self.assertFalse(self.grade('NUMERIC', '3', '-3'))
+        self.assertFalse(self.grade('NUMERIC', '-3', '3'))
+        self.assertTrue(self.grade('NUMERIC', '-3', ' -3 '))
+        self.assertTrue(self.grade('NUMERIC', '0.5', '.5'))
+        self.assertFalse(self.grade('NUMERIC', '5', '.5'))
+        self.assertTrue(self.grade('NUMERIC', '.5', '０.５'))
+        with self.assertRaises(ValueError):
+            build_rule('NUMERIC', 'one')
+
+    def test_huge_numbers_are_rejected_quickly(self):
+        started = time.perf_counter()
+        for text in ['1e999999999', '9e-999999999', '1' * 5000, '1e' + '9' * 90]:
+            self.assertIsNone(parse_number(text))
+            self.assertFalse(self.grade('NUMERIC', '1', text))
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual(parse_number(f'1e{MAX_EXPONENT}'), 10 ** MAX_EXPONENT)
+        with self.assertRaises(ValueError):
+            build_rule('NUMERIC', '1e999999999')
+
+    def test_regex(self):
+        self.assertTrue(self.grade('REGEX', r'colou?r', 'Color'))
+        self.assertFalse(self.grade('REGEX', r'colou?r', 'colors'))
+        with self.assertRaises(re.error):
+            build_rule('REGEX', '(')
+
+    def test_keywords(self):
+        self.assertTrue(self.grade('KEYWORDS', 'water, carbon dioxide', 'Carbon dioxide and water'))
+        self.assertFalse(self.grade('KEYWORDS', 'water, carbon dioxide', 'waters and carbon'))
+        with self.assertRaises(ValueError):
+            build_rule('KEYWORDS', ', ,')
+
+    def test_fuzzy(self):
+        self.assertTrue(self.grade('FUZZY', 'photosynthesis', 'photosynthesys'))
+        self.assertFalse(self.grade('FUZZY', 'photosynthesis', 'respiration'))
+        self.assertFalse(self.grade('FUZZY', 'photosynthesis', 'photo'))
+
+    def test_grader(self):
+        grader = TextGrader([build_rule('EXACT', 'a'), build_rule('NUMERIC', '2')])
+        self.assertTrue(grader)
+        self.assertFalse(TextGrader())
+        self.assertEqual(grader.grade_many(['A', '2.0', 'b', 'A']), [True, True, False, True])
+        self.assertFalse(grader.grade(None))
+        with self.assertRaises(ValueError):
+            build_rule('OTHER', 'a')
+
+
+class AcceptedAnswersTestCase(QuizzesTestCase):
+    def create_question(self, accepted_answers):
+        return self.client.post(f'/api/v1/admin/quizzes/{self.quiz.id}/questions/', {
+            'question_text': 'How much?', 'question_type': 'TEXT', 'order': 3,
+            'accepted_answers': accepted_answers,
+        }, format='json')
+
+    def test_accepted_answers(self):
+        response = self.create_question([{'match_type': 'NUMERIC', 'answer_text': '42', 'tolerance': 0.5}])
+        self.assertEqual(response.status_code, 201)
+        question = self.quiz.questions.get(order=3)
+        self.assertTrue(question.text_grader().grade('42.4'))
+
+    def test_invalid_accepted_answers(self):
+        for accepted in [
+            {'match_type': 'NUMERIC', 'answer_text': '1e999999999'},
+            {'match_type': 'REGEX', 'answer_text': '('},
+        ]:
+            with self.assertLogs('django.request', 'WARNING'):
+                response = self.create_question([accepted])
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.quiz.questions.filter(order=3).exists())
@@ -11,6 +11,11 @@ from .serializers import (
     QuestionSerializer, QuestionCreateUpdateSerializer,
     MCQOptionSerializer
 )
+from authentication.authentication import StatelessJWTAuthentication
+from quiz_management.conditional import (
+    IF_MATCH_PARAMETER, IF_NONE_MATCH_PARAMETER, ConditionalRequestMixin, make_etag
+)
+from quiz_management.serializers import FIELDS_PARAMETERS, eager_queryset
 from quiz_management.utils import success_response, error_response
 
 
@@ -30,11 +35,15 @@ class QuizListCreateView(generics.ListCreateAPIView):
             return QuizCreateUpdateSerializer
         return QuizListSerializer
 
+    def get_queryset(self):
+        return eager_queryset(self, super().get_queryset())
+
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
     @swagger_auto_schema(
         operation_description="List all quizzes with pagination and filtering",
+        manual_parameters=FIELDS_PARAMETERS,
         responses={200: QuizListSerializer(many=True)}
     )
     def get(self, request, *args, **kwargs):
@@ -52,11 +61,29 @@ class QuizListCreateView(generics.ListCreateAPIView):
         return super().post(request, *args, **kwargs)
 
 
-class QuizDetailView(generics.RetrieveUpdateDestroyAPIView):
+def quiz_validators(queryset, for_update=False):
+    """
+    ``(etag, last_modified)`` of the single quiz in ``queryset``, read
+    without loading its questions.
+    """
+    if for_update:
+        queryset = queryset.select_for_update(of=('self',))
+    row = queryset.values('pk', 'content_version', 'updated_at').first()
+    if row is None:
+        return None
+    return make_etag(row['pk'], row['content_version']), row['updated_at']
+
+
+class QuizDetailView(ConditionalRequestMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update or delete a quiz.
+
+    Responses carry an ETag and Last-Modified that change with the quiz and
+    its questions and options.
     """
     queryset = Quiz.objects.all()
+    # Only filters by the user id, so the user is never loaded
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_serializer_class(self):
@@ -65,10 +92,16 @@ class QuizDetailView(generics.RetrieveUpdateDestroyAPIView):
         return QuizSerializer
 
     def get_queryset(self):
-        return Quiz.objects.filter(created_by=self.request.user)
+        return eager_queryset(self, Quiz.objects.filter(created_by=self.request.user))
+
+    def get_validators(self, for_update=False):
+        return quiz_validators(
+            Quiz.objects.filter(pk=self.kwargs['pk'], created_by=self.request.user), for_update
+        )
 
     @swagger_auto_schema(
         operation_description="Get quiz details with all questions",
+        manual_parameters=FIELDS_PARAMETERS + [IF_NONE_MATCH_PARAMETER],
         responses={200: QuizSerializer}
     )
     def get(self, request, *args, **kwargs):
@@ -76,6 +109,7 @@ class QuizDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     @swagger_auto_schema(
         operation_description="Update quiz details",
+        manual_parameters=[IF_MATCH_PARAMETER],
         request_body=QuizCreateUpdateSerializer,
         responses={200: QuizSerializer}
     )
@@ -84,6 +118,7 @@ class QuizDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     @swagger_auto_schema(
         operation_description="Partially update quiz details",
+        manual_parameters=[IF_MATCH_PARAMETER],
         request_body=QuizCreateUpdateSerializer,
         responses={200: QuizSerializer}
     )
@@ -103,11 +138,12 @@ class QuestionListCreateView(generics.ListCreateAPIView):
     List all questions for a quiz or create a new question.
     """
     serializer_class = QuestionCreateUpdateSerializer
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         quiz_id = self.kwargs['quiz_id']
-        return Question.objects.filter(quiz_id=quiz_id, quiz__created_by=self.request.user)
+        return eager_queryset(self, Question.objects.filter(quiz_id=quiz_id, quiz__created_by=self.request.user))
 
     def perform_create(self, serializer):
         quiz_id = self.kwargs['quiz_id']
@@ -122,6 +158,7 @@ class QuestionListCreateView(generics.ListCreateAPIView):
 
     @swagger_auto_schema(
         operation_description="List all questions for a quiz",
+        manual_parameters=FIELDS_PARAMETERS,
         responses={200: QuestionSerializer(many=True)}
     )
     def get(self, request, *args, **kwargs):
@@ -136,15 +173,24 @@ class QuestionListCreateView(generics.ListCreateAPIView):
         return super().post(request, *args, **kwargs)
 
 
-class QuestionDetailView(generics.RetrieveUpdateDestroyAPIView):
+class QuestionDetailView(ConditionalRequestMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Retrieve, update or delete a question.
+
+    Uses the validators of the question's quiz, so any edit of the quiz
+    changes the ETag.
     """
     serializer_class = QuestionCreateUpdateSerializer
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Question.objects.filter(quiz__created_by=self.request.user)
+        return eager_queryset(self, Question.objects.filter(quiz__created_by=self.request.user))
+
+    def get_validators(self, for_update=False):
+        return quiz_validators(
+            Quiz.objects.filter(questions=self.kwargs['pk'], created_by=self.request.user), for_update
+        )
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -153,6 +199,7 @@ class QuestionDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     @swagger_auto_schema(
         operation_description="Get question details",
+        manual_parameters=FIELDS_PARAMETERS + [IF_NONE_MATCH_PARAMETER],
         responses={200: QuestionSerializer}
     )
     def get(self, request, *args, **kwargs):
@@ -160,6 +207,7 @@ class QuestionDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     @swagger_auto_schema(
         operation_description="Update question details",
+        manual_parameters=[IF_MATCH_PARAMETER],
         request_body=QuestionCreateUpdateSerializer,
         responses={200: QuestionSerializer}
     )
@@ -168,6 +216,7 @@ class QuestionDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     @swagger_auto_schema(
         operation_description="Partially update question",
+        manual_parameters=[IF_MATCH_PARAMETER],
         request_body=QuestionCreateUpdateSerializer,
         responses={200: QuestionSerializer}
     )
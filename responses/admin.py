@@ -1,17 +1,26 @@
 from django.contrib import admin
-from .models import QuizResponse, Answer
+from quiz_management.admin import AutocompleteFilter, LargeTableAdmin
+from .grading_queue import apply_grades
+from .models import QuizResponse, Answer, ArchivedResponse
 
 
 class AnswerInline(admin.TabularInline):
     model = Answer
     extra = 0
     readonly_fields = ('is_correct', 'points_earned', 'answered_at')
+    raw_id_fields = ('question', 'selected_option', 'graded_by')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('response__quiz', 'question__quiz')
 
 
 @admin.register(QuizResponse)
-class QuizResponseAdmin(admin.ModelAdmin):
+class QuizResponseAdmin(LargeTableAdmin):
     list_display = ('participant_name', 'quiz', 'score', 'percentage', 'is_passed', 'submitted_at', 'attempt_number')
-    list_filter = ('is_passed', 'quiz', 'submitted_at', 'attempt_number')
+    # Attempt numbers are not a filter: listing them scans the table
+    list_filter = ('is_passed', ('quiz', AutocompleteFilter), 'submitted_at')
+    list_select_related = ('quiz',)
+    autocomplete_fields = ('quiz',)
     search_fields = ('participant_name', 'participant_email', 'quiz__title')
     readonly_fields = ('session_id', 'score', 'percentage', 'is_passed', 'started_at', 'submitted_at')
     ordering = ('-submitted_at',)
@@ -19,8 +28,34 @@ class QuizResponseAdmin(admin.ModelAdmin):
 
 
 @admin.register(Answer)
-class AnswerAdmin(admin.ModelAdmin):
-    list_display = ('response', 'question', 'is_correct', 'points_earned', 'answered_at')
-    list_filter = ('is_correct', 'question__question_type', 'answered_at')
+class AnswerAdmin(LargeTableAdmin):
+    list_display = ('response', 'question', 'is_correct', 'points_earned', 'needs_grading', 'answered_at')
+    list_select_related = ('response__quiz', 'question__quiz')
+    raw_id_fields = ('response', 'question', 'selected_option')
+    list_filter = ('needs_grading', 'is_correct', 'question__question_type', 'answered_at')
     search_fields = ('response__participant_name', 'question__question_text')
-    readonly_fields = ('is_correct', 'points_earned', 'answered_at')
+    readonly_fields = ('is_correct', 'points_earned', 'needs_grading', 'graded_by', 'graded_at', 'answered_at')
+    actions = ['mark_correct', 'mark_incorrect']
+
+    def _grade(self, request, queryset, is_correct):
+        # Goes through the grading queue so the response scores follow
+        graded, _ = apply_grades(queryset, dict.fromkeys(queryset.values_list('pk', flat=True), is_correct), request.user)
+        self.message_user(request, f"{len(graded)} text answers graded.")
+
+    @admin.action(description='Mark selected text answers correct')
+    def mark_correct(self, request, queryset):
+        self._grade(request, queryset, True)
+
+    @admin.action(description='Mark selected text answers incorrect')
+    def mark_incorrect(self, request, queryset):
+        self._grade(request, queryset, False)
+
+
+@admin.register(ArchivedResponse)
+class ArchivedResponseAdmin(LargeTableAdmin):
+    list_display = ('participant_email', 'quiz', 'attempt_number', 'submitted_at', 'archived_at')
+    list_filter = (('quiz', AutocompleteFilter), 'submitted_at')
+    list_select_related = ('quiz',)
+    search_fields = ('session_id', 'participant_email')
+    exclude = ('payload',)
+    readonly_fields = ('session_id', 'quiz', 'participant_email', 'attempt_number', 'submitted_at', 'archived_at')
@@ -0,0 +1,100 @@
+"""
+Archiving old responses.
+
+Completed responses submitted before a cutoff are moved out of the response
+and answer tables, which every admin query, count and constraint check
+reads, into ``ArchivedResponse``: one row per response holding the
+response and its answers as compressed JSON. Results of archived responses
+are still served by session id (see ``get_archived_result``), from one
+primary key lookup and a decompression instead of the joins of a live
+result.
+
+Responses are only archived together with all other attempts of the same
+participant on the quiz. Attempt limits and the numbers of later attempts
+count archived attempts too (see ``previous_attempts``). Responses with
+answers waiting in the grading queue stay until they are graded.
+"""
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from quiz_management import metrics
+from quiz_management.cache import invalidate_tags, responses_tag
+from .models import QuizResponse, Answer, ArchivedResponse, raw_delete
+from .serializers import QuizResponseSerializer, QuizResultSerializer, setup_response_eager_loading
+
+ARCHIVED_RESPONSES = metrics.Counter(
+    'archived_responses_total', 'Responses moved to the archive.'
+)
+
+
+def archivable_responses(cutoff):
+    """Completed responses that can be archived at ``cutoff``."""
+    recent = QuizResponse.objects.filter(
+        quiz=OuterRef('quiz'), participant_email=OuterRef('participant_email')
+    ).filter(Q(is_completed=False) | Q(submitted_at__gte=cutoff))
+    ungraded = Answer.objects.filter(response=OuterRef('pk'), needs_grading=True)
+    return QuizResponse.objects.filter(
+        is_completed=True, submitted_at__lt=cutoff
+    ).exclude(Exists(recent)).exclude(Exists(ungraded))
+
+
+def archive_responses(cutoff, batch_size=500, progress=None):
+    """
+    Move the archivable responses submitted before ``cutoff`` to the
+    archive, ``batch_size`` per transaction. ``progress`` is called with the
+    running total after each batch. Returns the number of responses archived.
+    """
+    fields = QuizResponseSerializer.Meta.fields
+    archived = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            # Rows being graded or regraded right now are left for the next run
+            batch = list(setup_response_eager_loading(
+                archivable_responses(cutoff).filter(pk__gt=last_pk).order_by('pk')
+                .select_for_update(skip_locked=True, of=('self',)),
+                fields,
+            )[:batch_size])
+            if not batch:
+                return archived
+            last_pk = batch[-1].pk
+            ArchivedResponse.objects.bulk_create([
+                ArchivedResponse(
+                    session_id=response.session_id,
+                    quiz_id=response.quiz_id,
+                    participant_email=response.participant_email,
+                    attempt_number=response.attempt_number,
+                    submitted_at=response.submitted_at,
+                    payload=ArchivedResponse.compress(QuizResponseSerializer(response).data),
+                )
+                for response in batch
+            ])
+            response_ids = [response.pk for response in batch]
+            raw_delete(Answer.objects.filter(response_id__in=response_ids))
+            raw_delete(QuizResponse.objects.filter(pk__in=response_ids))
+            invalidate_tags(*{responses_tag(response.quiz_id) for response in batch})
+        ARCHIVED_RESPONSES.inc(len(batch))
+        archived += len(batch)
+        if progress is not None:
+            progress(archived)
+
+
+def _result(archived):
+    data = archived.data
+    result = {field: data[field] for field in QuizResultSerializer.Meta.fields if field in data}
+    # Follows the current setting of the quiz, like live results
+    if not archived.quiz.show_results_immediately:
+        result['answers'] = []
+    return result
+
+
+def get_archived_result(session_id):
+    """The result of an archived response as a participant sees it, or ``None``."""
+    archived = ArchivedResponse.objects.select_related('quiz').filter(session_id=session_id).first()
+    return None if archived is None else _result(archived)
+
+
+async def aget_archived_result(session_id):
+    """Async variant of ``get_archived_result``."""
+    archived = await ArchivedResponse.objects.select_related('quiz').filter(session_id=session_id).afirst()
+    return None if archived is None else _result(archived)
@@ -0,0 +1,226 @@
+"""
+Async-native versions of the public quiz endpoints.
+
+Under ASGI these run on the event loop using Django's async ORM and async
+cache calls instead of hopping through a thread per request. Responses have
+exactly the same shape as their DRF counterparts in ``responses.views``.
+They are routed in place of the sync views when ``ASYNC_PUBLIC_VIEWS`` is on.
+"""
+import json
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import Throttled, ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from quizzes.cache import aget_public_quiz
+from quizzes.models import Quiz
+from quiz_management.pagination import count_rows
+from quiz_management.utils import json_response, json_success_response, json_error_response
+from .cache import aget_result
+from .serializers import QuizSubmissionSerializer, QuizResultSerializer
+from .throttles import SUBMISSION_THROTTLES
+from .views import PublicQuizListView
+
+
+def not_found_response(detail='Not found.'):
+    """Same body as DRF's NotFound passed through the custom exception handler."""
+    return json_error_response(
+        message='Not Found',
+        details={'detail': detail},
+        status_code=status.HTTP_404_NOT_FOUND
+    )
+
+
+class AsyncAPIView(View):
+    """
+    Base class for async JSON views. Like DRF's ``APIView`` these views are
+    exempt from CSRF checks because they do not use session authentication.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+
+class AsyncPublicQuizListView(AsyncAPIView):
+    """
+    Public endpoint to list all active quizzes.
+    """
+    page_query_param = 'page'
+
+    async def get(self, request):
+        drf_request = Request(request)
+        queryset = Quiz.objects.filter(is_active=True)
+        # Reuse the sync view's search and ordering configuration; the filter
+        # backends only build the query and never touch the database.
+        sync_view = PublicQuizListView()
+        sync_view.request = drf_request
+        for backend in sync_view.filter_backends:
+            queryset = backend().filter_queryset(drf_request, queryset, sync_view)
+
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        count, estimated = await sync_to_async(count_rows)(queryset)
+        num_pages = max(1, math.ceil(count / page_size))
+        page_number = request.GET.get(self.page_query_param, 1)
+        if page_number == 'last':
+            page_number = num_pages
+        try:
+            page_number = int(page_number)
+        except (TypeError, ValueError):
+            return not_found_response('Invalid page.')
+        # An estimate can be too low, so pages past it may still have rows
+        if page_number < 1 or (page_number > num_pages and not estimated):
+            return not_found_response('Invalid page.')
+
+        offset = (page_number - 1) * page_size
+        # One row past the page tells whether there is a next one
+        rows = queryset.annotate(question_count=Count('questions')).values(
+            'id', 'title', 'description', 'time_limit', 'question_count'
+        )[offset:offset + page_size + (1 if estimated else 0)]
+        results = [
+            {
+                'id': row['id'],
+                'title': row['title'],
+                'description': row['description'],
+                'time_limit': row['time_limit'],
+                'total_questions': row['question_count'],
+            }
+            async for row in rows
+        ]
+        has_next = len(results) > page_size if estimated else page_number < num_pages
+        del results[page_size:]
+
+        url = request.build_absolute_uri()
+        next_link = None
+        if has_next:
+            next_link = replace_query_param(url, self.page_query_param, page_number + 1)
+        previous_link = None
+        if page_number > 1:
+            previous_link = (
+                remove_query_param(url, self.page_query_param) if page_number == 2
+                else replace_query_param(url, self.page_query_param, page_number - 1)
+            )
+
+        return json_response({
+            'count': count,
+            'count_is_estimated': estimated,
+            'next': next_link,
+            'previous': previous_link,
+            'results': results,
+        })
+
+
+class AsyncPublicQuizDetailView(AsyncAPIView):
+    """
+    Public endpoint to get quiz details for taking the quiz.
+    """
+
+    async def get(self, request, pk):
+        try:
+            payload = await aget_public_quiz(pk)
+        except Quiz.DoesNotExist:
+            return not_found_response()
+        return json_response(payload)
+
+
+class AsyncQuizResultView(AsyncAPIView):
+    """
+    Public endpoint to view quiz results.
+    """
+
+    async def get(self, request, session_id):
+        result = await aget_result(session_id)
+        if result is None:
+            return not_found_response()
+        return json_response(result)
+
+
+class AsyncQuizSubmissionView(AsyncAPIView):
+    """
+    Public endpoint to submit quiz responses.
+    """
+
+    throttle_classes = SUBMISSION_THROTTLES
+
+    async def check_throttles(self, request):
+        """
+        Apply the throttles like DRF does; returns a 429 response when one of
+        them rejects the request. Call it after reading ``request.body``,
+        which the parser would otherwise consume.
+        """
+        drf_request = Request(request, parsers=[JSONParser()])
+        durations = []
+        for throttle in [throttle_class() for throttle_class in self.throttle_classes]:
+            if not await throttle.aallow_request(drf_request, self):
+                durations.append(throttle.wait())
+        if not durations:
+            return None
+        exc = Throttled(max((duration for duration in durations if duration is not None), default=None))
+        response = json_error_response(
+            message='Too Many Requests',
+            details={'detail': exc.detail},
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        if exc.wait:
+            response['Retry-After'] = '%d' % exc.wait
+        return response
+
+    async def post(self, request, quiz_id):
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError as exc:
+            return json_error_response(
+                message='Bad Request',
+                details={'detail': f'JSON parse error - {exc}'},
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Cache lookups only, before any database work
+        throttled = await self.check_throttles(request)
+        if throttled is not None:
+            return throttled
+
+        try:
+            quiz = await Quiz.objects.aget(id=quiz_id, is_active=True)
+        except Quiz.DoesNotExist:
+            return json_error_response(
+                message="Quiz not found or inactive",
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+
+        # Django transactions are sync-only, so validation and the writes
+        # run together in one worker thread.
+        return await sync_to_async(self.submit)(quiz, data)
+
+    def submit(self, quiz, data):
+        serializer = QuizSubmissionSerializer(data=data, context={'quiz': quiz})
+        if not serializer.is_valid():
+            return json_error_response(
+                message="Quiz submission failed",
+                details=serializer.errors,
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            with transaction.atomic():
+                quiz_response = serializer.save()
+        except ValidationError as exc:
+            return json_error_response(
+                message='Bad Request',
+                details=exc.detail,
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        return json_success_response(
+            data=QuizResultSerializer(quiz_response).data,
+            message="Quiz submitted successfully",
+            status_code=status.HTTP_201_CREATED
+        )
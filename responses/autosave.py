@@ -0,0 +1,299 @@
+"""
+Write coalescing for autosaved answers.
+
+Participants autosave their answers while taking a quiz, often several times
+per question. ``AutosaveBuffer`` keeps only the latest value per attempt and
+question in memory and writes everything buffered with one upsert every
+``AUTOSAVE_FLUSH_INTERVAL`` seconds, or at once when ``AUTOSAVE_MAX_BUFFER``
+answers are waiting, so the database sees at most one write per answer and
+interval instead of one per keystroke.
+
+Each server process has its own buffer. A counter in the shared cache tracks
+the processes still holding answers of an attempt, so finishing an attempt
+can wait until every process has flushed them (see ``wait_for_flush``).
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.utils import timezone
+
+from quiz_management import metrics
+from quizzes.models import Question, MCQOption
+from .models import QuizResponse, Answer
+
+logger = logging.getLogger('quiz_management')
+
+BUFFERED_ANSWERS = metrics.Gauge(
+    'autosave_buffered_answers', 'Autosaved answers waiting to be written.'
+)
+AUTOSAVED_ANSWERS = metrics.Counter(
+    'autosave_answers_total', 'Autosaved answers by outcome.', ('outcome',)
+)
+AUTOSAVE_FLUSH_DURATION = metrics.Histogram(
+    'autosave_flush_duration_seconds', 'Time spent writing a batch of autosaved answers.',
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+# Bounds how long a crashed process can make finishing wait for its answers
+PENDING_TIMEOUT = 60
+ATTEMPT_TIMEOUT = 60 * 60
+
+
+def _pending_key(session_id):
+    return f'autosave:{session_id}:pending'
+
+
+def _attempt_key(session_id):
+    return f'attempt:{session_id}:open'
+
+
+def get_open_attempt(session_id):
+    """
+    ``(response_id, quiz_id, deadline, question_ids)`` of an in-progress
+    attempt of an active quiz, or ``None``. Cached, so autosaves do not query the database.
+    """
+    attempt = cache.get(_attempt_key(session_id))
+    if attempt is None:
+        attempt = QuizResponse.objects.filter(
+            session_id=session_id, is_completed=False, quiz__is_active=True
+        ).values_list('id', 'quiz_id', 'deadline', 'question_ids').first()
+        if attempt is None:
+            return None
+        cache.set(_attempt_key(session_id), tuple(attempt), ATTEMPT_TIMEOUT)
+    return attempt
+
+
+def forget_attempt(session_id):
+    cache.delete(_attempt_key(session_id))
+
+
+def finish_attempt(response_id, session_id):
+    """
+    Write the attempt's autosaved answers, wherever they are buffered, then
+    grade and complete it. Does nothing if it is completed already.
+    """
+    autosave_buffer.flush(response_id)
+    if not wait_for_flush(session_id):
+        logger.warning("Finishing attempt %s before all autosaved answers were written", session_id)
+    with transaction.atomic():
+        quiz_response = QuizResponse.objects.select_for_update(of=('self',)).select_related('quiz').get(pk=response_id)
+        # Finishing twice at once grades only once
+        if not quiz_response.is_completed:
+            quiz_response.finish()
+    forget_attempt(session_id)
+
+
+class AutosaveBuffer:
+    """
+    Latest buffered answer per ``(response_id, question_id)``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        # response_id -> session_id of the attempts with buffered answers
+        self._sessions = {}
+        self._timer = None
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'AUTOSAVE_FLUSH_INTERVAL', 1.0)
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'AUTOSAVE_MAX_BUFFER', 5000)
+
+    def add(self, response_id, session_id, answers):
+        """
+        Buffer validated answers (dicts with ``question`` and optionally
+        ``selected_option`` and ``text_answer``) of an in-progress attempt.
+        """
+        with self._lock:
+            if response_id not in self._sessions:
+                self._sessions[response_id] = session_id
+                cache.add(_pending_key(session_id), 0, PENDING_TIMEOUT)
+                try:
+                    cache.incr(_pending_key(session_id))
+                except ValueError:
+                    # Expired in between
+                    cache.add(_pending_key(session_id), 1, PENDING_TIMEOUT)
+            for data in answers:
+                key = (response_id, data['question'].id)
+                if key in self._entries:
+                    AUTOSAVED_ANSWERS.inc(outcome='coalesced')
+                else:
+                    BUFFERED_ANSWERS.inc()
+                option = data.get('selected_option')
+                self._entries[key] = (option.id if option is not None else None, data.get('text_answer', ''))
+            full = len(self._entries) >= self.max_size
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._timed_flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def buffered(self, response_id):
+        """``{question_id: (option_id, text_answer)}`` not yet written for an attempt."""
+        with self._lock:
+            return {
+                question_id: value for (entry_response_id, question_id), value in self._entries.items()
+                if entry_response_id == response_id
+            }
+
+    def _timed_flush(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        finally:
+            connections.close_all()
+
+    def _take(self, response_id=None):
+        with self._lock:
+            if response_id is None:
+                entries, self._entries = self._entries, {}
+                sessions, self._sessions = self._sessions, {}
+            else:
+                entries = {key: value for key, value in self._entries.items() if key[0] == response_id}
+                for key in entries:
+                    del self._entries[key]
+                sessions = {}
+                if response_id in self._sessions:
+                    sessions[response_id] = self._sessions.pop(response_id)
+        BUFFERED_ANSWERS.dec(len(entries))
+        return entries, sessions
+
+    def _restore(self, entries, sessions):
+        # Newer answers buffered while the write failed take precedence
+        with self._lock:
+            for key, value in entries.items():
+                if key not in self._entries:
+                    self._entries[key] = value
+                    BUFFERED_ANSWERS.inc()
+            for response_id, session_id in sessions.items():
+                self._sessions.setdefault(response_id, session_id)
+
+    def _rows(self, entries):
+        """
+        Unsaved answers for ``entries``, leaving out those of attempts that
+        were finished and those whose question or option was deleted since
+        they were buffered.
+        """
+        open_ids = set(QuizResponse.objects.filter(
+            pk__in={key[0] for key in entries}, is_completed=False
+        ).values_list('pk', flat=True))
+        question_ids = set(Question.objects.filter(
+            pk__in={key[1] for key in entries}
+        ).values_list('pk', flat=True))
+        option_ids = {option_id for option_id, _ in entries.values() if option_id is not None}
+        if option_ids:
+            option_ids = set(MCQOption.objects.filter(pk__in=option_ids).values_list('pk', flat=True))
+        now = timezone.now()
+        return [
+            Answer(
+                response_id=entry_response_id,
+                question_id=question_id,
+                selected_option_id=option_id,
+                text_answer=text_answer,
+                answered_at=now,
+            )
+            for (entry_response_id, question_id), (option_id, text_answer) in entries.items()
+            if entry_response_id in open_ids and question_id in question_ids
+            and (option_id is None or option_id in option_ids)
+        ]
+
+    def _upsert(self, rows):
+        Answer.objects.bulk_create(
+            rows,
+            batch_size=getattr(settings, 'BATCH_SUBMISSION_INSERT_SIZE', 500),
+            update_conflicts=True,
+            unique_fields=['response', 'question'],
+            update_fields=['selected_option', 'text_answer', 'answered_at'],
+        )
+
+    def _write(self, rows):
+        """
+        Upsert ``rows`` and return the ones written. If the batch violates a
+        constraint, e.g. because a row it refers to was deleted after
+        ``_rows`` checked it, the rows are written one by one and those that
+        fail are discarded, so they cannot block the buffer.
+        """
+        try:
+            with transaction.atomic():
+                self._upsert(rows)
+            return rows
+        except IntegrityError:
+            pass
+        written = []
+        for row in rows:
+            try:
+                with transaction.atomic():
+                    self._upsert([row])
+            except IntegrityError:
+                logger.warning(
+                    "Discarding autosaved answer to question %s of response %s", row.question_id, row.response_id
+                )
+            else:
+                written.append(row)
+        return written
+
+    def flush(self, response_id=None):
+        """
+        Write the buffered answers, of all attempts or of one. Answers of
+        attempts that were finished in the meantime, and answers that can no
+        longer be written because their question or option was deleted, are
+        dropped. On other database errors the answers stay buffered for the
+        next flush.
+        """
+        entries, sessions = self._take(response_id)
+        if not entries:
+            return 0
+        started = time.perf_counter()
+        try:
+            rows = self._write(self._rows(entries))
+        except DatabaseError:
+            logger.exception("Could not write %d autosaved answers", len(entries))
+            self._restore(entries, sessions)
+            return 0
+        AUTOSAVE_FLUSH_DURATION.observe(time.perf_counter() - started)
+        AUTOSAVED_ANSWERS.inc(len(rows), outcome='written')
+        AUTOSAVED_ANSWERS.inc(len(entries) - len(rows), outcome='discarded')
+        for session_id in sessions.values():
+            try:
+                cache.decr(_pending_key(session_id))
+            except ValueError:
+                pass
+        return len(rows)
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._sessions = {}
+        self._timer = None
+
+
+def wait_for_flush(session_id, timeout=None):
+    """
+    Wait until no server process holds unwritten answers of an attempt.
+    Returns ``False`` if some were still pending after ``timeout`` seconds.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'AUTOSAVE_FINISH_WAIT', 2.0)
+    deadline = time.monotonic() + timeout
+    while cache.get(_pending_key(session_id)):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+autosave_buffer = AutosaveBuffer()
+os.register_at_fork(after_in_child=autosave_buffer.reset)
+atexit.register(autosave_buffer.flush)
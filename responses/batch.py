@@ -0,0 +1,211 @@
+"""
+Batch quiz submissions.
+
+Exam kiosks that run offline upload the submissions they collected in one
+request when they reconnect. ``submit_batch`` validates every item with the
+same rules as a single submission, but loads each quiz, its answer key, the
+participants' previous attempts and already uploaded sessions once per batch
+instead of once per item. Scores are computed in memory, and the responses
+and answers of all valid items are written with two bulk inserts in one
+transaction.
+
+Items may carry the ``session_id`` the kiosk generated offline. Uploading an
+item again (e.g. after a dropped connection) then reports the existing
+response instead of recording a second attempt.
+"""
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from quiz_management.cache import invalidate_tags, response_tag
+from quizzes.cache import get_answer_key
+from quizzes.models import Quiz
+from .models import QuizResponse, Answer, previous_attempts
+from .serializers import QuizSubmissionSerializer
+
+
+class BatchSubmissionItemSerializer(QuizSubmissionSerializer):
+    """
+    One submission of a batch. ``quiz_id`` is resolved by ``submit_batch``
+    before validation, so the answers are checked against that quiz.
+    """
+    quiz_id = serializers.IntegerField()
+    session_id = serializers.UUIDField(required=False)
+    submitted_at = serializers.DateTimeField(required=False)
+
+    def validate_submitted_at(self, value):
+        if value > timezone.now():
+            raise serializers.ValidationError("Submission time cannot be in the future.")
+        return value
+
+
+class BatchSubmissionSerializer(serializers.Serializer):
+    """
+    Envelope of a batch upload; the items are validated one by one.
+    """
+    submissions = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=getattr(settings, 'BATCH_SUBMISSION_MAX_ITEMS', 500)
+    )
+
+
+class BatchResultSerializer(serializers.ModelSerializer):
+    """
+    Outcome of a created submission, formatted like the single submission
+    result.
+    """
+
+    class Meta:
+        model = QuizResponse
+        fields = ['session_id', 'attempt_number', 'score', 'total_points', 'percentage', 'is_passed']
+
+
+class BatchConflict(Exception):
+    """Raised when concurrent submissions kept taking the allocated attempts."""
+
+
+def _quiz_id(item):
+    try:
+        return int(item.get('quiz_id'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _error(index, errors):
+    return {'index': index, 'status': 'error', 'errors': errors}
+
+
+def _grade(answers):
+    """Build unsaved graded answers; returns ``(answers, score)``."""
+    graded, score = [], 0
+    for data in answers:
+        answer = Answer(
+            question=data['question'],
+            selected_option=data.get('selected_option'),
+            text_answer=data.get('text_answer', ''),
+        )
+        answer.grade()
+        if answer.is_correct:
+            score += answer.question.points
+        graded.append(answer)
+    return graded, score
+
+
+def _validate(items, user):
+    """
+    Validate every item against its quiz. Returns the per-item results for
+    invalid items, ``(index, quiz, validated_data)`` for valid ones and the
+    answer keys of the quizzes.
+    """
+    quiz_ids = {quiz_id for quiz_id in map(_quiz_id, items) if quiz_id is not None}
+    quizzes = Quiz.objects.filter(id__in=quiz_ids, is_active=True, created_by=user).in_bulk()
+    answer_keys = {quiz_id: get_answer_key(quiz_id) for quiz_id in quizzes}
+
+    results, valid = {}, []
+    for index, item in enumerate(items):
+        quiz = quizzes.get(_quiz_id(item))
+        if quiz is None:
+            results[index] = _error(index, {'quiz_id': ["Quiz not found or inactive."]})
+            continue
+        # The answer key is shared by all items for the quiz
+        serializer = BatchSubmissionItemSerializer(
+            data=item, context={'quiz': quiz, 'answer_key': answer_keys[quiz.id]}
+        )
+        if serializer.is_valid():
+            valid.append((index, quiz, serializer.validated_data))
+        else:
+            results[index] = _error(index, serializer.errors)
+    return results, valid, answer_keys
+
+
+def _save(valid, answer_keys):
+    """
+    Allocate attempts and bulk insert the valid items. Returns the per-item
+    results; items rejected by the attempt limits are reported as errors.
+    """
+    session_ids = [str(data['session_id']) for _, _, data in valid if 'session_id' in data]
+    uploaded = dict(
+        QuizResponse.objects.filter(session_id__in=session_ids).values_list('session_id', 'quiz_id')
+    )
+    attempts = defaultdict(lambda: [0, 0])
+    attempts.update(previous_attempts(
+        {quiz.id for _, quiz, _ in valid}, {data['participant_email'] for _, _, data in valid}
+    ))
+
+    results, responses, answers = {}, [], []
+    now = timezone.now()
+    for index, quiz, data in valid:
+        session_id = str(data.get('session_id') or uuid.uuid4())
+        if session_id in uploaded:
+            if uploaded[session_id] == quiz.id:
+                results[index] = {'index': index, 'status': 'duplicate', 'session_id': session_id}
+            else:
+                results[index] = _error(index, {'session_id': ["Session id is already in use."]})
+            continue
+        counts = attempts[quiz.id, data['participant_email']]
+        if not quiz.allow_retakes and counts[0] > 0:
+            results[index] = _error(index, {'non_field_errors': ["Retakes are not allowed for this quiz."]})
+            continue
+        if counts[0] >= quiz.max_attempts:
+            results[index] = _error(
+                index, {'non_field_errors': [f"Maximum attempts ({quiz.max_attempts}) reached for this quiz."]}
+            )
+            continue
+        counts[0] += 1
+        counts[1] += 1
+        uploaded[session_id] = quiz.id
+
+        graded, score = _grade(data['answers'])
+        response = QuizResponse(
+            quiz=quiz,
+            participant_name=data['participant_name'],
+            participant_email=data['participant_email'],
+            session_id=session_id,
+            attempt_number=counts[1],
+            submitted_at=data.get('submitted_at', now),
+            is_completed=True,
+        )
+        response.set_score(score, sum(question.points for question, _ in answer_keys[quiz.id].values()))
+        responses.append(response)
+        answers.append(graded)
+        results[index] = {'index': index, 'status': 'created', **BatchResultSerializer(response).data}
+
+    batch_size = getattr(settings, 'BATCH_SUBMISSION_INSERT_SIZE', 500)
+    QuizResponse.objects.bulk_create(responses, batch_size=batch_size)
+    if any(response.pk is None for response in responses):
+        # Backends that cannot return the new ids
+        ids = dict(QuizResponse.objects.filter(
+            session_id__in=[response.session_id for response in responses]
+        ).values_list('session_id', 'id'))
+        for response in responses:
+            response.pk = ids[response.session_id]
+    for response, graded in zip(responses, answers):
+        for answer in graded:
+            answer.response = response
+    Answer.objects.bulk_create([answer for graded in answers for answer in graded], batch_size=batch_size)
+    invalidate_tags(*{response_tag(response.session_id) for response in responses})
+    return results
+
+
+def submit_batch(items, user, retries=1):
+    """
+    Submit ``items`` (dicts shaped like single submissions plus ``quiz_id``)
+    for quizzes owned by ``user``. Returns one result per item, in order.
+    """
+    results, valid, answer_keys = _validate(items, user)
+    for attempt in range(retries + 1):
+        try:
+            with transaction.atomic():
+                results.update(_save(valid, answer_keys))
+            break
+        except IntegrityError:
+            # A concurrent submission took an attempt number or session id
+            # between reading and inserting; allocate again
+            if attempt == retries:
+                raise BatchConflict()
+    return [results[index] for index in range(len(items))]
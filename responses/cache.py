@@ -0,0 +1,87 @@
+"""
+Cached results shown to participants by session id.
+
+Results are cached under the tags of their quiz, of its responses and of
+their own response (see ``quiz_management.cache``), so editing the quiz,
+regrading, grading answers or archiving drops them, while saving one
+response only drops its own result. The quiz of a session never changes, so the
+mapping from session to quiz is cached without tags.
+"""
+from django.core.cache import cache
+
+from quiz_management.cache import aget_or_set, get_or_set, quiz_tag, response_tag, responses_tag
+from .archive import aget_archived_result, get_archived_result
+from .models import QuizResponse, ArchivedResponse
+from .serializers import QuizResultSerializer
+
+RESULT_TIMEOUT = 60 * 15
+SESSION_QUIZ_TIMEOUT = 60 * 60 * 24
+
+
+def _session_quiz_key(session_id):
+    return f'session:{session_id}:quiz'
+
+
+def _result_queryset():
+    return QuizResultSerializer.setup_eager_loading(QuizResponse.objects.filter(is_completed=True))
+
+
+def _tags(quiz_id, session_id):
+    return [quiz_tag(quiz_id), responses_tag(quiz_id), response_tag(session_id)]
+
+
+def _session_quiz(session_id):
+    quiz_id = cache.get(_session_quiz_key(session_id))
+    if quiz_id is None:
+        quiz_id = (
+            QuizResponse.objects.filter(session_id=session_id, is_completed=True).values_list('quiz_id', flat=True).first()
+            or ArchivedResponse.objects.filter(session_id=session_id).values_list('quiz_id', flat=True).first()
+        )
+        if quiz_id is not None:
+            cache.set(_session_quiz_key(session_id), quiz_id, SESSION_QUIZ_TIMEOUT)
+    return quiz_id
+
+
+async def _asession_quiz(session_id):
+    quiz_id = await cache.aget(_session_quiz_key(session_id))
+    if quiz_id is None:
+        quiz_id = (
+            await QuizResponse.objects.filter(session_id=session_id, is_completed=True)
+            .values_list('quiz_id', flat=True).afirst()
+            or await ArchivedResponse.objects.filter(session_id=session_id).values_list('quiz_id', flat=True).afirst()
+        )
+        if quiz_id is not None:
+            await cache.aset(_session_quiz_key(session_id), quiz_id, SESSION_QUIZ_TIMEOUT)
+    return quiz_id
+
+
+def get_result(session_id):
+    """
+    The result of a completed response as a participant sees it, including
+    archived responses, or ``None``.
+    """
+    quiz_id = _session_quiz(session_id)
+    if quiz_id is None:
+        return None
+
+    def compute():
+        quiz_response = _result_queryset().filter(session_id=session_id).first()
+        if quiz_response is None:
+            return get_archived_result(session_id)
+        return QuizResultSerializer(quiz_response).data
+    return get_or_set('result', f'result:{session_id}', _tags(quiz_id, session_id), compute, RESULT_TIMEOUT)
+
+
+async def aget_result(session_id):
+    """Async variant of ``get_result``."""
+    quiz_id = await _asession_quiz(session_id)
+    if quiz_id is None:
+        return None
+
+    async def compute():
+        quiz_response = await _result_queryset().filter(session_id=session_id).afirst()
+        if quiz_response is None:
+            return await aget_archived_result(session_id)
+        # Everything the serializer reads was loaded eagerly above
+        return QuizResultSerializer(quiz_response).data
+    return await aget_or_set('result', f'result:{session_id}', _tags(quiz_id, session_id), compute, RESULT_TIMEOUT)
@@ -0,0 +1,49 @@
+"""
+Closing attempts that ran out of time.
+
+Attempts started on a timed quiz get a ``deadline``. Participants who never
+finish are auto-submitted by ``close_expired_attempts`` once the deadline and
+``ATTEMPT_GRACE_SECONDS`` have passed. It only reads the partial index on the
+deadlines of open attempts, so its cost depends on the number of expired
+attempts rather than on the size of the responses table.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from quiz_management import metrics
+from .autosave import _attempt_key, _pending_key
+from .models import QuizResponse, finish_attempts, grace_period
+
+EXPIRED_ATTEMPTS = metrics.Counter(
+    'expired_attempts_closed_total', 'Attempts auto-submitted after their deadline.'
+)
+
+
+def close_expired_attempts(batch_size=500, now=None):
+    """
+    Finish the open attempts past their deadline and grace period, oldest
+    first, ``batch_size`` per transaction. Attempts that still have
+    autosaved answers waiting in a server process are left for the next run.
+    Returns the number of attempts closed.
+    """
+    now = now or timezone.now()
+    closed = 0
+    while True:
+        with transaction.atomic():
+            # Rows locked by a participant finishing concurrently are skipped
+            batch = list(
+                QuizResponse.objects
+                .select_for_update(skip_locked=True, of=('self',))
+                .select_related('quiz')
+                .filter(is_completed=False, deadline__isnull=False, deadline__lt=now - grace_period())
+                .order_by('deadline')[:batch_size]
+            )
+            pending = cache.get_many([_pending_key(response.session_id) for response in batch])
+            ready = [response for response in batch if not pending.get(_pending_key(response.session_id))]
+            finish_attempts(ready, now)
+        cache.delete_many([_attempt_key(response.session_id) for response in ready])
+        EXPIRED_ATTEMPTS.inc(len(ready))
+        closed += len(ready)
+        if len(batch) < batch_size or not ready:
+            return closed
@@ -0,0 +1,61 @@
+"""
+Grading text answers by hand.
+
+Text answers to questions without accepted answers wait in a grading queue
+(``Answer.needs_grading``, backed by a partial index) once their attempt is
+finished. ``apply_grades`` records many grading decisions at once: the
+answers are updated with one UPDATE per outcome, and the scores of the
+affected responses are adjusted by the difference in points instead of
+being recomputed from all their answers.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from quiz_management.cache import invalidate_tags, responses_tag
+from .models import QuizResponse, Answer, refresh_percentages
+
+
+def apply_grades(answers, decisions, user):
+    """
+    Grade the text answers of completed responses in the ``answers``
+    queryset whose ids are keys of ``decisions`` (``{answer_id: is_correct}``)
+    as graded by ``user``. Answers graded before can be graded again.
+    Returns ``(graded_ids, rescored)``.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            answers.select_for_update(of=('self',))
+            .filter(pk__in=decisions, question__question_type='TEXT', response__is_completed=True)
+            .values_list('pk', 'response_id', 'question__points', 'points_earned', 'question__quiz_id')
+        )
+        outcomes, deltas = defaultdict(list), defaultdict(int)
+        for pk, response_id, points, points_earned, _ in rows:
+            is_correct = decisions[pk]
+            earned = points if is_correct else 0
+            outcomes[is_correct, earned].append(pk)
+            deltas[response_id] += earned - points_earned
+
+        for (is_correct, earned), pks in outcomes.items():
+            Answer.objects.filter(pk__in=pks).update(
+                is_correct=is_correct,
+                points_earned=earned,
+                needs_grading=False,
+                graded_by=user,
+                graded_at=now,
+            )
+        # One UPDATE per distinct change in points rather than per response
+        by_delta = defaultdict(list)
+        for response_id, delta in deltas.items():
+            if delta:
+                by_delta[delta].append(response_id)
+        for delta, response_ids in by_delta.items():
+            QuizResponse.objects.filter(pk__in=response_ids).update(score=F('score') + delta)
+        rescored = [response_id for response_ids in by_delta.values() for response_id in response_ids]
+        if rescored:
+            refresh_percentages(QuizResponse.objects.filter(pk__in=rescored))
+        invalidate_tags(*{responses_tag(row[4]) for row in rows})
+    return [row[0] for row in rows], len(rescored)
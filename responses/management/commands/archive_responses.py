@@ -0,0 +1,35 @@
+"""
+Move old completed responses to the archive::
+
+    python manage.py archive_responses --days 365
+
+Run it from cron during quiet hours; results of archived responses stay
+available by session id.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from responses.archive import archive_responses
+
+
+class Command(BaseCommand):
+    help = 'Move completed responses older than a cutoff out of the response and answer tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.RESPONSE_ARCHIVE_AFTER_DAYS,
+            help='Archive responses submitted more than this many days ago'
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        archived = archive_responses(
+            cutoff,
+            batch_size=options['batch_size'],
+            progress=lambda total: self.stdout.write(f'Archived {total} responses'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} responses submitted before {cutoff:%Y-%m-%d}'))
@@ -0,0 +1,35 @@
+"""
+Auto-submit attempts whose time limit ran out.
+
+Run it from cron, or keep it running with ``--interval`` so attempts are
+closed within a few seconds of their deadline and grace period::
+
+    python manage.py close_expired_attempts --interval 5
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from responses.expiry import close_expired_attempts
+
+
+class Command(BaseCommand):
+    help = 'Finish open attempts that are past their deadline and grace period.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--interval', type=float, default=0.0,
+            help='Keep running and sweep every this many seconds (default: sweep once)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            closed = close_expired_attempts(batch_size=options['batch_size'])
+            if closed or not options['interval']:
+                self.stdout.write(self.style.SUCCESS(f'Closed {closed} expired attempts'))
+            if not options['interval']:
+                return
+            connections.close_all()
+            time.sleep(options['interval'])
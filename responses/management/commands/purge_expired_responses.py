@@ -0,0 +1,33 @@
+"""
+Delete responses past the retention period of their quiz::
+
+    python manage.py purge_expired_responses --batch-size 1000 --pause 0.2
+
+Deletes run in short chunks, so it can run during business hours.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from responses.retention import purge_expired_responses
+
+
+class Command(BaseCommand):
+    help = "Delete responses older than their quiz's retention_days, in small chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Responses deleted per transaction')
+        parser.add_argument(
+            '--pause', type=float, default=settings.RETENTION_PURGE_PAUSE,
+            help='Seconds to wait between chunks'
+        )
+
+    def handle(self, *args, **options):
+        def progress(quiz, responses, archived):
+            self.stdout.write(f'Quiz {quiz.pk}: deleted {responses} responses and {archived} archived responses')
+
+        responses, archived = purge_expired_responses(
+            batch_size=options['batch_size'], pause=options['pause'], progress=progress
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {responses} responses and {archived} archived responses past their retention period'
+        ))
@@ -0,0 +1,76 @@
+"""
+Regrade the answers and rescore the responses of a quiz after its answer key
+changed::
+
+    python manage.py regrade --quiz 3
+    python manage.py regrade --quiz 3 --question 12 --workers 8
+
+An interrupted run can be resumed with ``--start-after`` and the last
+response id it reported. The regrade endpoints start it with ``--job`` to
+report the status of their job in its ``RegradeJob`` row.
+"""
+import logging
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quizzes.models import Quiz
+from responses.regrade import regrade, update_regrade_job
+
+logger = logging.getLogger('quiz_management')
+
+
+class Command(BaseCommand):
+    help = 'Regrade the answers of a quiz against its current answer key and rescore its responses.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, required=True)
+        parser.add_argument(
+            '--question', type=int, action='append', dest='questions',
+            help='Only regrade the answers to this question (repeatable)'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Processes grading text answers'
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Responses per transaction')
+        parser.add_argument('--start-after', type=int, default=0, help='Resume after this response id')
+        parser.add_argument('--job', help='Id of the queued regrade job whose status to report')
+
+    def handle(self, *args, **options):
+        job_id = options['job']
+        if not Quiz.objects.filter(pk=options['quiz']).exists():
+            if job_id:
+                update_regrade_job(job_id, status='failed')
+            raise CommandError(f"Quiz {options['quiz']} does not exist.")
+
+        def progress(result):
+            if job_id:
+                update_regrade_job(job_id, status='running', progress=result._asdict())
+            self.stdout.write(
+                f'Up to response {result.last_response_id}: {result.responses} responses, '
+                f'{result.answers_changed} answers changed, {result.responses_rescored} responses rescored'
+            )
+
+        if job_id:
+            update_regrade_job(job_id, status='running')
+        try:
+            result = regrade(
+                options['quiz'],
+                question_ids=options['questions'],
+                workers=options['workers'],
+                chunk_size=options['chunk_size'],
+                start_after=options['start_after'],
+                progress=progress,
+            )
+        except Exception:
+            if job_id:
+                logger.exception("Regrade job %s failed", job_id)
+                update_regrade_job(job_id, status='failed')
+            raise
+        if job_id:
+            update_regrade_job(job_id, status='done', progress=result._asdict())
+        self.stdout.write(self.style.SUCCESS(
+            f'Regraded {result.responses} responses: {result.answers_changed} answers changed, '
+            f'{result.responses_rescored} responses rescored'
+        ))
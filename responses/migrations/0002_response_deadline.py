@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('responses', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizresponse',
+            name='deadline',
+            field=models.DateTimeField(blank=True, help_text='End of the time limit of an attempt started on a timed quiz', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='quizresponse',
+            index=models.Index(condition=models.Q(('deadline__isnull', False), ('is_completed', False)), fields=['deadline'], name='response_open_deadline_idx'),
+        ),
+    ]
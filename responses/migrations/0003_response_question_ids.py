@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('responses', '0002_response_deadline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizresponse',
+            name='question_ids',
+            field=models.JSONField(blank=True, help_text='Questions drawn for this attempt (empty for all questions of the quiz)', null=True),
+        ),
+    ]
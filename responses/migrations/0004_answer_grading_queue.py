@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def queue_ungraded_text_answers(apps, schema_editor):
+    # Text answers graded neither automatically nor by hand so far
+    Answer = apps.get_model('responses', 'Answer')
+    Answer.objects.filter(
+        question__question_type='TEXT',
+        question__accepted_answers__isnull=True,
+        response__is_completed=True,
+        is_correct=False,
+    ).update(needs_grading=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('responses', '0003_response_question_ids'),
+        ('quizzes', '0004_accepted_answer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='graded_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='answer',
+            name='graded_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='graded_answers', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='answer',
+            name='needs_grading',
+            field=models.BooleanField(default=False, help_text='Text answer of a finished attempt waiting to be graded by hand'),
+        ),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(condition=models.Q(('needs_grading', True)), fields=['question', 'id'], name='answer_needs_grading_idx'),
+        ),
+        migrations.RunPython(queue_ungraded_text_answers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizzes', '0004_accepted_answer'),
+        ('responses', '0004_answer_grading_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.CharField(max_length=100, unique=True)),
+                ('participant_email', models.EmailField(max_length=254)),
+                ('attempt_number', models.PositiveIntegerField(default=1)),
+                ('submitted_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('payload', models.BinaryField(help_text='zlib compressed JSON of the response and its answers')),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_responses', to='quizzes.quiz')),
+            ],
+            options={
+                'verbose_name': 'Archived Response',
+                'verbose_name_plural': 'Archived Responses',
+                'ordering': ['-submitted_at'],
+                'indexes': [models.Index(fields=['quiz', 'submitted_at'], name='archived_quiz_submitted_idx')],
+            },
+        ),
+    ]
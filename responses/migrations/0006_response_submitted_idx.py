@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('responses', '0005_archived_response'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='quizresponse',
+            index=models.Index(fields=['submitted_at'], name='response_submitted_idx'),
+        ),
+    ]
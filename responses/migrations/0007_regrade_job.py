@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import responses.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('quizzes', '0006_quiz_content_version_help_text'),
+        ('responses', '0006_response_submitted_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegradeJob',
+            fields=[
+                ('id', models.CharField(default=responses.models._new_job_id, editable=False, max_length=32, primary_key=True, serialize=False)),
+                ('question_ids', models.JSONField(blank=True, help_text='Questions whose answers are regraded (empty for all questions of the quiz)', null=True)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('progress', models.JSONField(blank=True, help_text='Counts reported after the last chunk', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='regrade_jobs', to='quizzes.quiz')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='regrade_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Regrade Job',
+                'verbose_name_plural': 'Regrade Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='regradejob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('quiz',), name='regrade_job_one_active_per_quiz'),
+        ),
+    ]
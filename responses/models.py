@@ -1,10 +1,195 @@
+import json
+import uuid
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
+from django.db.models.functions import Cast, Round
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
 from django.contrib.auth import get_user_model
-from quizzes.models import Quiz, Question, MCQOption
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+from quiz_management.cache import invalidate_tags, response_tag
+from quizzes.models import Quiz, Question, MCQOption, subquery_aggregate
 
 User = get_user_model()
 
 
+class QuizResponseQuerySet(models.QuerySet):
+
+    def with_counts(self, correct=False, questions=False):
+        """
+        Annotate the counts behind ``correct_answers_count`` and
+        ``total_questions_count``. Only the requested counts are computed.
+        """
+        annotations = {}
+        if correct:
+            annotations['correct_count'] = subquery_aggregate(
+                Answer.objects.filter(response=models.OuterRef('pk'), is_correct=True), 'response', models.Count('pk')
+            )
+        if questions:
+            annotations['question_count'] = subquery_aggregate(
+                Question.objects.filter(quiz=models.OuterRef('quiz_id')), 'quiz', models.Count('pk')
+            )
+        return self.annotate(**annotations) if annotations else self
+
+
+def _percentage(score, total):
+    return models.Case(
+        models.When(GreaterThan(total, 0), then=Round(Cast(score, models.FloatField()) * 100 / total, 2)),
+        default=models.Value(0.0),
+        output_field=models.FloatField(),
+    )
+
+
+def rescore_responses(responses):
+    """
+    Recompute the scores of the completed responses in the ``responses``
+    queryset from their graded answers and the current question points.
+    Only responses whose score or total changed are written, with one
+    UPDATE for all of them. Returns the number of responses written.
+    """
+    responses = responses.filter(is_completed=True)
+    score = subquery_aggregate(
+        Answer.objects.filter(response=models.OuterRef('pk'), is_correct=True), 'response', models.Sum('points_earned')
+    )
+    total = subquery_aggregate(Question.objects.filter(quiz=models.OuterRef('quiz_id')), 'quiz', models.Sum('points'))
+    passing_score = models.Subquery(Quiz.objects.filter(pk=models.OuterRef('quiz_id')).values('passing_score'))
+
+    # Attempts that drew their questions are out of the drawn questions only
+    changed = list(
+        responses.filter(question_ids__isnull=True)
+        .annotate(new_score=score, new_total=total)
+        .exclude(score=models.F('new_score'), total_points=models.F('new_total'))
+        .values_list('pk', flat=True)
+    )
+    updated = QuizResponse.objects.filter(pk__in=changed).update(
+        score=score,
+        total_points=total,
+        percentage=_percentage(score, total),
+        is_passed=models.Case(
+            models.When(GreaterThanOrEqual(_percentage(score, total), passing_score), then=models.Value(True)),
+            default=models.Value(False),
+        ),
+    )
+
+    drawn = list(responses.filter(question_ids__isnull=False).select_related('quiz').annotate(new_score=score))
+    if drawn:
+        points = dict(Question.objects.filter(
+            pk__in={question_id for response in drawn for question_id in response.question_ids}
+        ).values_list('pk', 'points'))
+        changed = []
+        for response in drawn:
+            new_total = sum(points.get(question_id, 0) for question_id in response.question_ids)
+            if response.score != response.new_score or response.total_points != new_total:
+                response.set_score(response.new_score, new_total)
+                changed.append(response)
+        QuizResponse.objects.bulk_update(changed, ['score', 'total_points', 'percentage', 'is_passed'])
+        updated += len(changed)
+    return updated
+
+
+def refresh_percentages(responses):
+    """
+    Recompute percentage and pass state of the responses in the ``responses``
+    queryset from their stored score and total, with one UPDATE.
+    """
+    percentage = _percentage(models.F('score'), models.F('total_points'))
+    passing_score = models.Subquery(Quiz.objects.filter(pk=models.OuterRef('quiz_id')).values('passing_score'))
+    return responses.update(
+        percentage=percentage,
+        is_passed=models.Case(
+            models.When(GreaterThanOrEqual(percentage, passing_score), then=models.Value(True)),
+            default=models.Value(False),
+        ),
+    )
+
+
+def raw_delete(queryset):
+    """
+    Delete the rows of ``queryset`` with one DELETE, without loading them,
+    sending signals or following cascades. Returns the number deleted.
+    """
+    return queryset._raw_delete(queryset.db)
+
+
+def grace_period():
+    """Time after a deadline during which an attempt is still accepted."""
+    return timedelta(seconds=getattr(settings, 'ATTEMPT_GRACE_SECONDS', 30))
+
+
+def previous_attempts(quiz_ids, emails):
+    """
+    ``{(quiz_id, participant_email): [count, last_attempt_number]}`` of the
+    attempts of ``emails`` on ``quiz_ids``, live and archived alike, so
+    archiving never frees attempts or reuses attempt numbers. Pairs without
+    attempts are missing.
+    """
+    attempts = {}
+    for model in (QuizResponse, ArchivedResponse):
+        rows = (
+            model.objects.filter(quiz_id__in=quiz_ids, participant_email__in=emails)
+            .order_by()
+            .values('quiz_id', 'participant_email')
+            .annotate(count=models.Count('id'), last=models.Max('attempt_number'))
+        )
+        for row in rows:
+            counts = attempts.setdefault((row['quiz_id'], row['participant_email']), [0, 0])
+            counts[0] += row['count']
+            counts[1] = max(counts[1], row['last'])
+    return attempts
+
+
+def finish_attempts(responses, now=None):
+    """
+    Grade the stored answers of in-progress attempts and mark them completed,
+    with a fixed number of queries however many attempts are given. Attempts
+    past their deadline and grace period are recorded as submitted at the
+    deadline. Unanswered questions earn no points. Attempts that drew their
+    questions are scored out of the drawn questions only.
+    """
+    if not responses:
+        return
+    now = now or timezone.now()
+    drawn = {response.pk: set(response.question_ids) for response in responses if response.question_ids is not None}
+    answers = [
+        answer for answer in
+        Answer.objects.filter(response__in=responses)
+        .select_related('question', 'selected_option').prefetch_related('question__accepted_answers')
+        if answer.response_id not in drawn or answer.question_id in drawn[answer.response_id]
+    ]
+    scores = dict.fromkeys((response.pk for response in responses), 0)
+    for answer in answers:
+        answer.grade()
+        if answer.is_correct:
+            scores[answer.response_id] += answer.question.points
+    Answer.objects.bulk_update(answers, ['is_correct', 'points_earned', 'needs_grading'])
+
+    quiz_points = dict(
+        Quiz.objects.filter(pk__in={response.quiz_id for response in responses if response.pk not in drawn})
+        .with_totals(points=True).values_list('pk', 'points_total')
+    )
+    question_points = dict(
+        Question.objects.filter(pk__in=set().union(*drawn.values())).values_list('pk', 'points')
+    ) if drawn else {}
+    for response in responses:
+        if response.pk in drawn:
+            # Questions deleted since the draw no longer count
+            total = sum(question_points.get(question_id, 0) for question_id in drawn[response.pk])
+        else:
+            total = quiz_points[response.quiz_id]
+        response.submitted_at = response.deadline if response.is_expired(now) else now
+        response.time_taken = response.submitted_at - response.started_at
+        response.is_completed = True
+        response.set_score(scores[response.pk], total)
+    QuizResponse.objects.bulk_update(responses, [
+        'score', 'total_points', 'percentage', 'is_passed',
+        'submitted_at', 'time_taken', 'is_completed'
+    ])
+    invalidate_tags(*{response_tag(response.session_id) for response in responses})
+
+
 class QuizResponse(models.Model):
     """
     Model representing a participant's response to a quiz.
@@ -22,12 +207,34 @@ class QuizResponse(models.Model):
     submitted_at = models.DateTimeField(null=True, blank=True)
     is_completed = models.BooleanField(default=False)
     attempt_number = models.PositiveIntegerField(default=1)
+    deadline = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="End of the time limit of an attempt started on a timed quiz"
+    )
+    question_ids = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Questions drawn for this attempt (empty for all questions of the quiz)"
+    )
+
+    objects = QuizResponseQuerySet.as_manager()
 
     class Meta:
         ordering = ['-started_at']
         verbose_name = 'Quiz Response'
         verbose_name_plural = 'Quiz Responses'
         unique_together = ['quiz', 'participant_email', 'attempt_number']
+        indexes = [
+            # Only open timed attempts, for the expiry sweeper
+            models.Index(
+                fields=['deadline'],
+                condition=models.Q(is_completed=False, deadline__isnull=False),
+                name='response_open_deadline_idx',
+            ),
+            # Newest first in the admin and the admin response list
+            models.Index(fields=['submitted_at'], name='response_submitted_idx'),
+        ]
 
     def __str__(self):
         return f"{self.participant_name} - {self.quiz.title} (Attempt {self.attempt_number})"
@@ -41,18 +248,38 @@ class QuizResponse(models.Model):
             if answer.is_correct:
                 total_score += answer.question.points
 
+        self.set_score(total_score, total_possible)
+        self.save()
+
+    def set_score(self, total_score, total_possible):
+        """Set the score fields from earned and possible points, without saving."""
         self.score = total_score
         self.total_points = total_possible
         self.percentage = (total_score / total_possible * 100) if total_possible > 0 else 0
         self.is_passed = self.percentage >= self.quiz.passing_score
-        self.save()
+
+    def finish(self):
+        """Grade the stored answers of an in-progress attempt and complete it."""
+        finish_attempts([self])
+
+    def is_expired(self, now=None):
+        """Whether the deadline and the grace period after it have passed."""
+        return self.deadline is not None and (now or timezone.now()) > self.deadline + grace_period()
 
     @property
     def correct_answers_count(self):
+        if hasattr(self, 'correct_count'):
+            return self.correct_count
+        if 'answers' in getattr(self, '_prefetched_objects_cache', {}):
+            return sum(1 for answer in self.answers.all() if answer.is_correct)
         return self.answers.filter(is_correct=True).count()
 
     @property
     def total_questions_count(self):
+        if self.question_ids is not None:
+            return len(self.question_ids)
+        if hasattr(self, 'question_count'):
+            return self.question_count
         return self.quiz.total_questions
 
 
@@ -76,17 +303,37 @@ class Answer(models.Model):
     is_correct = models.BooleanField(default=False)
     points_earned = models.DecimalField(max_digits=5, decimal_places=2, default=0.00)
     answered_at = models.DateTimeField(auto_now_add=True)
+    needs_grading = models.BooleanField(
+        default=False,
+        help_text="Text answer of a finished attempt waiting to be graded by hand"
+    )
+    graded_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='graded_answers'
+    )
+    graded_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         unique_together = ['response', 'question']
         verbose_name = 'Answer'
         verbose_name_plural = 'Answers'
+        indexes = [
+            # Only the grading queue, which is read by question in id order
+            models.Index(
+                fields=['question', 'id'],
+                condition=models.Q(needs_grading=True),
+                name='answer_needs_grading_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.response.participant_name} - {self.question}"
 
-    def save(self, *args, **kwargs):
-        """Override save to automatically calculate correctness and points."""
+    def grade(self):
+        """Set correctness and points from the question and selected option."""
         if self.question.question_type in ['MCQ', 'TRUE_FALSE']:
             if self.selected_option and self.selected_option.is_correct:
                 self.is_correct = True
@@ -95,8 +342,102 @@ class Answer(models.Model):
                 self.is_correct = False
                 self.points_earned = 0
         elif self.question.question_type == 'TEXT':
-            # For text questions, correctness needs to be manually evaluated
-            # This could be expanded with AI-based evaluation in the future
+            grader = self.question.text_grader()
+            if grader:
+                self.is_correct = grader.grade(self.text_answer)
+                self.needs_grading = False
+            elif self.graded_at is None:
+                # Text questions without accepted answers are graded by hand
+                self.needs_grading = True
             self.points_earned = self.question.points if self.is_correct else 0
-        
+
+    def save(self, *args, **kwargs):
+        """Override save to automatically calculate correctness and points."""
+        self.grade()
         super().save(*args, **kwargs)
+
+
+class ArchivedResponse(models.Model):
+    """
+    Model representing a completed response moved out of the response and
+    answer tables by ``archive_responses``. The response with its answers is
+    kept as compressed JSON, so results stay retrievable by session id.
+    """
+    session_id = models.CharField(max_length=100, unique=True)
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='archived_responses')
+    participant_email = models.EmailField()
+    attempt_number = models.PositiveIntegerField(default=1)
+    submitted_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    payload = models.BinaryField(help_text="zlib compressed JSON of the response and its answers")
+
+    class Meta:
+        ordering = ['-submitted_at']
+        verbose_name = 'Archived Response'
+        verbose_name_plural = 'Archived Responses'
+        indexes = [
+            models.Index(fields=['quiz', 'submitted_at'], name='archived_quiz_submitted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.participant_email} - {self.session_id} (archived)"
+
+    @staticmethod
+    def compress(data):
+        return zlib.compress(json.dumps(data, cls=JSONEncoder, separators=(',', ':')).encode(), 6)
+
+    @property
+    def data(self):
+        """The archived response as serialized by ``QuizResponseSerializer``."""
+        return json.loads(zlib.decompress(self.payload))
+
+
+def _new_job_id():
+    return uuid.uuid4().hex
+
+
+class RegradeJob(models.Model):
+    """
+    Model representing a regrade queued from the regrade endpoints and run
+    by a ``manage.py regrade`` process, which reports its status and
+    progress here. A quiz has at most one queued or running job.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    ACTIVE_STATUSES = ['queued', 'running']
+
+    id = models.CharField(primary_key=True, max_length=32, default=_new_job_id, editable=False)
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='regrade_jobs')
+    question_ids = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Questions whose answers are regraded (empty for all questions of the quiz)"
+    )
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='regrade_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    progress = models.JSONField(null=True, blank=True, help_text="Counts reported after the last chunk")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Regrade Job'
+        verbose_name_plural = 'Regrade Jobs'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['quiz'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='regrade_job_one_active_per_quiz',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Regrade {self.id} of quiz {self.quiz_id} ({self.status})"
+
+    def covers(self, question_ids):
+        """Whether this job regrades every answer a job for ``question_ids`` would."""
+        return self.question_ids is None or (question_ids is not None and set(question_ids) <= set(self.question_ids))
@@ -0,0 +1,231 @@
+"""
+Bulk regrading after an answer key changed.
+
+When an admin fixes which option is correct, changes the points of a
+question or edits the accepted answers of a text question, ``regrade``
+brings the stored answers and scores of a quiz up to date:
+
+- Choice answers are regraded and the points of text answers adjusted with
+  set-based UPDATEs that only match the answers whose grade differs.
+- Text answers of questions with accepted answers are graded in Python,
+  each distinct text once, optionally in a process pool (which pays off for
+  fuzzy rules); only changed answers are written.
+- Completed responses are rescored with ``rescore_responses``, which only
+  writes the responses whose score or total changed.
+
+The work is split into chunks of response ids, one transaction each, so a
+regrade that is interrupted can resume after the last reported chunk.
+
+The regrade endpoints do not regrade in the web process: ``queue_regrade``
+starts the ``regrade`` command in a process of its own, which reports the
+status of the job in its ``RegradeJob`` row. A quiz has at most one queued
+or running job, and at most ``REGRADE_MAX_JOBS`` run at once.
+"""
+import math
+import subprocess
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from itertools import repeat
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from quiz_management import metrics
+from quiz_management.cache import invalidate_tags, responses_tag
+from quizzes.grading import grade_texts
+from quizzes.models import Question
+from .models import QuizResponse, Answer, RegradeJob, rescore_responses
+
+REGRADED_ANSWERS = metrics.Counter(
+    'regraded_answers_total', 'Answers whose grade changed when regrading.'
+)
+RESCORED_RESPONSES = metrics.Counter(
+    'rescored_responses_total', 'Responses whose score changed when regrading.'
+)
+
+RegradeProgress = namedtuple('RegradeProgress', ['last_response_id', 'responses', 'answers_changed', 'responses_rescored'])
+
+# Below this many texts per worker a pool costs more than it saves
+MIN_TEXTS_PER_WORKER = 2000
+
+
+def _grade(grader, texts, executor, workers):
+    if executor is None or len(texts) < 2 * MIN_TEXTS_PER_WORKER:
+        return grader.grade_many(texts)
+    size = math.ceil(len(texts) / workers)
+    parts = [texts[start:start + size] for start in range(0, len(texts), size)]
+    return [result for part in executor.map(grade_texts, repeat(grader), parts) for result in part]
+
+
+def _regrade_choices(answers):
+    """Regrade choice answers and fix the points of text answers, in SQL."""
+    points = Subquery(Question.objects.filter(pk=OuterRef('question_id')).values('points'))
+    choice = answers.filter(question__question_type__in=['MCQ', 'TRUE_FALSE'])
+    text = answers.filter(question__question_type='TEXT')
+    return (
+        choice.filter(selected_option__is_correct=True)
+        .exclude(is_correct=True, points_earned=F('question__points'))
+        .update(is_correct=True, points_earned=points)
+        + choice.filter(Q(selected_option__isnull=True) | Q(selected_option__is_correct=False))
+        .exclude(is_correct=False, points_earned=0)
+        .update(is_correct=False, points_earned=0)
+        + text.filter(is_correct=True).exclude(points_earned=F('question__points')).update(points_earned=points)
+        + text.filter(is_correct=False).exclude(points_earned=0).update(points_earned=0)
+    )
+
+
+def _regrade_texts(answers, questions, graded, executor, workers):
+    """Grade text answers against the accepted answers of ``questions``."""
+    rows = list(
+        answers.filter(question_id__in=list(questions))
+        .values_list('pk', 'question_id', 'text_answer', 'is_correct', 'points_earned', 'needs_grading')
+    )
+    texts = list({(row[1], row[2]) for row in rows} - graded.keys())
+    for question_id in {question_id for question_id, _ in texts}:
+        question_texts = [text for text_question_id, text in texts if text_question_id == question_id]
+        results = _grade(questions[question_id].text_grader(), question_texts, executor, workers)
+        graded.update(zip(((question_id, text) for text in question_texts), results))
+
+    changed = {}
+    for pk, question_id, text, is_correct, points_earned, needs_grading in rows:
+        now_correct = graded[question_id, text]
+        points = questions[question_id].points if now_correct else 0
+        if now_correct != is_correct or points_earned != points or needs_grading:
+            changed.setdefault((now_correct, points), []).append(pk)
+    for (is_correct, points), pks in changed.items():
+        Answer.objects.filter(pk__in=pks).update(is_correct=is_correct, points_earned=points, needs_grading=False)
+    return sum(map(len, changed.values()))
+
+
+def regrade(quiz_id, question_ids=None, workers=1, chunk_size=1000, start_after=0, progress=None):
+    """
+    Regrade the answers of a quiz, or only those to ``question_ids``, and
+    rescore its completed responses. Responses are processed in chunks of
+    ``chunk_size`` ids after ``start_after``; ``progress`` is called with the
+    running ``RegradeProgress`` after each chunk, and its
+    ``last_response_id`` can be passed as ``start_after`` to resume.
+    Returns the final ``RegradeProgress``.
+    """
+    questions = Question.objects.filter(quiz_id=quiz_id, question_type='TEXT').prefetch_related('accepted_answers')
+    if question_ids is not None:
+        questions = questions.filter(pk__in=question_ids)
+    # Text questions without accepted answers are graded manually
+    text_questions = {question.pk: question for question in questions if question.text_grader()}
+
+    executor = ProcessPoolExecutor(workers) if workers > 1 and text_questions else None
+    # Grades of the texts seen so far; the same answers recur across chunks
+    graded = {}
+    result = RegradeProgress(start_after, 0, 0, 0)
+    responses = QuizResponse.objects.filter(quiz_id=quiz_id)
+    try:
+        while True:
+            chunk = list(
+                responses.filter(pk__gt=result.last_response_id).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+            )
+            if not chunk:
+                return result
+            answers = Answer.objects.filter(
+                question__quiz_id=quiz_id,
+                response_id__gt=result.last_response_id,
+                response_id__lte=chunk[-1],
+            )
+            if question_ids is not None:
+                answers = answers.filter(question_id__in=question_ids)
+
+            with transaction.atomic():
+                changed = _regrade_choices(answers)
+                if text_questions:
+                    changed += _regrade_texts(answers, text_questions, graded, executor, workers)
+                # Also catches totals changed by new question points; attempts
+                # in progress are graded when they are finished
+                rescored = rescore_responses(responses.filter(pk__gt=result.last_response_id, pk__lte=chunk[-1]))
+                if changed or rescored:
+                    invalidate_tags(responses_tag(quiz_id))
+            REGRADED_ANSWERS.inc(changed)
+            RESCORED_RESPONSES.inc(rescored)
+            result = RegradeProgress(
+                chunk[-1],
+                result.responses + len(chunk),
+                result.answers_changed + changed,
+                result.responses_rescored + rescored,
+            )
+            if progress is not None:
+                progress(result)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+class RegradeBusy(Exception):
+    """Raised when ``REGRADE_MAX_JOBS`` regrades are already queued or running."""
+
+    def __init__(self, retry_after):
+        super().__init__('Too many regrades in progress')
+        self.retry_after = retry_after
+
+
+def get_regrade_job(job_id):
+    """The ``RegradeJob`` with ``job_id``, or ``None``."""
+    return RegradeJob.objects.filter(pk=job_id).first()
+
+
+def update_regrade_job(job_id, **fields):
+    """Report the status or progress of a job; it also counts as a sign of life."""
+    RegradeJob.objects.filter(pk=job_id).update(updated_at=timezone.now(), **fields)
+
+
+def _fail_stale_jobs():
+    # Jobs whose process died without reporting would hold their quiz forever
+    cutoff = timezone.now() - timedelta(seconds=settings.REGRADE_JOB_STALE_AFTER)
+    RegradeJob.objects.filter(status__in=RegradeJob.ACTIVE_STATUSES, updated_at__lt=cutoff).update(status='failed')
+
+
+def queue_regrade(quiz_id, question_ids=None, user_id=None):
+    """
+    Regrade in a ``manage.py regrade`` process started for the job, so the
+    request returns at once and the web process does not do the work.
+    Returns the ``RegradeJob``. While a job of the quiz that covers
+    ``question_ids`` is queued or running, that job is returned instead of
+    starting another. Raises ``RegradeBusy`` when the quiz has a job that
+    does not cover them, or when ``REGRADE_MAX_JOBS`` jobs are active.
+    """
+    _fail_stale_jobs()
+    active = RegradeJob.objects.filter(status__in=RegradeJob.ACTIVE_STATUSES)
+    retry_after = settings.REGRADE_RETRY_AFTER
+    running = active.filter(quiz_id=quiz_id).first()
+    if running is not None:
+        if running.covers(question_ids):
+            return running
+        raise RegradeBusy(retry_after)
+    if active.count() >= settings.REGRADE_MAX_JOBS:
+        raise RegradeBusy(retry_after)
+    try:
+        with transaction.atomic():
+            job = RegradeJob.objects.create(quiz_id=quiz_id, question_ids=question_ids, user_id=user_id)
+    except IntegrityError:
+        # Another request queued a job for the quiz in the meantime
+        running = active.filter(quiz_id=quiz_id).first()
+        if running is not None and running.covers(question_ids):
+            return running
+        raise RegradeBusy(retry_after)
+
+    command = [
+        sys.executable, str(settings.BASE_DIR / 'manage.py'), 'regrade',
+        '--quiz', str(quiz_id), '--workers', str(getattr(settings, 'GRADING_WORKERS', 1)), '--job', job.pk,
+    ]
+    for question_id in question_ids or ():
+        command += ['--question', str(question_id)]
+    try:
+        # Its own session, so it outlives the web worker that started it
+        subprocess.Popen(
+            command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    except OSError:
+        update_regrade_job(job.pk, status='failed')
+        raise
+    return job
@@ -0,0 +1,89 @@
+"""
+Deleting responses past their quiz's retention period.
+
+Quizzes with ``retention_days`` keep their responses that long after
+submission; attempts that were never finished are kept that long after they
+were started. ``purge_expired_responses`` deletes the expired responses, and
+the archived responses of those quizzes, in chunks of ids: each chunk is
+one short transaction that deletes the answers and then the responses with
+plain DELETE statements, without loading the rows the way Django's deletion
+collector does. Pausing between chunks leaves room for regular traffic.
+"""
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from quiz_management import metrics
+from quiz_management.cache import invalidate_tags, responses_tag
+from quizzes.models import Quiz
+from .autosave import forget_attempt
+from .models import QuizResponse, Answer, ArchivedResponse, raw_delete
+
+PURGED_RESPONSES = metrics.Counter(
+    'purged_responses_total', 'Responses deleted after their retention period.', ('kind',)
+)
+
+
+def _purge_chunks(queryset, delete_chunk, batch_size, pause):
+    deleted = 0
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not chunk:
+            return deleted
+        last_pk = chunk[-1]
+        with transaction.atomic():
+            delete_chunk(chunk)
+        deleted += len(chunk)
+        if len(chunk) == batch_size and pause:
+            time.sleep(pause)
+
+
+def purge_expired_responses(batch_size=1000, pause=0.0, now=None, progress=None):
+    """
+    Delete the responses and archived responses past the retention period of
+    their quiz, ``batch_size`` per transaction with ``pause`` seconds between
+    chunks. ``progress`` is called with each quiz and the numbers deleted.
+    Returns the total numbers of ``(responses, archived)`` deleted.
+    """
+    now = now or timezone.now()
+    totals = [0, 0]
+
+    # The answers of purged responses are deleted before the responses
+    def delete_responses(response_ids):
+        raw_delete(Answer.objects.filter(response_id__in=response_ids))
+        raw_delete(QuizResponse.objects.filter(pk__in=response_ids))
+
+    def delete_archived(archived_ids):
+        raw_delete(ArchivedResponse.objects.filter(pk__in=archived_ids))
+
+    for quiz in Quiz.objects.filter(retention_days__gt=0).only('pk', 'retention_days').order_by('pk'):
+        cutoff = now - timedelta(days=quiz.retention_days)
+        abandoned = list(QuizResponse.objects.filter(
+            quiz=quiz, is_completed=False, started_at__lt=cutoff
+        ).values_list('session_id', flat=True))
+        responses = _purge_chunks(
+            QuizResponse.objects.filter(
+                Q(is_completed=True, submitted_at__lt=cutoff) | Q(is_completed=False, started_at__lt=cutoff),
+                quiz=quiz,
+            ),
+            delete_responses, batch_size, pause,
+        )
+        for session_id in abandoned:
+            forget_attempt(session_id)
+        archived = _purge_chunks(
+            ArchivedResponse.objects.filter(quiz=quiz, submitted_at__lt=cutoff),
+            delete_archived, batch_size, pause,
+        )
+        if responses or archived:
+            invalidate_tags(responses_tag(quiz.pk))
+        PURGED_RESPONSES.inc(responses, kind='response')
+        PURGED_RESPONSES.inc(archived, kind='archived')
+        totals[0] += responses
+        totals[1] += archived
+        if progress is not None and (responses or archived):
+            progress(quiz, responses, archived)
+    return tuple(totals)
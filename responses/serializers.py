@@ -1,7 +1,11 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
-from .models import QuizResponse, Answer
+from .models import QuizResponse, Answer, previous_attempts
+from quizzes.cache import get_answer_key, get_public_quiz
 from quizzes.models import Quiz, Question, MCQOption
 from quizzes.serializers import QuizPublicSerializer, QuizPublicListSerializer
+from quiz_management.cache import batched_invalidation
+from quiz_management.serializers import DynamicFieldsMixin
 import uuid
 from django.utils import timezone
 from datetime import timedelta
@@ -15,33 +19,51 @@ class AnswerSubmissionSerializer(serializers.Serializer):
     selected_option_id = serializers.IntegerField(required=False, allow_null=True)
     text_answer = serializers.CharField(required=False, allow_blank=True, max_length=1000)
 
-    def validate_question_id(self, value):
+    def _get_question(self, question_id):
+        """
+        Return ``(question, options_by_id)`` for a question of the quiz being
+        submitted, using the cached answer key when the quiz (or its answer
+        key) is in the context.
+        """
+        # The answer key is loaded once per submission and shared by all answers
+        if 'answer_key' not in self.context:
+            quiz = self.context.get('quiz')
+            if quiz is None:
+                try:
+                    question = Question.objects.get(id=question_id)
+                except Question.DoesNotExist:
+                    raise serializers.ValidationError("Question not found.")
+                return question, {option.id: option for option in question.options.all()}
+            self.context['answer_key'] = get_answer_key(quiz.id)
+        # Attempts that drew their questions only accept answers to those
+        question_ids = self.context.get('question_ids')
+        if question_ids is not None and question_id not in question_ids:
+            raise serializers.ValidationError("Question not found.")
         try:
-            question = Question.objects.get(id=value)
-            return value
-        except Question.DoesNotExist:
+            return self.context['answer_key'][question_id]
+        except KeyError:
             raise serializers.ValidationError("Question not found.")
 
+    def validate_question_id(self, value):
+        self._get_question(value)
+        return value
+
     def validate(self, attrs):
         question_id = attrs.get('question_id')
         selected_option_id = attrs.get('selected_option_id')
         text_answer = attrs.get('text_answer', '').strip()
         
-        try:
-            question = Question.objects.get(id=question_id)
-        except Question.DoesNotExist:
-            raise serializers.ValidationError("Question not found.")
+        question, options = self._get_question(question_id)
         
         if question.question_type in ['MCQ', 'TRUE_FALSE']:
             if not selected_option_id:
                 if question.is_required:
                     raise serializers.ValidationError(f"Option selection is required for question {question_id}.")
             else:
-                try:
-                    option = MCQOption.objects.get(id=selected_option_id, question=question)
-                    attrs['selected_option'] = option
-                except MCQOption.DoesNotExist:
+                option = options.get(selected_option_id)
+                if option is None:
                     raise serializers.ValidationError(f"Invalid option for question {question_id}.")
+                attrs['selected_option'] = option
         
         elif question.question_type == 'TEXT':
             if question.is_required and not text_answer:
@@ -51,41 +73,61 @@ class AnswerSubmissionSerializer(serializers.Serializer):
         return attrs
 
 
-class QuizSubmissionSerializer(serializers.Serializer):
+def validate_answer_list(value):
+    if not value:
+        raise serializers.ValidationError("At least one answer is required.")
+
+    question_ids = [answer['question_id'] for answer in value]
+    if len(question_ids) != len(set(question_ids)):
+        raise serializers.ValidationError("Duplicate answers for the same question are not allowed.")
+
+    return value
+
+
+class ParticipantSerializer(serializers.Serializer):
     """
-    Serializer for quiz submission.
+    Serializer for the participant taking a quiz.
     """
     participant_name = serializers.CharField(max_length=100)
     participant_email = serializers.EmailField()
-    answers = AnswerSubmissionSerializer(many=True)
-    
+
     def validate_participant_name(self, value):
         if len(value.strip()) < 2:
             raise serializers.ValidationError("Participant name must be at least 2 characters long.")
         return value.strip()
 
+
+class QuizSubmissionSerializer(ParticipantSerializer):
+    """
+    Serializer for quiz submission.
+    """
+    answers = AnswerSubmissionSerializer(many=True)
+
     def validate_answers(self, value):
-        if not value:
-            raise serializers.ValidationError("At least one answer is required.")
-        
-        question_ids = [answer['question_id'] for answer in value]
-        if len(question_ids) != len(set(question_ids)):
-            raise serializers.ValidationError("Duplicate answers for the same question are not allowed.")
-        
-        return value
+        return validate_answer_list(value)
+
+    def validate(self, attrs):
+        quiz = self.context.get('quiz')
+        if quiz is not None and quiz.samples_questions:
+            raise serializers.ValidationError("This quiz draws questions per attempt; start an attempt first.")
+        return attrs
 
     def create(self, validated_data):
+        # The response and each of its answers would invalidate its tag
+        with batched_invalidation():
+            return self._create(validated_data)
+
+    def _create(self, validated_data):
         quiz = self.context['quiz']
         answers_data = validated_data.pop('answers')
         
         # Generate unique session ID
         session_id = str(uuid.uuid4())
         
-        # Check for existing attempts
-        existing_attempts = QuizResponse.objects.filter(
-            quiz=quiz,
-            participant_email=validated_data['participant_email']
-        ).count()
+        # Check for existing attempts, archived ones included
+        existing_attempts, last_attempt = previous_attempts(
+            [quiz.id], [validated_data['participant_email']]
+        ).get((quiz.id, validated_data['participant_email']), (0, 0))
         
         if not quiz.allow_retakes and existing_attempts > 0:
             raise serializers.ValidationError("Retakes are not allowed for this quiz.")
@@ -99,7 +141,7 @@ class QuizSubmissionSerializer(serializers.Serializer):
             participant_name=validated_data['participant_name'],
             participant_email=validated_data['participant_email'],
             session_id=session_id,
-            attempt_number=existing_attempts + 1,
+            attempt_number=last_attempt + 1,
             submitted_at=timezone.now(),
             is_completed=True
         )
@@ -119,6 +161,88 @@ class QuizSubmissionSerializer(serializers.Serializer):
         return quiz_response
 
 
+class AutosaveSerializer(serializers.Serializer):
+    """
+    Serializer for answers autosaved during an attempt. Answers replace
+    earlier ones for the same question.
+    """
+    answers = AnswerSubmissionSerializer(many=True)
+
+    def validate_answers(self, value):
+        return validate_answer_list(value)
+
+
+class AttemptSerializer(serializers.ModelSerializer):
+    """
+    Serializer for an in-progress attempt and its saved answers.
+    """
+    quiz_id = serializers.IntegerField(read_only=True)
+    questions = serializers.SerializerMethodField()
+    answers = serializers.SerializerMethodField()
+
+    class Meta:
+        model = QuizResponse
+        fields = [
+            'quiz_id', 'session_id', 'participant_name', 'participant_email',
+            'attempt_number', 'started_at', 'deadline', 'is_completed', 'questions', 'answers'
+        ]
+
+    def get_questions(self, obj):
+        # Drawn attempts list their questions; the others use the quiz payload
+        if obj.question_ids is None:
+            return None
+        try:
+            questions = get_public_quiz(obj.quiz_id)['questions']
+        except Quiz.DoesNotExist:
+            return []
+        drawn = set(obj.question_ids)
+        return [question for question in questions if question['id'] in drawn]
+
+    def get_answers(self, obj):
+        # Answers still buffered by this process are newer than the stored ones
+        saved = {
+            answer.question_id: (answer.selected_option_id, answer.text_answer)
+            for answer in obj.answers.all()
+        }
+        saved.update(self.context.get('buffered', {}))
+        return [
+            {'question_id': question_id, 'selected_option_id': option_id, 'text_answer': text_answer}
+            for question_id, (option_id, text_answer) in sorted(saved.items())
+        ]
+
+
+class GradingQueueAnswerSerializer(serializers.ModelSerializer):
+    """
+    Serializer for a text answer waiting to be graded.
+    """
+    participant_name = serializers.CharField(source='response.participant_name', read_only=True)
+
+    class Meta:
+        model = Answer
+        fields = ['id', 'response_id', 'participant_name', 'text_answer', 'answered_at']
+
+
+class GradeDecisionSerializer(serializers.Serializer):
+    """
+    Serializer for the grade given to one text answer.
+    """
+    answer_id = serializers.IntegerField()
+    is_correct = serializers.BooleanField()
+
+
+class BulkGradeSerializer(serializers.Serializer):
+    """
+    Serializer for grading many text answers at once.
+    """
+    grades = GradeDecisionSerializer(many=True, allow_empty=False, max_length=500)
+
+    def validate_grades(self, value):
+        answer_ids = [grade['answer_id'] for grade in value]
+        if len(answer_ids) != len(set(answer_ids)):
+            raise serializers.ValidationError("Each answer can only be graded once per request.")
+        return value
+
+
 class AnswerSerializer(serializers.ModelSerializer):
     """
     Serializer for answers.
@@ -138,17 +262,33 @@ class AnswerSerializer(serializers.ModelSerializer):
     
     def get_correct_option_text(self, obj):
         if obj.question.question_type in ['MCQ', 'TRUE_FALSE']:
-            correct_option = obj.question.options.filter(is_correct=True).first()
-            return correct_option.option_text if correct_option else None
+            # Iterate instead of filtering so prefetched options are reused
+            for option in obj.question.options.all():
+                if option.is_correct:
+                    return option.option_text
         return None
 
 
-class QuizResponseSerializer(serializers.ModelSerializer):
+def setup_response_eager_loading(queryset, fields):
+    """Load only the relations and counts rendered in ``fields``."""
+    if 'quiz_title' in fields:
+        queryset = queryset.select_related('quiz')
+    answers = 'answers' in fields
+    if answers:
+        queryset = queryset.prefetch_related('answers__question__options', 'answers__selected_option')
+    return queryset.with_counts(
+        correct='correct_answers_count' in fields and not answers,
+        questions='total_questions_count' in fields,
+    )
+
+
+class QuizResponseSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for quiz responses.
     """
     answers = AnswerSerializer(many=True, read_only=True)
     quiz_title = serializers.CharField(source='quiz.title', read_only=True)
+    expandable_fields = {'answers': lambda: AnswerSerializer(many=True, read_only=True)}
     
     class Meta:
         model = QuizResponse
@@ -159,12 +299,15 @@ class QuizResponseSerializer(serializers.ModelSerializer):
             'correct_answers_count', 'total_questions_count', 'answers'
         ]
 
+    setup_eager_loading = staticmethod(setup_response_eager_loading)
 
-class QuizResponseListSerializer(serializers.ModelSerializer):
+
+class QuizResponseListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
-    Serializer for quiz response list (without detailed answers).
+    Serializer for quiz response list (without detailed answers unless expanded).
     """
     quiz_title = serializers.CharField(source='quiz.title', read_only=True)
+    expandable_fields = {'answers': lambda: AnswerSerializer(many=True, read_only=True)}
     
     class Meta:
         model = QuizResponse
@@ -175,6 +318,8 @@ class QuizResponseListSerializer(serializers.ModelSerializer):
             'total_questions_count'
         ]
 
+    setup_eager_loading = staticmethod(setup_response_eager_loading)
+
 
 class QuizResultSerializer(serializers.ModelSerializer):
     """
@@ -190,6 +335,15 @@ class QuizResultSerializer(serializers.ModelSerializer):
             'percentage', 'is_passed', 'submitted_at', 'attempt_number',
             'correct_answers_count', 'total_questions_count', 'answers'
         ]
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Load everything the serializer reads in a fixed number of queries."""
+        return queryset.select_related('quiz').prefetch_related(
+            Prefetch('quiz__questions', queryset=Question.objects.only('id', 'quiz_id', 'points')),
+            'answers__question__options',
+            'answers__selected_option',
+        )
     
     def get_answers(self, obj):
         # Only show answers if quiz allows showing results immediately
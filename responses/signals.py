@@ -0,0 +1,39 @@
+"""
+Signal handlers that invalidate cached response data (see
+``quiz_management.cache``).
+
+Answers are only deleted together with their response, question or option,
+whose handlers cover them, so there is no ``post_delete`` handler for
+answers: that keeps those cascades deleting answers in bulk instead of
+loading them one by one to send signals.
+
+A saved response or answer only invalidates the tag of its own response, so
+the cached results of the other responses to the quiz stay cached.
+Submissions write the response and its answers in a ``batched_invalidation``
+block, which invalidates that tag once.
+"""
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from quiz_management.cache import invalidate_tags, response_tag
+from quizzes.models import Quiz
+from .models import QuizResponse, Answer
+
+
+@receiver([post_save, post_delete], sender=QuizResponse)
+def response_changed(sender, instance, **kwargs):
+    origin = kwargs.get('origin')
+    # Responses deleted by a cascade from their quiz are covered by quiz_changed
+    if (origin.model if isinstance(origin, QuerySet) else type(origin)) is not Quiz:
+        invalidate_tags(response_tag(instance.session_id))
+
+
+@receiver(post_save, sender=Answer)
+def answer_changed(sender, instance, **kwargs):
+    if Answer.response.is_cached(instance):
+        session_id = instance.response.session_id
+    else:
+        session_id = QuizResponse.objects.filter(pk=instance.response_id).values_list('session_id', flat=True).first()
+    if session_id is not None:
+        invalidate_tags(response_tag(session_id))
@@ -1,3 +1,842 @@
-from django.test import TestCase
+import json
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, OperationalError, connection
+from django.db.models import Q
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from quizzes.models import Quiz, Question, MCQOption
+from .archive import archive_responses
+from .async_views import (
+    AsyncPublicQuizListView, AsyncPublicQuizDetailView, AsyncQuizResultView, AsyncQuizSubmissionView
+)
+from .cache import get_result
+from .autosave import _pending_key, autosave_buffer, get_open_attempt, wait_for_flush
+from .expiry import close_expired_attempts
+from .models import Answer, ArchivedResponse, QuizResponse, RegradeJob
+from .regrade import get_regrade_job
+from .retention import purge_expired_responses
+from .throttles import SubmissionEmailThrottle
+
+User = get_user_model()
+
+
+def create_quiz(user, questions=2, **kwargs):
+    """A quiz with ``questions`` MCQ questions whose first option is correct."""
+    quiz = Quiz.objects.create(title=kwargs.pop('title', 'Quiz'), created_by=user, **kwargs)
+    for order in range(1, questions + 1):
+        question = Question.objects.create(
+            quiz=quiz, question_text=f'Question {order}', question_type='MCQ', order=order
+        )
+        MCQOption.objects.create(question=question, option_text='Right', is_correct=True, order=1)
+        MCQOption.objects.create(question=question, option_text='Wrong', order=2)
+    return quiz
+
+
+def answers_for(quiz, correct=True):
+    return [
+        {
+            'question_id': question.id,
+            'selected_option_id': question.options.get(is_correct=correct).id,
+        }
+        for question in quiz.questions.all()
+    ]
+
+
+class ResponsesTestCase(TestCase):
+    def setUp(self):
+        # Primary keys are reused after each test's rollback
+        cache.clear()
+        caches['local'].clear()
+        self.user = User.objects.create_user(
+            'admin', 'admin@example.com', 'pass12345!', first_name='Ada', last_name='Admin'
+        )
+        self.quiz = create_quiz(self.user, allow_retakes=True, max_attempts=3)
+
+    def submit(self, quiz=None, email='p@example.com', correct=True, **extra):
+        quiz = quiz or self.quiz
+        return self.client.post(
+            f'/api/v1/public/quizzes/{quiz.id}/submit/',
+            {'participant_name': 'Pat', 'participant_email': email, 'answers': answers_for(quiz, correct), **extra},
+            content_type='application/json',
+        )
+
+
+class AsyncPublicViewsTestCase(ResponsesTestCase):
+    factory = AsyncRequestFactory()
+
+    async def test_quiz_list_matches_sync_view(self):
+        response = await AsyncPublicQuizListView.as_view()(self.factory.get('/api/v1/public/quizzes/'))
+        self.assertEqual(response.status_code, 200)
+        sync_response = await self.async_client.get('/api/v1/public/quizzes/')
+        self.assertEqual(json.loads(response.content), sync_response.json())
+
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=1)
+    async def test_quiz_list_pages_past_low_estimates(self):
+        await Quiz.objects.abulk_create([Quiz(title=f'More {index}', created_by=self.user) for index in range(25)])
+        view = AsyncPublicQuizListView.as_view()
+        with mock.patch('quiz_management.pagination.estimate_count', return_value=5):
+            first = json.loads((await view(self.factory.get('/api/v1/public/quizzes/'))).content)
+            second = json.loads((await view(self.factory.get('/api/v1/public/quizzes/?page=2'))).content)
+        self.assertEqual((first['count'], first['count_is_estimated'], len(first['results'])), (5, True, 20))
+        self.assertTrue(first['next'].endswith('?page=2'))
+        self.assertEqual((len(second['results']), second['next']), (6, None))
+
+    async def test_quiz_detail_matches_sync_view(self):
+        view = AsyncPublicQuizDetailView.as_view()
+        response = await view(self.factory.get(f'/api/v1/public/quizzes/{self.quiz.id}/'), pk=self.quiz.id)
+        sync_response = await self.async_client.get(f'/api/v1/public/quizzes/{self.quiz.id}/')
+        self.assertEqual(json.loads(response.content), sync_response.json())
+
+        response = await view(self.factory.get('/api/v1/public/quizzes/0/'), pk=0)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_result(self):
+        await self.asubmit()
+        session_id = (await QuizResponse.objects.aget(quiz=self.quiz)).session_id
+        view = AsyncQuizResultView.as_view()
+        response = await view(self.factory.get(f'/api/v1/public/results/{session_id}/'), session_id=session_id)
+        self.assertEqual(response.status_code, 200)
+        sync_response = await self.async_client.get(f'/api/v1/public/results/{session_id}/')
+        self.assertEqual(json.loads(response.content), sync_response.json())
+        self.assertEqual(sync_response.json()['score'], '2.00')
+
+        response = await view(self.factory.get('/api/v1/public/results/missing/'), session_id='missing')
+        self.assertEqual(response.status_code, 404)
+
+    async def asubmit(self):
+        answers = [
+            {'question_id': question.id, 'selected_option_id': option.id}
+            async for question in self.quiz.questions.all()
+            async for option in question.options.filter(is_correct=True)
+        ]
+        return await self.async_client.post(
+            f'/api/v1/public/quizzes/{self.quiz.id}/submit/',
+            {'participant_name': 'Pat', 'participant_email': 'p@example.com', 'answers': answers},
+            content_type='application/json',
+        )
+
+
+class AsyncSubmissionTestCase(ResponsesTestCase):
+    factory = AsyncRequestFactory()
+
+    async def asubmit(self, body, quiz_id=None):
+        quiz_id = self.quiz.id if quiz_id is None else quiz_id
+        request = self.factory.post(
+            f'/api/v1/public/quizzes/{quiz_id}/submit/', body, content_type='application/json'
+        )
+        return await AsyncQuizSubmissionView.as_view()(request, quiz_id=quiz_id)
+
+    async def submission(self, email='p@example.com'):
+        answers = [
+            {'question_id': question.id, 'selected_option_id': option.id}
+            async for question in self.quiz.questions.all()
+            async for option in question.options.filter(is_correct=True)
+        ]
+        return json.dumps({'participant_name': 'Pat', 'participant_email': email, 'answers': answers})
+
+    async def test_submit(self):
+        response = await self.asubmit(await self.submission())
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(json.loads(response.content)['data']['score'], '2.00')
+        self.assertEqual(await QuizResponse.objects.filter(quiz=self.quiz).acount(), 1)
+
+    async def test_invalid_json(self):
+        response = await self.asubmit('{')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('JSON parse error', json.loads(response.content)['details']['detail'])
+
+    async def test_unknown_quiz(self):
+        response = await self.asubmit(await self.submission(), quiz_id=0)
+        self.assertEqual(response.status_code, 404)
+
+    @mock.patch.object(SubmissionEmailThrottle, 'rate', '1/min', create=True)
+    async def test_email_throttle(self):
+        self.assertEqual((await self.asubmit(await self.submission())).status_code, 201)
+        response = await self.asubmit(await self.submission())
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+        self.assertEqual((await self.asubmit(await self.submission('q@example.com'))).status_code, 201)
+
+
+class AdmissionControlTestCase(ResponsesTestCase):
+    @override_settings(ADMISSION_MAX_CONCURRENCY=0, ADMISSION_RETRY_AFTER=2)
+    def test_submissions_rejected_when_full(self):
+        with self.assertLogs('django.request', 'ERROR'):
+            response = self.submit()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertFalse(QuizResponse.objects.exists())
+        # Other endpoints are not limited
+        self.assertEqual(self.client.get('/api/v1/public/quizzes/').status_code, 200)
+
+
+class ResultCacheTestCase(ResponsesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.submit()
+        self.response = QuizResponse.objects.get()
+        get_result(self.response.session_id)
+
+    def assertCached(self, cached=True):
+        with CaptureQueriesContext(connection) as queries:
+            get_result(self.response.session_id)
+        self.assertEqual(len(queries) == 0, cached)
+
+    def test_submission_invalidates_its_response_once(self):
+        with mock.patch('quiz_management.cache._replace_versions') as replace_versions:
+            self.assertEqual(self.submit(email='other@example.com').status_code, 201)
+        self.assertEqual(replace_versions.call_count, 1)
+        other = QuizResponse.objects.get(participant_email='other@example.com')
+        self.assertEqual(list(replace_versions.call_args[0][0]), [f'response:{other.session_id}'])
+        # The results of the other responses stay cached
+        self.assertCached()
+
+    def test_saving_answers_invalidates_their_response(self):
+        answer = self.response.answers.first()
+        answer.selected_option = answer.question.options.get(is_correct=False)
+        answer.save()
+        self.assertCached(False)
+        self.assertEqual(get_result(self.response.session_id)['correct_answers_count'], 1)
+
+
+class AdminResponsesTestCase(ResponsesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.submit()
+
+    def get(self, path):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client.get(path)
+
+    def test_response_list_expansion(self):
+        result = self.get('/api/v1/public/admin/responses/').json()['results'][0]
+        self.assertNotIn('answers', result)
+        self.assertEqual(result['correct_answers_count'], 2)
+        result = self.get('/api/v1/public/admin/responses/?fields=id,score&expand=answers').json()['results'][0]
+        self.assertEqual(set(result), {'id', 'score', 'answers'})
+        self.assertEqual(len(result['answers']), 2)
+
+
+class BatchSubmissionTestCase(ResponsesTestCase):
+    url = '/api/v1/public/admin/responses/batch/'
+
+    def setUp(self):
+        super().setUp()
+        self.admin = APIClient()
+        self.admin.force_authenticate(self.user)
+
+    def item(self, quiz=None, email='p@example.com', correct=True, **extra):
+        quiz = quiz or self.quiz
+        return {
+            'quiz_id': quiz.id, 'participant_name': 'Pat', 'participant_email': email,
+            'answers': answers_for(quiz, correct), **extra,
+        }
+
+    def upload(self, *items):
+        return self.admin.post(self.url, {'submissions': list(items)}, format='json')
+
+    def test_batch(self):
+        session_id = str(uuid.uuid4())
+        response = self.upload(
+            self.item(session_id=session_id), self.item(correct=False), self.item(email='q@example.com')
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual((data['created'], data['failed']), (3, 0))
+        results = data['results']
+        self.assertEqual([result['status'] for result in results], ['created'] * 3)
+        self.assertEqual(results[0]['session_id'], session_id)
+        self.assertEqual([result['attempt_number'] for result in results], [1, 2, 1])
+        self.assertEqual([result['score'] for result in results], ['2.00', '0.00', '2.00'])
+        self.assertEqual(Answer.objects.filter(response__session_id=session_id).count(), 2)
+
+    def test_invalid_items_are_reported(self):
+        other_user = User.objects.create_user('other', 'other@example.com', 'pass12345!')
+        other_quiz = create_quiz(other_user)
+        response = self.upload(
+            self.item(), self.item(quiz=other_quiz), {'quiz_id': 'x'}, self.item(participant_email='bad'),
+        )
+        data = response.json()['data']
+        self.assertEqual((data['created'], data['failed']), (1, 3))
+        self.assertEqual(data['results'][1]['errors'], {'quiz_id': ['Quiz not found or inactive.']})
+        self.assertIn('participant_email', data['results'][3]['errors'])
+        self.assertEqual(QuizResponse.objects.count(), 1)
+
+    def test_reupload_is_idempotent(self):
+        session_id = str(uuid.uuid4())
+        self.upload(self.item(session_id=session_id))
+        result = self.upload(self.item(session_id=session_id)).json()['data']['results'][0]
+        self.assertEqual(result, {'index': 0, 'status': 'duplicate', 'session_id': session_id})
+        other_quiz = create_quiz(self.user, title='Other')
+        result = self.upload(self.item(quiz=other_quiz, session_id=session_id)).json()['data']['results'][0]
+        self.assertEqual(result['errors'], {'session_id': ['Session id is already in use.']})
+        self.assertEqual(QuizResponse.objects.count(), 1)
+
+    def test_attempt_limits(self):
+        self.submit()
+        results = self.upload(*[self.item() for _ in range(3)]).json()['data']['results']
+        self.assertEqual([result['status'] for result in results], ['created', 'created', 'error'])
+        self.assertEqual([result.get('attempt_number') for result in results], [2, 3, None])
+        single = create_quiz(self.user, title='Single')
+        results = self.upload(self.item(quiz=single), self.item(quiz=single)).json()['data']['results']
+        self.assertEqual(results[1]['errors'], {'non_field_errors': ['Retakes are not allowed for this quiz.']})
+
+    def test_queries_do_not_grow_with_items(self):
+        self.upload(self.item(email='warm@example.com'))
+        items = [self.item(email=f'{index}@example.com') for index in range(8)]
+        with CaptureQueriesContext(connection) as queries:
+            self.upload(*items[:2])
+        with self.assertNumQueries(len(queries)):
+            self.upload(*items[2:])
+        self.assertEqual(QuizResponse.objects.count(), 9)
+
+    def test_conflict(self):
+        with mock.patch('responses.batch._save', side_effect=IntegrityError), \
+                self.assertLogs('django.request', 'WARNING'):
+            response = self.upload(self.item())
+        self.assertEqual(response.status_code, 409)
+
+    def test_empty_batch(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.upload().status_code, 400)
+
+
+@override_settings(AUTOSAVE_FLUSH_INTERVAL=60)
+class AttemptsTestCase(ResponsesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(self.reset_buffer)
+
+    def reset_buffer(self):
+        if autosave_buffer._timer is not None:
+            autosave_buffer._timer.cancel()
+        autosave_buffer.reset()
+
+    def start(self, quiz=None, email='p@example.com'):
+        quiz = quiz or self.quiz
+        return self.client.post(
+            f'/api/v1/public/quizzes/{quiz.id}/start/',
+            {'participant_name': 'Pat', 'participant_email': email}, content_type='application/json'
+        )
+
+    def autosave(self, session_id, answers):
+        return self.client.put(
+            f'/api/v1/public/attempts/{session_id}/answers/', {'answers': answers}, content_type='application/json'
+        )
+
+    def finish(self, session_id):
+        return self.client.post(f'/api/v1/public/attempts/{session_id}/finish/')
+
+
+class AutosaveTestCase(AttemptsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.session_id = self.start().json()['data']['session_id']
+        self.attempt = QuizResponse.objects.get(session_id=self.session_id)
+
+    def test_latest_answers_are_written_once(self):
+        wrong, right = answers_for(self.quiz, correct=False), answers_for(self.quiz)
+        self.assertEqual(self.autosave(self.session_id, wrong).status_code, 202)
+        self.assertEqual(self.autosave(self.session_id, right[:1]).status_code, 202)
+        self.assertFalse(self.attempt.answers.exists())
+        # Resuming shows the buffered answers
+        answers = self.start().json()['data']['answers']
+        self.assertEqual([answer['selected_option_id'] for answer in answers], [
+            right[0]['selected_option_id'], wrong[1]['selected_option_id']
+        ])
+        self.assertEqual(autosave_buffer.flush(), 2)
+        self.assertEqual(
+            set(self.attempt.answers.values_list('selected_option_id', flat=True)),
+            {right[0]['selected_option_id'], wrong[1]['selected_option_id']}
+        )
+        self.assertTrue(wait_for_flush(self.session_id, timeout=0))
+
+    def test_finish_writes_and_grades_buffered_answers(self):
+        self.autosave(self.session_id, answers_for(self.quiz))
+        response = self.finish(self.session_id)
+        self.assertEqual(response.json()['data']['score'], '2.00')
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.autosave(self.session_id, answers_for(self.quiz)).status_code, 404)
+
+    def test_deleted_questions_and_options_are_dropped(self):
+        answers = answers_for(self.quiz)
+        self.autosave(self.session_id, answers)
+        Question.objects.filter(pk=answers[0]['question_id']).delete()
+        self.assertEqual(autosave_buffer.flush(), 1)
+        self.assertEqual(autosave_buffer.buffered(self.attempt.pk), {})
+        self.assertTrue(wait_for_flush(self.session_id, timeout=0))
+
+        self.autosave(self.session_id, answers[1:])
+        MCQOption.objects.filter(pk=answers[1]['selected_option_id']).delete()
+        self.assertEqual(autosave_buffer.flush(), 0)
+        self.assertEqual(autosave_buffer.buffered(self.attempt.pk), {})
+        self.assertTrue(wait_for_flush(self.session_id, timeout=0))
+
+    def test_rows_failing_constraints_are_discarded(self):
+        answers = answers_for(self.quiz)
+        self.autosave(self.session_id, answers)
+        upsert = autosave_buffer._upsert
+
+        def fail_first_question(rows):
+            if any(row.question_id == answers[0]['question_id'] for row in rows):
+                raise IntegrityError('foreign key violation')
+            upsert(rows)
+
+        with mock.patch.object(autosave_buffer, '_upsert', side_effect=fail_first_question), \
+                self.assertLogs('quiz_management', 'WARNING'):
+            self.assertEqual(autosave_buffer.flush(), 1)
+        self.assertEqual(list(self.attempt.answers.values_list('question_id', flat=True)), [answers[1]['question_id']])
+        self.assertEqual(autosave_buffer.buffered(self.attempt.pk), {})
+        self.assertTrue(wait_for_flush(self.session_id, timeout=0))
+
+    def test_other_database_errors_keep_answers_buffered(self):
+        self.autosave(self.session_id, answers_for(self.quiz))
+        with mock.patch.object(autosave_buffer, '_upsert', side_effect=OperationalError), \
+                self.assertLogs('quiz_management', 'ERROR'):
+            self.assertEqual(autosave_buffer.flush(), 0)
+        self.assertEqual(len(autosave_buffer.buffered(self.attempt.pk)), 2)
+        self.assertFalse(wait_for_flush(self.session_id, timeout=0))
+        self.assertEqual(autosave_buffer.flush(), 2)
+        self.assertTrue(wait_for_flush(self.session_id, timeout=0))
+
+
+class ExpiryTestCase(AttemptsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.quiz.time_limit = 10
+        self.quiz.save()
+
+    def expired_attempt(self, email='p@example.com', minutes=30):
+        session_id = self.start(email=email).json()['data']['session_id']
+        QuizResponse.objects.filter(session_id=session_id).update(
+            deadline=timezone.now() - timedelta(minutes=minutes)
+        )
+        return session_id
+
+    def test_expired_attempts_are_closed_with_saved_answers(self):
+        session_id = self.start().json()['data']['session_id']
+        self.autosave(session_id, answers_for(self.quiz)[:1])
+        autosave_buffer.flush()
+        deadline = timezone.now() - timedelta(minutes=30)
+        QuizResponse.objects.filter(session_id=session_id).update(deadline=deadline)
+        self.assertEqual(close_expired_attempts(), 1)
+        attempt = QuizResponse.objects.get(session_id=session_id)
+        self.assertTrue(attempt.is_completed)
+        self.assertEqual(attempt.submitted_at, deadline)
+        self.assertEqual((attempt.score, attempt.total_points), (1, 2))
+        self.assertEqual(close_expired_attempts(), 0)
+
+    def test_grace_period_and_pending_answers(self):
+        with override_settings(ATTEMPT_GRACE_SECONDS=120):
+            session_id = self.expired_attempt(minutes=1)
+            self.assertEqual(close_expired_attempts(), 0)
+        cache.set(_pending_key(session_id), 1)
+        self.assertEqual(close_expired_attempts(), 0)
+        cache.delete(_pending_key(session_id))
+        self.assertEqual(close_expired_attempts(), 1)
+
+    def test_batches(self):
+        for index in range(3):
+            self.expired_attempt(email=f'{index}@example.com')
+        self.assertEqual(close_expired_attempts(batch_size=2), 3)
+        self.assertFalse(QuizResponse.objects.filter(is_completed=False).exists())
+
+    def test_autosave_after_deadline_submits(self):
+        session_id = self.expired_attempt()
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.autosave(session_id, answers_for(self.quiz))
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(QuizResponse.objects.get(session_id=session_id).is_completed)
+
+    def test_command(self):
+        self.expired_attempt()
+        out = StringIO()
+        call_command('close_expired_attempts', stdout=out)
+        self.assertIn('Closed 1 expired attempts', out.getvalue())
+
+
+class SampledAttemptsTestCase(AttemptsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.quiz = create_quiz(self.user, questions=6, questions_per_attempt=3, allow_retakes=True, max_attempts=3)
+
+    def test_attempt_draws_questions(self):
+        data = self.start().json()['data']
+        drawn = [question['id'] for question in data['questions']]
+        self.assertEqual(len(drawn), 3)
+        self.assertEqual(QuizResponse.objects.get(session_id=data['session_id']).question_ids, drawn)
+        # Resuming returns the same draw
+        self.assertEqual([question['id'] for question in self.start().json()['data']['questions']], drawn)
+
+    def test_only_drawn_questions_are_answered_and_scored(self):
+        data = self.start().json()['data']
+        drawn = {question['id'] for question in data['questions']}
+        answers = answers_for(self.quiz)
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.autosave(data['session_id'], answers)
+        self.assertEqual(response.status_code, 400)
+        self.autosave(data['session_id'], [answer for answer in answers if answer['question_id'] in drawn])
+        result = self.finish(data['session_id']).json()['data']
+        self.assertEqual((result['score'], result['total_points']), ('3.00', 3))
+
+    def test_direct_submission_is_rejected(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.submit()
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(QuizResponse.objects.exists())
+
+
+@mock.patch('responses.regrade.subprocess.Popen')
+class RegradeTestCase(ResponsesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.submit()
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def flip_answer_key(self, question):
+        question.options.update(is_correct=~Q(is_correct=True))
+
+    def test_regrade_is_queued(self, popen):
+        question = self.quiz.questions.first()
+        response = self.api.post(f'/api/v1/public/admin/questions/{question.id}/regrade/')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['data']['job_id']
+        self.assertEqual(response['Location'], f'/api/v1/public/admin/regrade-jobs/{job_id}/')
+        command = popen.call_args[0][0]
+        self.assertEqual(command[2:], [
+            'regrade', '--quiz', str(self.quiz.id), '--workers', '1', '--job', job_id, '--question', str(question.id),
+        ])
+        data = self.api.get(response['Location']).json()['data']
+        self.assertEqual((data['status'], data['question_ids'], data['responses']), ('queued', [question.id], 0))
+
+    def test_job_runs_the_regrade(self, popen):
+        self.flip_answer_key(self.quiz.questions.first())
+        job_id = self.api.post(f'/api/v1/public/admin/quizzes/{self.quiz.id}/regrade/').json()['data']['job_id']
+        # The web process only queued it
+        self.assertEqual(QuizResponse.objects.get().score, 2)
+        call_command('regrade', '--quiz', str(self.quiz.id), '--workers', '1', '--job', job_id, stdout=StringIO())
+        self.assertEqual(QuizResponse.objects.get().score, 1)
+        data = self.api.get(f'/api/v1/public/admin/regrade-jobs/{job_id}/').json()['data']
+        self.assertEqual(data['status'], 'done')
+        self.assertEqual((data['responses'], data['answers_changed'], data['responses_rescored']), (1, 1, 1))
+
+    def test_errors_fail_the_job(self, popen):
+        job_id = self.api.post(f'/api/v1/public/admin/quizzes/{self.quiz.id}/regrade/').json()['data']['job_id']
+        with mock.patch('responses.management.commands.regrade.regrade', side_effect=RuntimeError), \
+                self.assertLogs('quiz_management', 'ERROR'), self.assertRaises(RuntimeError):
+            call_command('regrade', '--quiz', str(self.quiz.id), '--job', job_id)
+        self.assertEqual(get_regrade_job(job_id).status, 'failed')
+        # The job goes with its quiz
+        quiz_id = self.quiz.id
+        self.quiz.delete()
+        with self.assertRaises(CommandError):
+            call_command('regrade', '--quiz', str(quiz_id), '--job', job_id)
+        self.assertIsNone(get_regrade_job(job_id))
+
+    def test_active_job_is_reused(self, popen):
+        question = self.quiz.questions.first()
+        job_id = self.api.post(f'/api/v1/public/admin/questions/{question.id}/regrade/').json()['data']['job_id']
+        response = self.api.post(f'/api/v1/public/admin/questions/{question.id}/regrade/')
+        self.assertEqual((response.status_code, response.json()['data']['job_id']), (202, job_id))
+        # A job of one question does not cover the whole quiz
+        with self.assertLogs('django.request', 'ERROR'):
+            response = self.api.post(f'/api/v1/public/admin/quizzes/{self.quiz.id}/regrade/')
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '30'))
+        self.assertEqual(popen.call_count, 1)
+
+        call_command('regrade', '--quiz', str(self.quiz.id), '--job', job_id, '--workers', '1', stdout=StringIO())
+        quiz_job_id = self.api.post(f'/api/v1/public/admin/quizzes/{self.quiz.id}/regrade/').json()['data']['job_id']
+        self.assertNotEqual(quiz_job_id, job_id)
+        # ... while a job of the whole quiz covers every question
+        response = self.api.post(f'/api/v1/public/admin/questions/{question.id}/regrade/')
+        self.assertEqual(response.json()['data']['job_id'], quiz_job_id)
+        self.assertEqual(popen.call_count, 2)
+
+    @override_settings(REGRADE_MAX_JOBS=1, REGRADE_RETRY_AFTER=5)
+    def test_concurrent_jobs_are_capped(self, popen):
+        other_quiz = create_quiz(self.user, title='Other')
+        self.assertEqual(self.api.post(f'/api/v1/public/admin/quizzes/{self.quiz.id}/regrade/').status_code, 202)
+        with self.assertLogs('django.request', 'ERROR'):
+            response = self.api.post(f'/api/v1/public/admin/quizzes/{other_quiz.id}/regrade/')
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '5'))
+        self.assertEqual(popen.call_count, 1)
+
+    def test_stale_jobs_are_failed(self, popen):
+        job_id = self.api.post(f'/api/v1/public/admin/quizzes/{self.quiz.id}/regrade/').json()['data']['job_id']
+        RegradeJob.objects.filter(pk=job_id).update(updated_at=timezone.now() - timedelta(hours=2))
+        new_job_id = self.api.post(f'/api/v1/public/admin/quizzes/{self.quiz.id}/regrade/').json()['data']['job_id']
+        self.assertNotEqual(new_job_id, job_id)
+        self.assertEqual(get_regrade_job(job_id).status, 'failed')
+        self.assertEqual(popen.call_count, 2)
+
+    def test_other_users_quizzes_and_jobs(self, popen):
+        job_id = self.api.post(f'/api/v1/public/admin/quizzes/{self.quiz.id}/regrade/').json()['data']['job_id']
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('other', 'other@example.com', 'pass12345!'))
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(other.post(f'/api/v1/public/admin/quizzes/{self.quiz.id}/regrade/').status_code, 404)
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(other.get(f'/api/v1/public/admin/regrade-jobs/{job_id}/').status_code, 404)
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.api.get('/api/v1/public/admin/regrade-jobs/unknown/').status_code, 404)
+        self.assertEqual(popen.call_count, 1)
+
+
+class GradingQueueTestCase(ResponsesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.quiz = create_quiz(self.user, questions=1, passing_score=60)
+        choice = answers_for(self.quiz)
+        self.question = Question.objects.create(
+            quiz=self.quiz, question_text='Explain', question_type='TEXT', order=2
+        )
+        for email in ['a@example.com', 'b@example.com']:
+            self.client.post(
+                f'/api/v1/public/quizzes/{self.quiz.id}/submit/',
+                {
+                    'participant_name': 'Pat', 'participant_email': email,
+                    'answers': [*choice, {'question_id': self.question.id, 'text_answer': f'By {email}'}],
+                },
+                content_type='application/json',
+            )
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def pending(self):
+        return list(Answer.objects.filter(needs_grading=True).order_by('pk').values_list('pk', flat=True))
+
+    def grade(self, grades):
+        return self.api.post('/api/v1/public/admin/grading/', {'grades': grades}, format='json')
+
+    def test_summary_and_queue(self):
+        data = self.api.get('/api/v1/public/admin/grading/').json()['data']
+        self.assertEqual(data, [{
+            'question_id': self.question.id, 'question_text': 'Explain',
+            'quiz_id': self.quiz.id, 'quiz_title': 'Quiz', 'pending': 2,
+        }])
+        url = f'/api/v1/public/admin/grading/questions/{self.question.id}/'
+        page = self.api.get(f'{url}?page_size=1').json()
+        self.assertEqual([answer['text_answer'] for answer in page['results']], ['By a@example.com'])
+        page = self.api.get(page['next']).json()
+        self.assertEqual([answer['text_answer'] for answer in page['results']], ['By b@example.com'])
+        self.assertIsNone(page['next'])
+
+    def test_grades_adjust_scores(self):
+        first, second = self.pending()
+        data = self.grade([
+            {'answer_id': first, 'is_correct': True},
+            {'answer_id': second, 'is_correct': False},
+            {'answer_id': 0, 'is_correct': True},
+        ]).json()['data']
+        self.assertEqual(data, {'graded': [first, second], 'not_found': [0], 'responses_rescored': 1})
+        self.assertEqual(self.pending(), [])
+        response = Answer.objects.get(pk=first).response
+        self.assertEqual((response.score, response.percentage, response.is_passed), (2, 100, True))
+        self.assertEqual(Answer.objects.get(pk=first).graded_by, self.user)
+        # Grading again moves the score by the difference
+        self.assertEqual(self.grade([{'answer_id': first, 'is_correct': False}]).json()['data']['responses_rescored'], 1)
+        response.refresh_from_db()
+        self.assertEqual((response.score, response.percentage, response.is_passed), (1, 50, False))
+
+    def test_only_text_answers_of_own_quizzes_are_graded(self):
+        choice = Answer.objects.filter(question__question_type='MCQ').values_list('pk', flat=True)[0]
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('other', 'other@example.com', 'pass12345!'))
+        data = other.post(
+            '/api/v1/public/admin/grading/', {'grades': [{'answer_id': self.pending()[0], 'is_correct': True}]},
+            format='json'
+        ).json()['data']
+        self.assertEqual(data['graded'], [])
+        self.assertEqual(other.get('/api/v1/public/admin/grading/').json()['data'], [])
+        with self.assertLogs('django.request', 'WARNING'):
+            response = other.get(f'/api/v1/public/admin/grading/questions/{self.question.id}/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.grade([{'answer_id': choice, 'is_correct': False}]).json()['data']['not_found'], [choice])
+        self.assertEqual(len(self.pending()), 2)
+
+    def test_duplicate_grades_are_rejected(self):
+        answer_id = self.pending()[0]
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.grade([{'answer_id': answer_id, 'is_correct': True}] * 2)
+        self.assertEqual(response.status_code, 400)
+
+
+class ArchiveTestCase(AttemptsTestCase):
+    def archive(self):
+        return archive_responses(timezone.now())
+
+    def test_archived_results_are_served(self):
+        self.submit()
+        session_id = QuizResponse.objects.get().session_id
+        self.assertEqual(self.archive(), 1)
+        self.assertFalse(QuizResponse.objects.exists())
+        self.assertFalse(Answer.objects.exists())
+        archived = ArchivedResponse.objects.get()
+        self.assertEqual((archived.session_id, archived.attempt_number), (session_id, 1))
+        result = self.client.get(f'/api/v1/public/results/{session_id}/').json()
+        self.assertEqual((result['score'], len(result['answers'])), ('2.00', 2))
+
+    def test_attempts_in_progress_hold_back_the_participant(self):
+        self.submit()
+        self.start()
+        self.submit(email='q@example.com')
+        self.assertEqual(self.archive(), 1)
+        self.assertEqual(ArchivedResponse.objects.get().participant_email, 'q@example.com')
+
+    def test_archived_attempts_count(self):
+        self.submit()
+        self.submit()
+        self.archive()
+        response = self.submit()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['data']['attempt_number'], 3)
+        self.archive()
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.submit().status_code, 400)
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.start().status_code, 400)
+        admin = APIClient()
+        admin.force_authenticate(self.user)
+        result = admin.post('/api/v1/public/admin/responses/batch/', {'submissions': [{
+            'quiz_id': self.quiz.id, 'participant_name': 'Pat', 'participant_email': 'p@example.com',
+            'answers': answers_for(self.quiz),
+        }]}, format='json').json()['data']['results'][0]
+        self.assertEqual(result['errors'], {'non_field_errors': ['Maximum attempts (3) reached for this quiz.']})
+
+    def test_started_attempts_follow_archived_numbers(self):
+        self.submit()
+        self.archive()
+        data = self.start().json()['data']
+        self.assertEqual(data['attempt_number'], 2)
+        single = create_quiz(self.user, title='Single')
+        self.submit(quiz=single)
+        self.archive()
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.start(quiz=single)
+        self.assertEqual(response.json()['message'], 'Retakes are not allowed for this quiz.')
+
+    def test_command(self):
+        self.submit()
+        out = StringIO()
+        call_command('archive_responses', '--days', '0', stdout=out)
+        self.assertIn('Archived 1 responses', out.getvalue())
+        self.assertEqual(ArchivedResponse.objects.count(), 1)
+
+
+class RetentionTestCase(AttemptsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.quiz.retention_days = 30
+        self.quiz.save()
+        self.later = timezone.now() + timedelta(days=31)
+
+    def test_expired_responses_are_deleted(self):
+        self.submit()
+        kept = create_quiz(self.user, title='Kept')
+        self.submit(quiz=kept)
+        self.assertEqual(purge_expired_responses(now=timezone.now()), (0, 0))
+        self.assertEqual(purge_expired_responses(now=self.later), (1, 0))
+        self.assertEqual(list(QuizResponse.objects.values_list('quiz_id', flat=True)), [kept.id])
+        self.assertEqual(Answer.objects.count(), 2)
+
+    def test_abandoned_attempts_and_archived_responses(self):
+        self.submit()
+        archive_responses(timezone.now())
+        session_id = self.start(email='q@example.com').json()['data']['session_id']
+        self.assertIsNotNone(get_open_attempt(session_id))
+        self.assertEqual(purge_expired_responses(now=self.later), (1, 1))
+        self.assertFalse(ArchivedResponse.objects.exists())
+        self.assertIsNone(get_open_attempt(session_id))
+
+    def test_purged_results_are_gone(self):
+        self.submit()
+        session_id = QuizResponse.objects.get().session_id
+        self.assertEqual(self.client.get(f'/api/v1/public/results/{session_id}/').status_code, 200)
+        purge_expired_responses(now=self.later)
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get(f'/api/v1/public/results/{session_id}/').status_code, 404)
+
+    def test_chunks(self):
+        for email in ['a@example.com', 'b@example.com', 'c@example.com']:
+            self.submit(email=email)
+        with mock.patch('responses.retention.time.sleep') as sleep:
+            self.assertEqual(purge_expired_responses(batch_size=2, pause=0.5, now=self.later), (3, 0))
+        sleep.assert_called_once_with(0.5)
+        self.assertFalse(Answer.objects.exists())
+
+    def test_command(self):
+        self.submit()
+        QuizResponse.objects.update(submitted_at=timezone.now() - timedelta(days=31))
+        out = StringIO()
+        call_command('purge_expired_responses', '--pause', '0', stdout=out)
+        self.assertIn(f'Quiz {self.quiz.id}: deleted 1 responses and 0 archived responses', out.getvalue())
+        self.assertFalse(QuizResponse.objects.exists())
+
+
+class ResponseAdminTestCase(ResponsesTestCase):
+    url = '/admin/responses/quizresponse/'
+
+    def setUp(self):
+        super().setUp()
+        User.objects.filter(pk=self.user.pk).update(is_staff=True, is_superuser=True)
+        self.client.force_login(self.user)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.submit()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        # Every request resets the query log
+        count = len(queries)
+        for index in range(5):
+            self.submit(quiz=create_quiz(self.user, title=f'Quiz {index}'), email=f'{index}@example.com')
+        with self.assertNumQueries(count):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context['cl'].result_list), 6)
+
+    def test_quiz_filter(self):
+        other = create_quiz(self.user, title='Other')
+        self.submit()
+        self.submit(quiz=other)
+        response = self.client.get(self.url)
+        self.assertNotContains(response, '?quiz__id__exact=')
+        response = self.client.get(f'{self.url}?quiz__id__exact={other.id}')
+        self.assertEqual([row.quiz_id for row in response.context['cl'].result_list], [other.id])
+        self.assertFalse(response.context['cl'].paginator.estimated)
+
+    def test_change_page(self):
+        self.submit()
+        response = self.client.get(f'{self.url}{QuizResponse.objects.get().pk}/change/')
+        self.assertEqual(response.status_code, 200)
+        # Questions and options are raw ids, not selects listing every row
+        self.assertContains(response, 'vForeignKeyRawIdAdminField')
+        self.assertNotContains(response, 'Option 2: Wrong')
+
+    def test_grading_action(self):
+        quiz = create_quiz(self.user, questions=0, title='Essay')
+        question = Question.objects.create(quiz=quiz, question_text='Explain', question_type='TEXT', order=1)
+        self.client.post(
+            f'/api/v1/public/quizzes/{quiz.id}/submit/',
+            {'participant_name': 'Pat', 'participant_email': 'p@example.com',
+             'answers': [{'question_id': question.id, 'text_answer': 'Because'}]},
+            content_type='application/json',
+        )
+        answer = Answer.objects.get(question=question)
+        self.client.post('/admin/responses/answer/', {
+            'action': 'mark_correct', '_selected_action': [answer.pk],
+        })
+        answer.refresh_from_db()
+        self.assertEqual((answer.is_correct, answer.needs_grading, answer.graded_by), (True, False, self.user))
+        self.assertEqual(answer.response.score, 1)
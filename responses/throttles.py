@@ -0,0 +1,54 @@
+"""
+Throttles for the public submission and autosave endpoints.
+
+They only look at the client address, the URL and the request body, so a
+rejected submission costs no database work.
+"""
+from quiz_management.throttling import TokenBucketThrottle
+
+
+class SubmissionIPThrottle(TokenBucketThrottle):
+    """
+    Limits submissions per client IP address.
+    """
+    scope = 'submission_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class SubmissionEmailThrottle(TokenBucketThrottle):
+    """
+    Limits submissions per participant email address.
+    """
+    scope = 'submission_email'
+
+    def get_cache_key(self, request, view):
+        email = request.data.get('participant_email') if hasattr(request.data, 'get') else None
+        if not isinstance(email, str) or not email:
+            # Rejected by validation anyway
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': email.strip().lower()}
+
+
+class SubmissionQuizThrottle(TokenBucketThrottle):
+    """
+    Limits submissions per quiz, across all participants.
+    """
+    scope = 'submission_quiz'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': view.kwargs['quiz_id']}
+
+
+class AutosaveThrottle(TokenBucketThrottle):
+    """
+    Limits autosaves per attempt.
+    """
+    scope = 'autosave'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': view.kwargs['session_id']}
+
+
+SUBMISSION_THROTTLES = [SubmissionIPThrottle, SubmissionEmailThrottle, SubmissionQuizThrottle]
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     PublicQuizListView,
@@ -5,17 +6,52 @@ from .views import (
     QuizSubmissionView,
     QuizResultView,
     AdminQuizResponseListView,
-    AdminQuizResponseDetailView
+    AdminQuizResponseDetailView,
+    BatchSubmissionView,
+    QuizRegradeView,
+    QuestionRegradeView,
+    RegradeJobView,
+    GradingQueueSummaryView,
+    GradingQueueView,
+    AttemptStartView,
+    AttemptDetailView,
+    AttemptAnswersView,
+    AttemptFinishView
 )
+from .async_views import (
+    AsyncPublicQuizListView,
+    AsyncPublicQuizDetailView,
+    AsyncQuizSubmissionView,
+    AsyncQuizResultView
+)
+
+# Under ASGI the public endpoints are served by async-native views
+if settings.ASYNC_PUBLIC_VIEWS:
+    public_views = (AsyncPublicQuizListView, AsyncPublicQuizDetailView, AsyncQuizSubmissionView, AsyncQuizResultView)
+else:
+    public_views = (PublicQuizListView, PublicQuizDetailView, QuizSubmissionView, QuizResultView)
+quiz_list_view, quiz_detail_view, quiz_submit_view, quiz_result_view = public_views
 
 urlpatterns = [
     # Public endpoints
-    path('quizzes/', PublicQuizListView.as_view(), name='public-quiz-list'),
-    path('quizzes/<int:pk>/', PublicQuizDetailView.as_view(), name='public-quiz-detail'),
-    path('quizzes/<int:quiz_id>/submit/', QuizSubmissionView.as_view(), name='quiz-submit'),
-    path('results/<str:session_id>/', QuizResultView.as_view(), name='quiz-result'),
+    path('quizzes/', quiz_list_view.as_view(), name='public-quiz-list'),
+    path('quizzes/<int:pk>/', quiz_detail_view.as_view(), name='public-quiz-detail'),
+    path('quizzes/<int:quiz_id>/submit/', quiz_submit_view.as_view(), name='quiz-submit'),
+    path('results/<str:session_id>/', quiz_result_view.as_view(), name='quiz-result'),
+
+    # Attempts with autosaved answers
+    path('quizzes/<int:quiz_id>/start/', AttemptStartView.as_view(), name='attempt-start'),
+    path('attempts/<str:session_id>/', AttemptDetailView.as_view(), name='attempt-detail'),
+    path('attempts/<str:session_id>/answers/', AttemptAnswersView.as_view(), name='attempt-answers'),
+    path('attempts/<str:session_id>/finish/', AttemptFinishView.as_view(), name='attempt-finish'),
     
     # Admin endpoints (moved here from quiz app for better organization)
     path('admin/responses/', AdminQuizResponseListView.as_view(), name='admin-response-list'),
     path('admin/responses/<int:pk>/', AdminQuizResponseDetailView.as_view(), name='admin-response-detail'),
-]
\ No newline at end of file
+    path('admin/responses/batch/', BatchSubmissionView.as_view(), name='admin-response-batch'),
+    path('admin/quizzes/<int:quiz_id>/regrade/', QuizRegradeView.as_view(), name='admin-quiz-regrade'),
+    path('admin/questions/<int:question_id>/regrade/', QuestionRegradeView.as_view(), name='admin-question-regrade'),
+    path('admin/regrade-jobs/<str:job_id>/', RegradeJobView.as_view(), name='admin-regrade-job'),
+    path('admin/grading/', GradingQueueSummaryView.as_view(), name='admin-grading'),
+    path('admin/grading/questions/<int:question_id>/', GradingQueueView.as_view(), name='admin-grading-queue'),
+]
@@ -1,18 +1,39 @@
+import uuid
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from django.utils import timezone
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.filters import SearchFilter, OrderingFilter
-from drf_yasg.utils import swagger_auto_schema
+from rest_framework.pagination import CursorPagination
+from django.http import Http404
+from django.urls import reverse
+from drf_yasg.utils import no_body, swagger_auto_schema
 from drf_yasg import openapi
 
-from .models import QuizResponse, Answer
-from quizzes.models import Quiz
+from .models import QuizResponse, Answer, grace_period, previous_attempts
+from quizzes.cache import get_answer_key, get_public_quiz, get_question_pool
+from quizzes.models import Quiz, Question
+from quizzes.sampling import sample_questions
 from quizzes.serializers import QuizPublicListSerializer, QuizPublicSerializer
 from .serializers import (
     QuizSubmissionSerializer, QuizResponseSerializer, QuizResponseListSerializer,
-    QuizResultSerializer
+    QuizResultSerializer, ParticipantSerializer, AutosaveSerializer, AttemptSerializer,
+    GradingQueueAnswerSerializer, BulkGradeSerializer
 )
+from authentication.authentication import StatelessJWTAuthentication
+from quiz_management.pagination import EstimatedCountPagination
+from quiz_management.serializers import FIELDS_PARAMETERS, eager_queryset
 from quiz_management.utils import success_response, error_response
+from .throttles import SUBMISSION_THROTTLES, AutosaveThrottle
+from .batch import BatchConflict, BatchSubmissionSerializer, submit_batch
+from .autosave import autosave_buffer, finish_attempt, get_open_attempt
+from .regrade import RegradeBusy, get_regrade_job, queue_regrade
+from .grading_queue import apply_grades
+from .cache import get_result
 
 
 class PublicQuizListView(generics.ListAPIView):
@@ -22,6 +43,7 @@ class PublicQuizListView(generics.ListAPIView):
     queryset = Quiz.objects.filter(is_active=True)
     serializer_class = QuizPublicListSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = EstimatedCountPagination
     filter_backends = [SearchFilter, OrderingFilter]
     search_fields = ['title', 'description']
     ordering_fields = ['created_at', 'title']
@@ -50,6 +72,13 @@ class PublicQuizDetailView(generics.RetrieveAPIView):
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            data = get_public_quiz(self.kwargs['pk'])
+        except Quiz.DoesNotExist:
+            raise Http404
+        return Response(data)
+
 
 class QuizSubmissionView(generics.CreateAPIView):
     """
@@ -57,6 +86,7 @@ class QuizSubmissionView(generics.CreateAPIView):
     """
     serializer_class = QuizSubmissionSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = SUBMISSION_THROTTLES
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -74,7 +104,8 @@ class QuizSubmissionView(generics.CreateAPIView):
         responses={
             201: openapi.Response('Quiz submitted successfully', QuizResultSerializer),
             400: 'Bad Request',
-            404: 'Quiz not found'
+            404: 'Quiz not found',
+            429: 'Too many submissions'
         }
     )
     def post(self, request, *args, **kwargs):
@@ -106,6 +137,365 @@ class QuizSubmissionView(generics.CreateAPIView):
         )
 
 
+class BatchSubmissionView(generics.GenericAPIView):
+    """
+    Admin endpoint to upload many submissions at once, e.g. from exam kiosks
+    that collected them offline. Only quizzes created by the current user
+    are accepted.
+    """
+    serializer_class = BatchSubmissionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Submit many quiz responses in one transaction. Each item has the fields of a single "
+            "submission plus quiz_id and optionally session_id (to make uploads idempotent) and "
+            "submitted_at. Returns one result per item: created, duplicate or error."
+        ),
+        request_body=BatchSubmissionSerializer,
+        responses={
+            200: 'Per-item results',
+            400: 'Bad Request',
+            409: 'Conflicting concurrent submissions'
+        }
+    )
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return error_response(
+                message="Batch submission failed",
+                details=serializer.errors,
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            results = submit_batch(serializer.validated_data['submissions'], request.user)
+        except BatchConflict:
+            return error_response(
+                message="Submissions for the same participants were recorded concurrently, please retry",
+                status_code=status.HTTP_409_CONFLICT
+            )
+
+        created = sum(1 for result in results if result['status'] == 'created')
+        failed = sum(1 for result in results if result['status'] == 'error')
+        return success_response(
+            data={'created': created, 'failed': failed, 'results': results},
+            message="Batch processed"
+        )
+
+
+class QuizRegradeView(generics.GenericAPIView):
+    """
+    Admin endpoint to regrade the answers of a quiz after its answer key
+    changed (correct options, question points or accepted answers) and
+    rescore its responses. Only quizzes created by the current user can be
+    regraded. The regrade runs as a job in a process of its own; the
+    response points to its status. While a job of the quiz is queued or
+    running, that job is returned instead of queuing another.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_regrade_target(self):
+        """``(quiz_id, question_ids)`` to regrade, or ``None`` if not found."""
+        quiz_id = Quiz.objects.filter(
+            pk=self.kwargs['quiz_id'], created_by=self.request.user
+        ).values_list('pk', flat=True).first()
+        return None if quiz_id is None else (quiz_id, None)
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Queue a regrade of all answers against the current answer key and a rescore of the "
+            "responses; only answers and responses that changed are written. Follow the job at "
+            "the URL in the Location header. A job of the quiz already queued or running is "
+            "returned instead of queuing another"
+        ),
+        request_body=no_body,
+        responses={
+            202: 'Regrade queued, with the job id',
+            404: 'Not found',
+            503: 'Too many regrades in progress, retry after Retry-After seconds'
+        }
+    )
+    def post(self, request, *args, **kwargs):
+        target = self.get_regrade_target()
+        if target is None:
+            return error_response(
+                message="Not found or you don't have permission to modify it",
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        quiz_id, question_ids = target
+        try:
+            job = queue_regrade(quiz_id, question_ids, user_id=request.user.pk)
+        except RegradeBusy as exc:
+            response = error_response(
+                message="Too many regrades in progress, please retry shortly",
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+            response['Retry-After'] = str(exc.retry_after)
+            return response
+        response = success_response(
+            data={'job_id': job.pk, 'status': job.status},
+            message="Regrade queued",
+            status_code=status.HTTP_202_ACCEPTED
+        )
+        response['Location'] = reverse('admin-regrade-job', kwargs={'job_id': job.pk})
+        return response
+
+
+class QuestionRegradeView(QuizRegradeView):
+    """
+    Admin endpoint to regrade only the answers to one question.
+    """
+
+    def get_regrade_target(self):
+        quiz_id = Question.objects.filter(
+            pk=self.kwargs['question_id'], quiz__created_by=self.request.user
+        ).values_list('quiz_id', flat=True).first()
+        return None if quiz_id is None else (quiz_id, [self.kwargs['question_id']])
+
+
+class RegradeJobView(generics.GenericAPIView):
+    """
+    Admin endpoint to follow a regrade queued by the current user.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Status of a regrade job (queued, running, done or failed) with the number of responses "
+            "processed, answers changed and responses rescored so far"
+        ),
+        responses={200: 'Job status', 404: 'Not found'}
+    )
+    def get(self, request, *args, **kwargs):
+        job = get_regrade_job(self.kwargs['job_id'])
+        if job is None or job.user_id != request.user.pk:
+            return error_response(message="Regrade job not found", status_code=status.HTTP_404_NOT_FOUND)
+        progress = job.progress or {}
+        return success_response(data={
+            'job_id': job.pk,
+            'quiz_id': job.quiz_id,
+            'question_ids': job.question_ids,
+            'status': job.status,
+            'responses': progress.get('responses', 0),
+            'answers_changed': progress.get('answers_changed', 0),
+            'responses_rescored': progress.get('responses_rescored', 0),
+        })
+
+
+class AttemptStartView(generics.GenericAPIView):
+    """
+    Public endpoint to start (or resume) an attempt whose answers are
+    autosaved while the participant works through the quiz.
+    """
+    serializer_class = ParticipantSerializer
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = SUBMISSION_THROTTLES
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Start an attempt. If the participant already has an attempt in progress "
+            "for this quiz, that attempt and its saved answers are returned instead. "
+            "Quizzes with questions_per_attempt draw the questions of each attempt at random; "
+            "they are returned in questions."
+        ),
+        request_body=ParticipantSerializer,
+        responses={
+            201: openapi.Response('Attempt started', AttemptSerializer),
+            200: openapi.Response('Attempt resumed', AttemptSerializer),
+            400: 'Bad Request',
+            404: 'Quiz not found'
+        }
+    )
+    def post(self, request, *args, **kwargs):
+        try:
+            quiz = Quiz.objects.get(id=self.kwargs['quiz_id'], is_active=True)
+        except Quiz.DoesNotExist:
+            return error_response(
+                message="Quiz not found or inactive",
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return error_response(
+                message="Could not start the attempt",
+                details=serializer.errors,
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        email = serializer.validated_data['participant_email']
+
+        in_progress = self._in_progress(quiz, email)
+        if in_progress is not None:
+            if not in_progress.is_expired():
+                return success_response(data=self._attempt_data(in_progress), message="Attempt resumed")
+            # Ran out of time without being closed yet; counts as an attempt
+            finish_attempt(in_progress.pk, in_progress.session_id)
+
+        existing_attempts, last_attempt = previous_attempts([quiz.id], [email]).get((quiz.id, email), (0, 0))
+        if not quiz.allow_retakes and existing_attempts > 0:
+            return error_response(message="Retakes are not allowed for this quiz.")
+        if existing_attempts >= quiz.max_attempts:
+            return error_response(message=f"Maximum attempts ({quiz.max_attempts}) reached for this quiz.")
+
+        session_id = str(uuid.uuid4())
+        question_ids = None
+        if quiz.samples_questions:
+            # Drawn from the cached question ids, seeded with the session so a draw can be reproduced
+            question_ids = sample_questions(
+                get_question_pool(quiz.id), quiz.questions_per_attempt, quiz.sampling_strata, seed=session_id
+            )
+        try:
+            with transaction.atomic():
+                attempt = QuizResponse.objects.create(
+                    quiz=quiz,
+                    participant_name=serializer.validated_data['participant_name'],
+                    participant_email=email,
+                    session_id=session_id,
+                    attempt_number=last_attempt + 1,
+                    deadline=(
+                        timezone.now() + timedelta(minutes=quiz.time_limit) if quiz.time_limit else None
+                    ),
+                    question_ids=question_ids,
+                )
+        except IntegrityError:
+            # Started concurrently by another request of the participant
+            in_progress = self._in_progress(quiz, email)
+            if in_progress is None:
+                raise
+            return success_response(data=self._attempt_data(in_progress), message="Attempt resumed")
+
+        return success_response(
+            data=self._attempt_data(attempt),
+            message="Attempt started",
+            status_code=status.HTTP_201_CREATED
+        )
+
+    def _in_progress(self, quiz, email):
+        return QuizResponse.objects.filter(
+            quiz=quiz, participant_email=email, is_completed=False
+        ).prefetch_related('answers').order_by('-attempt_number').first()
+
+    def _attempt_data(self, attempt):
+        return AttemptSerializer(attempt, context={'buffered': autosave_buffer.buffered(attempt.pk)}).data
+
+
+class AttemptDetailView(generics.GenericAPIView):
+    """
+    Public endpoint to get an attempt with its saved answers, e.g. to resume
+    it after the browser was closed.
+    """
+    serializer_class = AttemptSerializer
+    permission_classes = [permissions.AllowAny]
+
+    @swagger_auto_schema(
+        operation_description="Get an attempt and its saved answers",
+        responses={200: AttemptSerializer, 404: 'Attempt not found'}
+    )
+    def get(self, request, *args, **kwargs):
+        attempt = QuizResponse.objects.filter(
+            session_id=self.kwargs['session_id']
+        ).prefetch_related('answers').first()
+        if attempt is None:
+            raise Http404
+        serializer = self.get_serializer(attempt, context={'buffered': autosave_buffer.buffered(attempt.pk)})
+        return success_response(data=serializer.data)
+
+
+class AttemptAnswersView(generics.GenericAPIView):
+    """
+    Public endpoint to autosave answers of an attempt in progress.
+
+    Answers are buffered and written in batches, so only the latest answer
+    per question reaches the database.
+    """
+    serializer_class = AutosaveSerializer
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = [AutosaveThrottle]
+
+    @swagger_auto_schema(
+        operation_description="Save answers of an attempt in progress; replaces earlier answers to the same questions",
+        request_body=AutosaveSerializer,
+        responses={
+            202: 'Answers accepted',
+            400: 'Bad Request',
+            404: 'Attempt not found or already finished',
+            409: 'Time limit passed, attempt submitted'
+        }
+    )
+    def put(self, request, *args, **kwargs):
+        session_id = self.kwargs['session_id']
+        attempt = get_open_attempt(session_id)
+        if attempt is None:
+            return error_response(
+                message="Attempt not found or already finished",
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        response_id, quiz_id, deadline, question_ids = attempt
+        if deadline is not None and timezone.now() > deadline + grace_period():
+            finish_attempt(response_id, session_id)
+            return error_response(
+                message="The time limit has passed; the attempt was submitted with the answers saved before it",
+                status_code=status.HTTP_409_CONFLICT
+            )
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.context['answer_key'] = get_answer_key(quiz_id)
+        if question_ids is not None:
+            serializer.context['question_ids'] = set(question_ids)
+        if not serializer.is_valid():
+            return error_response(
+                message="Could not save the answers",
+                details=serializer.errors,
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        answers = serializer.validated_data['answers']
+        autosave_buffer.add(response_id, session_id, answers)
+        return success_response(
+            data={'saved': len(answers)},
+            message="Answers saved",
+            status_code=status.HTTP_202_ACCEPTED
+        )
+
+
+class AttemptFinishView(generics.GenericAPIView):
+    """
+    Public endpoint to finish an attempt. Grades the answers saved so far;
+    attempts finished after their deadline and grace period count as
+    submitted at the deadline.
+    """
+    serializer_class = QuizResultSerializer
+    permission_classes = [permissions.AllowAny]
+
+    @swagger_auto_schema(
+        operation_description="Finish an attempt and grade its saved answers; finishing again returns the same result",
+        request_body=no_body,
+        responses={
+            200: openapi.Response('Quiz submitted successfully', QuizResultSerializer),
+            404: 'Attempt not found'
+        }
+    )
+    def post(self, request, *args, **kwargs):
+        session_id = self.kwargs['session_id']
+        attempt = QuizResponse.objects.filter(session_id=session_id).values_list('id', 'is_completed').first()
+        if attempt is None:
+            return error_response(
+                message="Attempt not found",
+                status_code=status.HTTP_404_NOT_FOUND
+            )
+        response_id, is_completed = attempt
+
+        if not is_completed:
+            finish_attempt(response_id, session_id)
+
+        quiz_response = QuizResultSerializer.setup_eager_loading(QuizResponse.objects.filter(pk=response_id)).get()
+        return success_response(
+            data=self.get_serializer(quiz_response).data,
+            message="Quiz submitted successfully"
+        )
+
+
 class QuizResultView(generics.RetrieveAPIView):
     """
     Public endpoint to view quiz results.
@@ -114,16 +504,19 @@ class QuizResultView(generics.RetrieveAPIView):
     permission_classes = [permissions.AllowAny]
     lookup_field = 'session_id'
 
-    def get_queryset(self):
-        return QuizResponse.objects.filter(is_completed=True)
-
     @swagger_auto_schema(
-        operation_description="Get quiz results by session ID",
+        operation_description="Get quiz results by session ID, including archived responses",
         responses={200: QuizResultSerializer}
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
+    def retrieve(self, request, *args, **kwargs):
+        result = get_result(self.kwargs['session_id'])
+        if result is None:
+            raise Http404
+        return Response(result)
+
 
 # Admin views for managing responses
 class AdminQuizResponseListView(generics.ListAPIView):
@@ -132,7 +525,10 @@ class AdminQuizResponseListView(generics.ListAPIView):
     """
     queryset = QuizResponse.objects.filter(is_completed=True)
     serializer_class = QuizResponseListSerializer
+    # Only filters by the user id, so the user is never loaded
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = EstimatedCountPagination
     filter_backends = [SearchFilter, OrderingFilter]
     search_fields = ['participant_name', 'participant_email', 'quiz__title']
     ordering_fields = ['submitted_at', 'score', 'percentage']
@@ -140,13 +536,14 @@ class AdminQuizResponseListView(generics.ListAPIView):
 
     def get_queryset(self):
         # Only show responses for quizzes created by the current user
-        return QuizResponse.objects.filter(
+        return eager_queryset(self, QuizResponse.objects.filter(
             is_completed=True,
             quiz__created_by=self.request.user
-        )
+        ))
 
     @swagger_auto_schema(
         operation_description="List all quiz responses for admin with filtering and pagination",
+        manual_parameters=FIELDS_PARAMETERS,
         responses={200: QuizResponseListSerializer(many=True)}
     )
     def get(self, request, *args, **kwargs):
@@ -158,17 +555,115 @@ class AdminQuizResponseDetailView(generics.RetrieveAPIView):
     Admin endpoint to view detailed quiz response.
     """
     serializer_class = QuizResponseSerializer
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return QuizResponse.objects.filter(
+        return eager_queryset(self, QuizResponse.objects.filter(
             is_completed=True,
             quiz__created_by=self.request.user
-        )
+        ))
 
     @swagger_auto_schema(
         operation_description="Get detailed quiz response with all answers",
+        manual_parameters=FIELDS_PARAMETERS,
         responses={200: QuizResponseSerializer}
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
+
+
+class GradingQueuePagination(CursorPagination):
+    """
+    Keyset pagination in answer id order, so every page of the queue is read
+    from the partial index however many answers wait.
+    """
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class GradingQueueSummaryView(generics.GenericAPIView):
+    """
+    Admin endpoint to list the questions with text answers waiting to be
+    graded, for quizzes created by the current user.
+    """
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="List questions with text answers waiting to be graded and how many wait",
+        responses={200: 'Questions with their number of answers to grade'}
+    )
+    def get(self, request, *args, **kwargs):
+        questions = (
+            Answer.objects.filter(needs_grading=True, question__quiz__created_by=request.user)
+            .order_by('question__quiz_id', 'question_id')
+            .values('question_id', 'question__question_text', 'question__quiz_id', 'question__quiz__title')
+            .annotate(pending=Count('id'))
+        )
+        return success_response(data=[
+            {
+                'question_id': row['question_id'],
+                'question_text': row['question__question_text'],
+                'quiz_id': row['question__quiz_id'],
+                'quiz_title': row['question__quiz__title'],
+                'pending': row['pending'],
+            }
+            for row in questions
+        ])
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Grade many text answers at once. Answers and the scores of their responses are "
+            "updated in one transaction; answers graded before can be graded again."
+        ),
+        request_body=BulkGradeSerializer,
+        responses={200: 'Graded answer ids and the number of responses rescored', 400: 'Bad Request'}
+    )
+    def post(self, request, *args, **kwargs):
+        serializer = BulkGradeSerializer(data=request.data)
+        if not serializer.is_valid():
+            return error_response(
+                message="Grading failed",
+                details=serializer.errors,
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        decisions = {grade['answer_id']: grade['is_correct'] for grade in serializer.validated_data['grades']}
+        graded, rescored = apply_grades(
+            Answer.objects.filter(question__quiz__created_by=request.user), decisions, request.user
+        )
+        return success_response(
+            data={
+                'graded': graded,
+                'not_found': sorted(decisions.keys() - set(graded)),
+                'responses_rescored': rescored,
+            },
+            message="Answers graded"
+        )
+
+
+class GradingQueueView(generics.ListAPIView):
+    """
+    Admin endpoint to page through the text answers to a question that wait
+    to be graded, oldest first.
+    """
+    serializer_class = GradingQueueAnswerSerializer
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = GradingQueuePagination
+
+    def get_queryset(self):
+        if not Question.objects.filter(pk=self.kwargs['question_id'], quiz__created_by=self.request.user).exists():
+            raise Http404
+        return Answer.objects.filter(
+            question_id=self.kwargs['question_id'], needs_grading=True
+        ).select_related('response')
+
+    @swagger_auto_schema(
+        operation_description="List text answers to a question waiting to be graded, with cursor pagination",
+        responses={200: GradingQueueAnswerSerializer(many=True)}
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)